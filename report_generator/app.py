@@ -8,6 +8,11 @@ Example:
     report-generator --gui
     report-generator --cli [--order_taxon_name='Anura'] [--GeoGraphicRegion='China'] --output 'Report Aura China'
     report-generator --cli --Clutch=5 --Clutch=10
+    report-generator --cli --no-db --Genus=Bufo
+    report-generator --cli --explain --Genus=Bufo --SVLMx=40 --SVLMx=160
+    report-generator --cli --search='salamandra spain'
+    report-generator --cli --workers=4
+    report-generator --batch=nightly.yaml --workers=4
 
 Usage:
     report-generator
@@ -15,7 +20,12 @@ Usage:
     report-generator --new
     report-generator --no-db
     report-generator --output <filename>
-    report-generator --cli [--order_taxon_name=<ordname>]
+    report-generator --rebuild-indexes
+    report-generator --verify-indexes
+    report-generator --refresh-locations=<delta_dir>
+    report-generator --batch=<manifest> [--no-db] [--workers=<n>]
+    report-generator --cli [--no-db | --explain] [--workers=<n>]
+                    [--order_taxon_name=<ordname>]
                     [--Family=<famname>]
                     [--Genus=<genname>]
                     [--Species=specname]
@@ -34,6 +44,7 @@ Usage:
                     [--GeographicRegion=<gr>]
                     [--IUCN=<iucn>]
                     [--PopTrend=<pt>]
+                    [--search=<text>]
 
 
 Options:
@@ -45,7 +56,24 @@ Options:
     --no-db                 Do not check for db settings
                             instead supply string values to create project
                             works directly from Excel(.xlsx) file.
+                            Query options are applied to the spreadsheet.
+    --explain               Log the SQL and query plan of the query options
+                            without running the query or the report.
+    --workers=<n>           Render the report pages in n processes, split
+                            at family boundaries. Defaults to
+                            render_workers in config.yaml, or 1.
     -o --output             The output filename/location of the report
+    --rebuild-indexes       Drop and recreate the database indexes then
+                            refresh the query planner statistics.
+    --verify-indexes        Check the database indexes are present.
+    --refresh-locations=<delta_dir>
+                            Apply GeoNames daily modifications and deletes
+                            files from delta_dir to the location database.
+    --batch=<manifest>      Render every report of a YAML manifest from one
+                            read of the data, with --workers reports at a
+                            time (default batch_workers in config.yaml, or
+                            the number of CPUs). A summary is written to
+                            report/batch_summary.csv.
     [--order_taxon_name]    The order name of species.
     [--Family]              The Family name of species.
     [--Genus]               The genus name of species.
@@ -65,12 +93,19 @@ Options:
     [--GeographicRegion]    Geographic region species can be found in.
     [--IUCN]                IUCN type. For more detailed information check documentation.
     [--PopTrend]            Population Trend.
+    [--search]              Free text matched against the species names,
+                            nesting sites, habitats and regions.
 """
 
+import sys
 
 from docopt import docopt
 from loguru import logger
 
+import report_generator.indexes
+import report_generator.project_setup.locations_db_setup
+import report_generator.read_from_db.query_db
+import report_generator.report_generator_cli.batch
 import report_generator.report_generator_cli.main
 import report_generator.report_generator_gui.main
 
@@ -84,9 +119,24 @@ def main():
     arguments = docopt(__doc__, version="Report Generator 1.0")
     # check if gui option selected
     # print(arguments)
-    if arguments["--cli"] is True:
+    if arguments["--batch"]:
+        logger.info("Report Generator Batch")
+        report_generator.report_generator_cli.batch.main(arguments)
+    elif arguments["--explain"]:
+        logger.info("Report Generator Explain Query")
+        report_generator.read_from_db.query_db.explain_from_db(arguments)
+    elif arguments["--cli"] is True or arguments["--no-db"] is True:
         logger.info("Report Generator CLI")
         report_generator.report_generator_cli.main.main(arguments)
+    elif arguments["--rebuild-indexes"] or arguments["--verify-indexes"]:
+        logger.info("Report Generator Indexes")
+        # Exits non-zero if an index is missing, for scripts and CI
+        sys.exit(0 if report_generator.indexes.main(arguments) else 1)
+    elif arguments["--refresh-locations"]:
+        logger.info("Report Generator Refresh Locations")
+        report_generator.project_setup.locations_db_setup.refresh_project_locations(
+            arguments["--refresh-locations"]
+        )
     else:
         report_generator.report_generator_gui.main.main()
 
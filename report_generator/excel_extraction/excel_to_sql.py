@@ -24,7 +24,11 @@ from loguru import logger
 import report_generator.excel_extraction.tables as tables
 from report_generator.excel_extraction.clean_data import clean_data
 from report_generator.excel_extraction.data_structure import structure_data
+from report_generator.indexes import SPECIES_INDEXES, create_indexes
 from report_generator.location_formatter.location_updater import update_location
+from report_generator.read_from_db.query_db import get_backend
+from report_generator.read_from_db.species_report import refresh_species_report
+from report_generator.read_from_db.species_search import build_species_search
 
 
 def export_to_database(
@@ -52,24 +56,75 @@ def export_to_database(
         data_frame = create_data_frame(path_to_excel)
         clean_data_frame = clean_data(data_frame)
 
-        # Update the locations
-        updated_data_frame = update_location(clean_data_frame)
+        export_data_frame_to_database(clean_data_frame, db_output_name)
 
-        # Create the database/database connection
-        conn = create_connection(db_output_name)
+    except FileNotFoundError as e:
+        logger.error(e)
+    logger.info("Export to database end.")
 
-        # Creates tables/Makes sure tables are created
-        create_tables(conn)
 
-        # Structures data from dataframe to match tables layout
-        structured_data = structure_data(updated_data_frame)
+def export_data_frame_to_database(
+    clean_data_frame: pandas.DataFrame, db_output_name: str, store: bool = True
+) -> None:
+    """Export cleaned dataset to database.
 
-        # Populate tables
-        populate_tables(structured_data, conn)
+    Takes an already cleaned DataFrame of the dataset, updates the
+    locations, creates the tables and populates the database. Used when
+    the dataset has been read ahead of time, for example by the project
+    setup pipeline.
 
-    except FileNotFoundError as e:
-        logger.error(e)
-    logger.info("Export to database end.")
+    Args:
+        clean_data_frame (pandas.DataFrame):  Cleaned dataset DataFrame
+        db_output_name (str):                 db file name
+        store (bool):                         Store the dataset in the
+                                              storage backend, False if the
+                                              database is moved afterwards,
+                                              see write_storage_backend
+    """
+    # Update the locations
+    updated_data_frame = update_location(clean_data_frame)
+
+    # Create the database/database connection
+    conn = create_connection(db_output_name)
+
+    # Creates tables/Makes sure tables are created
+    create_tables(conn)
+
+    # Structures data from dataframe to match tables layout
+    structured_data = structure_data(updated_data_frame)
+
+    # Populate tables
+    populate_tables(structured_data, conn)
+
+    # Index the loaded tables and gather planner statistics
+    create_indexes(conn, SPECIES_INDEXES)
+
+    # Build or refresh the materialised report table
+    refresh_species_report(conn)
+
+    # Build the full-text search index
+    build_species_search(conn)
+
+    # Store the dataset in the configured storage backend
+    if store:
+        get_backend(db_output_name).write(conn)
+    conn.close()
+
+
+def write_storage_backend(db_output_name: str) -> None:
+    """Store a species database in the configured storage backend.
+
+    The stored dataset is keyed by the database path, so a database
+    exported under a temporary name is stored once it is in place.
+
+    Args:
+        db_output_name (str):   db file name
+    """
+    conn = create_connection(db_output_name)
+    try:
+        get_backend(db_output_name).write(conn)
+    finally:
+        conn.close()
 
 
 def create_connection(db_output_name: str) -> object:
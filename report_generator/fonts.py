@@ -1,12 +1,34 @@
 """Manage and load font choices.
 
+Custom fonts are registered on a pdf through a font registry. Each font
+file is parsed once per process, and its metrics are kept in a cache
+directory keyed by the hash of the file, so later processes and reports
+register the font without parsing it again. Only the custom fonts named
+in the font options are registered, and FPDF embeds a subset of the
+glyphs used by the report for each of them.
 """
+import collections
+import hashlib
+import json
 import os
+import threading
+from pathlib import Path
 
+import fpdf
 import yaml
+from fpdf.fpdf import SubsetMap
+from fpdf.ttfonts import TTFontFile
 from loguru import logger
 
 from report_generator.config import dump_config, load_config
+from report_generator.project_setup.download_manager import get_cache_dir
+
+# Bump when the cached metrics change
+FONT_CACHE_FORMAT = 1
+
+FONT_METRICS = {}
+FONT_FILES = {}
+FONTS_LOCK = threading.Lock()
 
 
 def font_dict_loader() -> dict:
@@ -48,33 +70,208 @@ def font_selection_updater(chosen_fonts: dict) -> None:
     dump_config(config)
 
 
-def add_font_choices_to_pdf(pdf: object, font_options: dict) -> object:
+def add_font_choices_to_pdf(
+    pdf: object, font_options: dict, config: dict = None
+) -> object:
     """Add font to choices to pdf.
 
-    Takes PDF instance and checks if the selected fonts are
-    default fonts to FPDF2. If they are not default it takes the font location from the fonts.yaml file and adds the
-    font under its name to the pdf.
+    Takes PDF instance and registers the custom fonts of the fonts.yaml
+    file that are selected in the font options, with each of their
+    styles, under their names. Default fonts are built into FPDF2 and
+    need no registration.
 
     Args:
         pdf ()              - FPDF2 PDF class instantiation.
-        font_options (dict) - Selected fonts and settings
+        font_options (dict) - Selected fonts and settings, defaults to the
+                              fonts of the config
+        config (dict)       - Config dict, loaded if not given
     """
-    config = load_config()
+    if config is None:
+        config = load_config()
 
-    config["fonts"]
-    font_dict = font_dict_loader()
-    for font_name, font_types in font_dict["custom_font_types"].items():
+    if font_options is None:
+        font_options = config["fonts"]
+    selected = {value for value in font_options.values() if isinstance(value, str)}
+    font_path = os.path.join(config["dir_path"], "data", "fonts")
+    custom_fonts = load_custom_fonts(os.path.join(font_path, "fonts.yaml"))
+    for font_name, font_types in custom_fonts.items():
+        if font_name not in selected:
+            continue
         for font_type, file_name in font_types.items():
             logger.debug(font_name, font_type, file_name)
-            font_path = os.path.join(config["dir_path"], "data", "fonts")
             font_loc = os.path.join(font_path, file_name)
             if font_type == "Normal":
                 font_type = ""
-            pdf.add_font(font_name, font_type, font_loc)
+            register_font(pdf, font_name, font_type, font_loc)
 
     return pdf
 
 
+def load_custom_fonts(font_yaml: str) -> dict:
+    """Load custom fonts.
+
+    Reads the custom_font_types of a fonts.yaml file, cached until the
+    file changes.
+
+    Args:
+        font_yaml (str):        Path to the fonts.yaml file
+
+    Returns:
+        custom_fonts (dict):    Font name to {font type: file name} dicts
+    """
+    stat = os.stat(font_yaml)
+    key = (os.path.abspath(font_yaml), stat.st_size, stat.st_mtime_ns)
+    with FONTS_LOCK:
+        custom_fonts = FONT_FILES.get(key)
+    if custom_fonts is None:
+        with open(font_yaml, "r") as file:
+            font_dict = yaml.load(file, Loader=yaml.loader.SafeLoader)
+        custom_fonts = font_dict.get("custom_font_types") or {}
+        with FONTS_LOCK:
+            FONT_FILES[key] = custom_fonts
+    return custom_fonts
+
+
+def register_font(pdf: object, family: str, style: str, font_file: str) -> None:
+    """Register font.
+
+    Registers a TrueType font on a pdf as FPDF.add_font does, from the
+    cached metrics of the font file.
+
+    Args:
+        pdf ()              - FPDF2 PDF class instantiation.
+        family (str)        - Font family, used with pdf.set_font
+        style (str)         - "", "B", "I" or "BI"
+        font_file (str)     - Path to the font file
+    """
+    style = "".join(sorted(style.upper()))
+    fontkey = f"{family.lower()}{style}"
+    if fontkey in pdf.fonts or fontkey in pdf.core_fonts:
+        return
+    metrics = get_font_metrics(font_file)
+    # Characters FPDF.add_font always includes in the subset
+    characters = "\x00 "
+    if pdf.str_alias_nb_pages:
+        characters += "0123456789" + pdf.str_alias_nb_pages
+    pdf.fonts[fontkey] = {
+        "i": len(pdf.fonts) + 1,
+        "type": "TTF",
+        "name": metrics["name"],
+        "desc": dict(metrics["desc"]),
+        "up": metrics["up"],
+        "ut": metrics["ut"],
+        "cw": metrics["cw"],
+        "ttffile": Path(font_file),
+        "fontkey": fontkey,
+        "subset": SubsetMap(map(ord, characters)),
+    }
+    pdf.font_files[fontkey] = {
+        "length1": metrics["originalsize"],
+        "type": "TTF",
+        "ttffile": Path(font_file),
+    }
+
+
+def get_font_metrics(font_file: str, cache_dir: str = None) -> dict:
+    """Get font metrics.
+
+    Returns the metrics of a font file from memory, then from the cache
+    directory, and parses the font if neither holds them.
+
+    Args:
+        font_file (str)     - Path to the font file
+        cache_dir (str)     - Cache directory, defaults to
+                              get_cache_dir("fonts")
+
+    Returns:
+        metrics (dict)      - Name, descriptor, underline, character
+                              widths and size of the font, as computed by
+                              FPDF.add_font
+    """
+    stat = os.stat(font_file)
+    key = (os.path.abspath(font_file), stat.st_size, stat.st_mtime_ns)
+    with FONTS_LOCK:
+        metrics = FONT_METRICS.get(key)
+    if metrics is not None:
+        return metrics
+
+    with open(font_file, "rb") as file:
+        sha256 = hashlib.sha256(file.read()).hexdigest()
+    cache_dir = cache_dir or get_cache_dir("fonts")
+    cache_path = os.path.join(cache_dir, f"{sha256}.json")
+    version = [FONT_CACHE_FORMAT, fpdf.__version__]
+    try:
+        with open(cache_path, "r", encoding="utf-8") as file:
+            metrics = json.load(file)
+        if metrics.pop("version") != version:
+            raise ValueError(f"Outdated font metrics: {cache_path}")
+        metrics["cw"] = unpack_widths(metrics["cw"])
+        logger.debug(f"Font metrics read from cache: {font_file}")
+    except (OSError, ValueError, KeyError):
+        metrics = parse_font_metrics(font_file)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(
+                    dict(metrics, cw=pack_widths(metrics["cw"]), version=version), file
+                )
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Unable to cache font metrics: {e}")
+
+    with FONTS_LOCK:
+        FONT_METRICS[key] = metrics
+    return metrics
+
+
+def parse_font_metrics(font_file: str) -> dict:
+    """Parse the metrics of a font file, as FPDF.add_font does."""
+    logger.debug(f"Parsing font: {font_file}")
+    ttf = TTFontFile()
+    ttf.getMetrics(font_file)
+    return {
+        "name": "".join(c for c in ttf.fullName if c not in " ()"),
+        "desc": {
+            "Ascent": round(ttf.ascent),
+            "Descent": round(ttf.descent),
+            "CapHeight": round(ttf.capHeight),
+            "Flags": ttf.flags,
+            "FontBBox": (
+                f"[{ttf.bbox[0]:.0f} {ttf.bbox[1]:.0f}"
+                f" {ttf.bbox[2]:.0f} {ttf.bbox[3]:.0f}]"
+            ),
+            "ItalicAngle": int(ttf.italicAngle),
+            "StemV": round(ttf.stemV),
+            "MissingWidth": round(ttf.defaultWidth),
+        },
+        "up": round(ttf.underlinePosition),
+        "ut": round(ttf.underlineThickness),
+        "cw": ttf.charWidths,
+        "originalsize": os.stat(font_file).st_size,
+    }
+
+
+def pack_widths(widths: list) -> dict:
+    """Pack character widths as the most common width and the others."""
+    default = collections.Counter(widths).most_common(1)[0][0] if widths else 0
+    return {
+        "size": len(widths),
+        "default": default,
+        "widths": [
+            [code, width] for code, width in enumerate(widths) if width != default
+        ],
+    }
+
+
+def unpack_widths(packed: dict) -> list:
+    """Unpack character widths packed with pack_widths."""
+    widths = [packed["default"]] * packed["size"]
+    for code, width in packed["widths"]:
+        widths[code] = width
+    return widths
+
+
 def check_if_default_font(font_name: str) -> bool:
     """Check if choice is a default font.
 
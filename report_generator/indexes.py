@@ -0,0 +1,275 @@
+"""Manage database indexes.
+
+Declarative index catalogs for the species and location databases. The
+indexes cover the join keys used by the read_from_db query, the columns
+used to filter reports, the materialised species_report table and the
+lookup keys used against the geocode table.
+
+Indexes are applied after the bulk loads have finished, as building them
+once over the loaded rows is much cheaper than maintaining them for every
+insert. ANALYZE is run afterwards so the query planner has statistics.
+
+Functions:
+    index_sql:          Builds the CREATE INDEX string for a catalog entry
+    create_indexes:     Creates catalog indexes and runs ANALYZE
+    drop_indexes:       Drops catalog indexes
+    rebuild_indexes:    Drops and recreates catalog indexes
+    verify_indexes:     Returns the names of catalog indexes that are missing
+    main:               CLI entry point to rebuild or verify indexes
+"""
+import os
+import sqlite3
+from sqlite3 import Error
+
+from loguru import logger
+
+from report_generator.config import load_config
+
+# (index name, table name, indexed columns)
+SPECIES_INDEXES = [
+    # Join keys
+    ("idx_species_genus_id", "species", ["genus_id"]),
+    ("idx_species_iucn_id", "species", ["iucn_id"]),
+    ("idx_species_pop_trend_id", "species", ["pop_trend_id"]),
+    ("idx_species_parity_mode_id", "species", ["parity_mode_id"]),
+    ("idx_genus_family_id", "genus", ["family_id"]),
+    ("idx_family_order_id", "family", ["order_id"]),
+    ("idx_country_continent_id", "country", ["continent_id"]),
+    ("idx_geo_location_country_id", "geo_location", ["country_id"]),
+    (
+        "idx_geo_location_species_species_id",
+        "geo_location_species",
+        ["species_id", "geo_location_id"],
+    ),
+    (
+        "idx_activity_species_species_id",
+        "activity_species",
+        ["species_id", "activity_id"],
+    ),
+    (
+        "idx_micro_habitat_species_species_id",
+        "micro_habitat_species",
+        ["species_id", "micro_habitat_id"],
+    ),
+    (
+        "idx_nesting_site_species_species_id",
+        "nesting_site_species",
+        ["species_id", "nesting_site_id"],
+    ),
+    # Filter columns
+    ("idx_order_taxon_name", "order_taxon", ["order_taxon_name"]),
+    ("idx_family_name", "family", ["family_name"]),
+    ("idx_genus_name", "genus", ["genus_name"]),
+    ("idx_species_name_latin", "species", ["species_name_latin"]),
+    ("idx_species_size_max_record", "species", ["size_max_record"]),
+    ("idx_species_size_max_male", "species", ["size_max_male"]),
+    ("idx_species_size_max_female", "species", ["size_max_female"]),
+    ("idx_species_longevity", "species", ["longevity"]),
+    ("idx_species_clutch_avg", "species", ["clutch_avg"]),
+    ("idx_species_clutch_min", "species", ["clutch_min"]),
+    ("idx_species_clutch_max", "species", ["clutch_max"]),
+    ("idx_species_egg_diameter", "species", ["egg_diameter"]),
+    # Materialised report table
+    (
+        "idx_species_report_taxon",
+        "species_report",
+        ['"Order"', "Family", "Genus", "Species"],
+    ),
+    ("idx_species_report_svlmx", "species_report", ["SVLMx"]),
+    ("idx_species_report_svlmmx", "species_report", ["SVLMMx"]),
+    ("idx_species_report_svlfmx", "species_report", ["SVLFMx"]),
+    ("idx_species_report_longevity", "species_report", ["Longevity"]),
+    ("idx_species_report_clutch", "species_report", ["Clutch"]),
+    ("idx_species_report_clutch_min", "species_report", ["ClutchMin"]),
+    ("idx_species_report_clutch_max", "species_report", ["ClutchMax"]),
+    ("idx_species_report_egg_diameter", "species_report", ["EggDiameter"]),
+    ("idx_species_report_range_size", "species_report", ["RangeSize"]),
+    ("idx_species_report_elevation", "species_report", ["Elevation"]),
+    # Facet counts
+    ("idx_species_report_family", "species_report", ["Family"]),
+    ("idx_species_report_iucn", "species_report", ["IUCN"]),
+    ("idx_species_report_parity_mode", "species_report", ["ParityMode"]),
+    ("idx_species_report_pop_trend", "species_report", ["PopTrend"]),
+    ("idx_species_report_activity", "species_report", ["Activity"]),
+    ("idx_species_report_micro_habitat", "species_report", ["MicroHabitat"]),
+    ("idx_species_report_nesting_site", "species_report", ["NestingSite"]),
+]
+
+LOCATION_INDEXES = [
+    # Lookup keys
+    ("idx_geocode_place_name", "geocode", ["place_name", "country_code"]),
+    ("idx_geocode_place_name_nocase", "geocode", ["place_name COLLATE NOCASE"]),
+    ("idx_geocode_country_code", "geocode", ["country_code"]),
+    (
+        "idx_country_codes_two_letter_code",
+        "country_codes",
+        ["Two_Letter_Country_Code"],
+    ),
+]
+
+
+def index_sql(name: str, table: str, columns: list) -> str:
+    """Build index sql string.
+
+    Args:
+        name (str):         Name of the index
+        table (str):        Name of the indexed table
+        columns (list):     List of indexed column strings
+
+    Returns:
+        sql_str (str):      CREATE INDEX sql string
+    """
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+
+
+def create_indexes(
+    conn: sqlite3.Connection, catalog: list, analyze: bool = True
+) -> None:
+    """Create indexes.
+
+    Creates every index in the catalog whose table exists in the
+    database and then runs ANALYZE so the planner has statistics.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+        catalog (list):             Index catalog list
+        analyze (bool):             Whether to run ANALYZE afterwards
+    """
+    logger.info("Creating indexes")
+    tables = get_table_names(conn)
+    try:
+        cursor = conn.cursor()
+        for name, table, columns in catalog:
+            if table not in tables:
+                logger.debug(f"Skipping index {name}: no table {table}")
+                continue
+            cursor.execute(index_sql(name, table, columns))
+        if analyze:
+            cursor.execute("ANALYZE")
+        conn.commit()
+        cursor.close()
+    except Error as e:
+        logger.error(e)
+
+
+def drop_indexes(conn: sqlite3.Connection, catalog: list) -> None:
+    """Drop indexes.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+        catalog (list):             Index catalog list
+    """
+    logger.info("Dropping indexes")
+    try:
+        cursor = conn.cursor()
+        for name, _, _ in catalog:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.commit()
+        cursor.close()
+    except Error as e:
+        logger.error(e)
+
+
+def rebuild_indexes(conn: sqlite3.Connection, catalog: list) -> None:
+    """Rebuild indexes.
+
+    Drops and recreates every index in the catalog and refreshes the
+    planner statistics.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+        catalog (list):             Index catalog list
+    """
+    drop_indexes(conn, catalog)
+    create_indexes(conn, catalog)
+
+
+def verify_indexes(conn: sqlite3.Connection, catalog: list) -> list:
+    """Verify indexes.
+
+    Checks that every catalog index on an existing table is present.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+        catalog (list):             Index catalog list
+
+    Returns:
+        missing (list):             Names of missing indexes
+    """
+    tables = get_table_names(conn)
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"
+    ).fetchall()
+    existing = {row[0] for row in rows}
+    missing = [
+        name for name, table, _ in catalog if table in tables and name not in existing
+    ]
+    return missing
+
+
+def get_table_names(conn: sqlite3.Connection) -> set:
+    """Get table names.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+
+    Returns:
+        tables (set):               Set of table names in the database
+    """
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def get_database_catalogs(config: dict) -> list:
+    """Get database catalogs.
+
+    Pairs the project's database paths with their index catalogs.
+
+    Args:
+        config (dict):      Project config dict
+
+    Returns:
+        databases (list):   List of (db path, catalog) tuples
+    """
+    data_path = os.path.join(config["dir_path"], "data")
+    return [
+        (os.path.join(data_path, "database", "species.db"), SPECIES_INDEXES),
+        (
+            os.path.join(data_path, "locations", "location_database", "location.db"),
+            LOCATION_INDEXES,
+        ),
+    ]
+
+
+def main(arguments: dict) -> bool:
+    """Rebuild or verify indexes.
+
+    Runs against the species and location databases of the current
+    project.
+
+    Args:
+        arguments (dict):   Dictionary of CLI options
+
+    Returns:
+        ok (bool):          False if any index is missing after the run
+    """
+    config = load_config()
+    ok = True
+    for db_path, catalog in get_database_catalogs(config):
+        if not os.path.isfile(db_path):
+            logger.warning(f"Database not found: {db_path}")
+            continue
+        conn = sqlite3.connect(db_path)
+        if arguments.get("--rebuild-indexes"):
+            logger.info(f"Rebuilding indexes: {db_path}")
+            rebuild_indexes(conn, catalog)
+        missing = verify_indexes(conn, catalog)
+        conn.close()
+        if missing:
+            ok = False
+            logger.warning(f"Missing indexes in {db_path}: {', '.join(missing)}")
+        else:
+            logger.info(f"Indexes verified: {db_path}")
+    return ok
@@ -0,0 +1,382 @@
+"""# Download manager.
+
+Resumable, verified downloads with a local content addressed cache.
+
+Downloads are written to a partial file in the cache directory. If the
+connection drops the download is resumed from the end of the partial file
+with an HTTP Range request. Large files can optionally be fetched as
+several ranges in parallel. Finished downloads are verified against the
+expected size and sha256 checksum, stored in the cache under their
+checksum and then linked into place. Several projects on one machine
+therefore share a single copy of each file.
+
+The cache directory defaults to ~/.cache/report_generator/downloads and can
+be changed with the REPORT_GENERATOR_CACHE environment variable.
+
+Classes:
+    DownloadError:      Raised when a download can not be completed or verified
+
+Functions:
+    download_file:      Downloads a file through the cache
+    get_cache_dir:      Returns a cache directory
+"""
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import tqdm
+from loguru import logger
+
+from report_generator.project_setup.setup_pipeline import file_checksum
+
+CHUNK_SIZE = 1 << 16
+INDEX_LOCK = threading.Lock()
+
+
+class DownloadError(Exception):
+    """Raised when a download can not be completed or verified."""
+
+
+def get_cache_dir(name: str = "downloads") -> str:
+    """Get cache directory.
+
+    Args:
+        name (str):         Name of the cache sub directory
+
+    Returns:
+        cache_dir (str):    Path to the cache directory
+    """
+    default = os.path.join(pathlib.Path.home(), ".cache", "report_generator")
+    return os.path.join(os.environ.get("REPORT_GENERATOR_CACHE", default), name)
+
+
+def download_file(
+    url: str,
+    file_path: str,
+    sha256: str = None,
+    size: int = None,
+    segments: int = 1,
+    cache_dir: str = None,
+    retries: int = 3,
+) -> str:
+    """Download file.
+
+    Downloads the file at url to file_path through the local cache. If
+    the content is already cached it is linked into place without being
+    downloaded again.
+
+    Args:
+        url (str):          URL of the file
+        file_path (str):    Path the file is written to
+        sha256 (str):       Expected sha256 checksum, if known
+        size (int):         Expected size in bytes, if known
+        segments (int):     Number of ranges to fetch in parallel when the
+                            server supports range requests
+        cache_dir (str):    Cache directory, defaults to get_cache_dir()
+        retries (int):      Number of times a dropped download is resumed
+
+    Returns:
+        file_path (str):    Path to the downloaded file
+
+    Raises:
+        DownloadError:      If the download fails or can not be verified
+    """
+    cache_dir = cache_dir or get_cache_dir()
+    os.makedirs(os.path.join(cache_dir, "blobs"), exist_ok=True)
+    os.makedirs(os.path.join(cache_dir, "partial"), exist_ok=True)
+
+    if sha256 is not None and os.path.isfile(blob_path(cache_dir, sha256)):
+        logger.info(f"Using cached download: {url}")
+        link_file(blob_path(cache_dir, sha256), file_path)
+        return file_path
+
+    headers = get_remote_headers(url)
+    remote_size = headers.get("size")
+    if size is None:
+        size = remote_size
+    elif remote_size is not None and remote_size != size:
+        raise DownloadError(f"Expected {size} bytes but server reports {remote_size}")
+
+    # Without an ETag or Last-Modified a cached file can not be known to
+    # match the remote one, so it is downloaded again
+    entry = load_cache_index(cache_dir).get(url)
+    trusted = entry is not None and has_validator(headers)
+    if sha256 is None and trusted and entry["validator"] == headers:
+        cached_blob = blob_path(cache_dir, entry["sha256"])
+        if os.path.isfile(cached_blob):
+            logger.info(f"Using cached download: {url}")
+            link_file(cached_blob, file_path)
+            return file_path
+
+    url_key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    part_path = os.path.join(cache_dir, "partial", f"{url_key}.part")
+    if part_validator_changed(part_path, headers):
+        remove_partial_files(part_path)
+    save_part_validator(part_path, headers)
+
+    if segments > 1 and headers.get("ranges") and size:
+        download_segments(url, part_path, size, segments, retries)
+    else:
+        download_with_resume(url, part_path, size, retries)
+
+    verify_download(part_path, size, sha256)
+    checksum = sha256 or file_checksum(part_path)
+    os.replace(part_path, blob_path(cache_dir, checksum))
+    remove_partial_files(part_path)
+    update_cache_index(
+        cache_dir, url, {"sha256": checksum, "size": size, "validator": headers}
+    )
+    link_file(blob_path(cache_dir, checksum), file_path)
+    return file_path
+
+
+def get_remote_headers(url: str) -> dict:
+    """Get remote headers.
+
+    Sends a HEAD request to find the size of the file, whether range
+    requests are supported and the validators used to detect changes.
+
+    Args:
+        url (str):          URL of the file
+
+    Returns:
+        headers (dict):     Dict with size, ranges, etag and last_modified
+    """
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=30)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"HEAD request failed for {url}: {e}")
+        return {}
+    length = response.headers.get("Content-Length")
+    return {
+        "size": int(length) if length is not None else None,
+        "ranges": response.headers.get("Accept-Ranges", "").lower() == "bytes",
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def has_validator(headers: dict) -> bool:
+    """Check if the headers identify the remote file's version."""
+    return bool(headers.get("etag") or headers.get("last_modified"))
+
+
+def download_with_resume(url: str, part_path: str, size: int, retries: int) -> None:
+    """Download with resume.
+
+    Streams the file into part_path, resuming from the end of the partial
+    file after a dropped connection.
+
+    Args:
+        url (str):          URL of the file
+        part_path (str):    Path to the partial file
+        size (int):         Expected size in bytes, or None if unknown
+        retries (int):      Number of times the download is resumed
+    """
+    progress_bar = tqdm.tqdm(total=size, unit="B", unit_scale=True, desc="Downloading")
+    for attempt in range(retries + 1):
+        try:
+            fetch_range(
+                url, part_path, 0, None if size is None else size - 1, progress_bar
+            )
+            progress_bar.close()
+            return
+        except requests.RequestException as e:
+            logger.warning(f"Download interrupted ({e}), attempt {attempt + 1}")
+    progress_bar.close()
+    raise DownloadError(f"Download failed after {retries} retries: {url}")
+
+
+def download_segments(
+    url: str, part_path: str, size: int, segments: int, retries: int
+) -> None:
+    """Download segments.
+
+    Splits the file into byte ranges, downloads them in parallel and then
+    joins them into part_path. Each range resumes on its own.
+
+    Args:
+        url (str):          URL of the file
+        part_path (str):    Path to the partial file
+        size (int):         Size of the file in bytes
+        segments (int):     Number of ranges
+        retries (int):      Number of times each range is resumed
+    """
+    segment_size = -(-size // segments)
+    ranges = [
+        (start, min(start + segment_size, size) - 1)
+        for start in range(0, size, segment_size)
+    ]
+    progress_bar = tqdm.tqdm(total=size, unit="B", unit_scale=True, desc="Downloading")
+
+    def fetch_segment(index):
+        start, end = ranges[index]
+        segment_path = f"{part_path}.{index}"
+        for attempt in range(retries + 1):
+            try:
+                fetch_range(url, segment_path, start, end, progress_bar)
+                return
+            except requests.RequestException as e:
+                logger.warning(
+                    f"Segment {index} interrupted ({e}), attempt {attempt + 1}"
+                )
+        raise DownloadError(f"Segment {index} failed after {retries} retries: {url}")
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        list(executor.map(fetch_segment, range(len(ranges))))
+    progress_bar.close()
+
+    with open(part_path, "wb") as file:
+        for index in range(len(ranges)):
+            with open(f"{part_path}.{index}", "rb") as segment:
+                shutil.copyfileobj(segment, file, CHUNK_SIZE)
+            os.remove(f"{part_path}.{index}")
+
+
+def fetch_range(
+    url: str, part_path: str, start: int, end: int, progress_bar: tqdm.tqdm
+) -> None:
+    """Fetch range.
+
+    Appends bytes start to end (inclusive) of the file to part_path,
+    skipping any bytes already in part_path. If the server ignores the
+    range request the partial file is restarted.
+
+    Args:
+        url (str):              URL of the file
+        part_path (str):        Path to the partial file for this range
+        start (int):            First byte of the range
+        end (int):              Last byte of the range, or None for the end
+        progress_bar (tqdm):    Progress bar updated with bytes written
+    """
+    have = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    if end is not None and start + have > end:
+        return
+    if have:
+        progress_bar.update(have)
+
+    headers = {}
+    if start + have > 0 or end is not None:
+        headers["Range"] = f"bytes={start + have}-{'' if end is None else end}"
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 416 and end is None:
+            return
+        response.raise_for_status()
+        mode = "ab"
+        if response.status_code != 206 and (start + have) > 0:
+            if start > 0:
+                raise DownloadError("Server does not support range requests")
+            progress_bar.update(-have)
+            mode = "wb"
+        with open(part_path, mode) as file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                file.write(chunk)
+                progress_bar.update(len(chunk))
+
+
+def verify_download(part_path: str, size: int, sha256: str) -> None:
+    """Verify download.
+
+    Args:
+        part_path (str):    Path to the downloaded file
+        size (int):         Expected size in bytes, or None
+        sha256 (str):       Expected sha256 checksum, or None
+
+    Raises:
+        DownloadError:      If the size or checksum do not match. The
+                            partial file is removed.
+    """
+    actual_size = os.path.getsize(part_path)
+    if size is not None and actual_size != size:
+        remove_partial_files(part_path)
+        raise DownloadError(f"Expected {size} bytes but downloaded {actual_size}")
+    if sha256 is not None and file_checksum(part_path) != sha256:
+        remove_partial_files(part_path)
+        raise DownloadError(f"Checksum mismatch for {part_path}")
+
+
+def blob_path(cache_dir: str, sha256: str) -> str:
+    """Get the cache path for content with the given checksum."""
+    return os.path.join(cache_dir, "blobs", sha256)
+
+
+def link_file(source: str, file_path: str) -> None:
+    """Link file.
+
+    Hard links the cached file into place, falling back to a copy if the
+    paths are on different file systems.
+
+    Args:
+        source (str):       Path to the cached file
+        file_path (str):    Destination path
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    try:
+        os.link(source, file_path)
+    except OSError:
+        shutil.copyfile(source, file_path)
+
+
+def part_validator_changed(part_path: str, headers: dict) -> bool:
+    """Check if the remote file changed since the partial download began."""
+    try:
+        with open(f"{part_path}.json", "r", encoding="utf-8") as file:
+            return json.load(file) != headers
+    except (FileNotFoundError, json.JSONDecodeError):
+        return True
+
+
+def save_part_validator(part_path: str, headers: dict) -> None:
+    """Record the remote validators for a partial download."""
+    with open(f"{part_path}.json", "w", encoding="utf-8") as file:
+        json.dump(headers, file)
+
+
+def remove_partial_files(part_path: str) -> None:
+    """Remove a partial download and its segments."""
+    directory = os.path.dirname(part_path)
+    name = os.path.basename(part_path)
+    for file_name in os.listdir(directory):
+        if file_name == name or file_name.startswith(f"{name}."):
+            os.remove(os.path.join(directory, file_name))
+
+
+def load_cache_index(cache_dir: str) -> dict:
+    """Load cache index.
+
+    Args:
+        cache_dir (str):    Cache directory
+
+    Returns:
+        index (dict):       Dict of url to cached content entries
+    """
+    try:
+        with open(os.path.join(cache_dir, "index.json"), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def update_cache_index(cache_dir: str, url: str, entry: dict) -> None:
+    """Update cache index.
+
+    Args:
+        cache_dir (str):    Cache directory
+        url (str):          URL of the cached file
+        entry (dict):       Cached content entry
+    """
+    with INDEX_LOCK:
+        index = load_cache_index(cache_dir)
+        index[url] = entry
+        tmp_path = os.path.join(cache_dir, "index.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(index, file, indent=2)
+        os.replace(tmp_path, os.path.join(cache_dir, "index.json"))
@@ -0,0 +1,215 @@
+"""# Location snapshot.
+
+Exports and attaches prebuilt location data.
+
+Building the location database and lexicon gives the same result for
+every project on a machine. A finished location.db and location.json can
+be exported as a compressed, versioned snapshot bundle. A new project can
+then attach the snapshot instead of downloading and loading the GeoNames
+data.
+
+A bundle is a gzip compressed tar file holding a manifest.json and the
+snapshot files. The manifest records the snapshot format, a label, the
+creation time and the size and sha256 checksum of each file.
+
+When a bundle is attached it is unpacked once into the snapshot store
+(~/.cache/report_generator/snapshots) and each file is verified against
+the manifest. The location database is then copied, hard linked or
+symlinked into the project. Linked databases are shared between
+projects and are made read-only. location.json is always copied as it is
+added to when species are imported.
+
+Functions:
+    export_snapshot:    Exports a project's location data as a bundle
+    read_manifest:      Reads the manifest from a bundle
+    unpack_snapshot:    Unpacks and verifies a bundle in the snapshot store
+    attach_snapshot:    Attaches a bundle to a project
+"""
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import stat
+import tarfile
+
+from loguru import logger
+
+from report_generator.project_setup.download_manager import get_cache_dir
+from report_generator.project_setup.setup_pipeline import file_checksum
+
+SNAPSHOT_FORMAT = 1
+ATTACH_MODES = ["copy", "link", "symlink"]
+LOCATION_DB = os.path.join("location_database", "location.db")
+LOCATION_JSON = os.path.join("location_json", "location.json")
+SNAPSHOT_FILES = {"location.db": LOCATION_DB, "location.json": LOCATION_JSON}
+
+
+def export_snapshot(locations_path: str, bundle_path: str, label: str = None) -> dict:
+    """Export snapshot.
+
+    Args:
+        locations_path (str):   Path to the project's data/locations directory
+        bundle_path (str):      Path the bundle is written to
+        label (str):            Optional label for the snapshot, such as the
+                                date of the GeoNames dump
+
+    Returns:
+        manifest (dict):        The bundle manifest
+    """
+    logger.info(f"Exporting location snapshot: {bundle_path}")
+    files = {}
+    for name, relative_path in SNAPSHOT_FILES.items():
+        file_path = os.path.join(locations_path, relative_path)
+        files[name] = {
+            "size": os.path.getsize(file_path),
+            "sha256": file_checksum(file_path),
+        }
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "label": label,
+        "created": datetime.datetime.now().isoformat(),
+        "files": files,
+    }
+
+    manifest_bytes = json.dumps(manifest, indent=2).encode("utf-8")
+    partial_path = f"{bundle_path}.part"
+    with tarfile.open(partial_path, "w:gz") as bundle:
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(manifest_bytes)
+        bundle.addfile(info, io.BytesIO(manifest_bytes))
+        for name, relative_path in SNAPSHOT_FILES.items():
+            bundle.add(os.path.join(locations_path, relative_path), arcname=name)
+    os.replace(partial_path, bundle_path)
+    logger.info("Location snapshot exported")
+    return manifest
+
+
+def read_manifest(bundle_path: str) -> dict:
+    """Read manifest.
+
+    Args:
+        bundle_path (str):  Path to the bundle
+
+    Returns:
+        manifest (dict):    The bundle manifest
+
+    Raises:
+        ValueError:         If the bundle has no manifest or an unsupported
+                            format
+    """
+    with tarfile.open(bundle_path, "r:gz") as bundle:
+        try:
+            manifest = json.load(bundle.extractfile("manifest.json"))
+        except KeyError:
+            raise ValueError(f"Snapshot has no manifest: {bundle_path}")
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format')}")
+    return manifest
+
+
+def unpack_snapshot(bundle_path: str, store_dir: str = None) -> str:
+    """Unpack snapshot.
+
+    Unpacks the bundle into the snapshot store and verifies each file
+    against the manifest. A bundle that was already unpacked and verified
+    is reused.
+
+    Args:
+        bundle_path (str):  Path to the bundle
+        store_dir (str):    Snapshot store, defaults to the snapshots cache
+
+    Returns:
+        snapshot_dir (str): Directory holding the verified snapshot files
+
+    Raises:
+        ValueError:         If the manifest does not list exactly the
+                            snapshot files, or a file does not match it
+    """
+    manifest = read_manifest(bundle_path)
+    store_dir = store_dir or get_cache_dir("snapshots")
+    key = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+    snapshot_dir = os.path.join(store_dir, key)
+    if os.path.isfile(os.path.join(snapshot_dir, "manifest.json")):
+        logger.info(f"Using unpacked location snapshot: {snapshot_dir}")
+        return snapshot_dir
+
+    logger.info(f"Unpacking location snapshot: {bundle_path}")
+    partial_dir = f"{snapshot_dir}.part"
+    if set(manifest["files"]) != set(SNAPSHOT_FILES):
+        raise ValueError(
+            f"Snapshot manifest lists {sorted(manifest['files'])}, "
+            f"expected {sorted(SNAPSHOT_FILES)}"
+        )
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+    with tarfile.open(bundle_path, "r:gz") as bundle:
+        for name in manifest["files"]:
+            source = bundle.extractfile(name)
+            if source is None:
+                shutil.rmtree(partial_dir)
+                raise ValueError(f"Snapshot file is not a regular file: {name}")
+            with source, open(os.path.join(partial_dir, name), "wb") as file:
+                shutil.copyfileobj(source, file, 1 << 20)
+
+    for name, expected in manifest["files"].items():
+        file_path = os.path.join(partial_dir, name)
+        size = os.path.getsize(file_path)
+        if size != expected["size"] or file_checksum(file_path) != expected["sha256"]:
+            shutil.rmtree(partial_dir)
+            raise ValueError(f"Snapshot file does not match manifest: {name}")
+        os.chmod(file_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    # The manifest is written last and marks the snapshot as verified
+    with open(os.path.join(partial_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.replace(partial_dir, snapshot_dir)
+    return snapshot_dir
+
+
+def attach_snapshot(
+    bundle_path: str, locations_path: str, mode: str = "copy", store_dir: str = None
+) -> dict:
+    """Attach snapshot.
+
+    Args:
+        bundle_path (str):      Path to the bundle
+        locations_path (str):   Path to the project's data/locations directory
+        mode (str):             How the location database is attached. One of
+                                'copy', 'link' (hard link, read-only) or
+                                'symlink' (read-only)
+        store_dir (str):        Snapshot store, defaults to the snapshots cache
+
+    Returns:
+        manifest (dict):        The bundle manifest
+
+    Raises:
+        ValueError:             If the mode is unknown or the bundle does not
+                                verify
+    """
+    if mode not in ATTACH_MODES:
+        raise ValueError(f"Unknown attach mode: {mode}")
+    snapshot_dir = unpack_snapshot(bundle_path, store_dir)
+    logger.info(f"Attaching location snapshot ({mode})")
+
+    for name, relative_path in SNAPSHOT_FILES.items():
+        source = os.path.join(snapshot_dir, name)
+        target = os.path.join(locations_path, relative_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.lexists(target):
+            os.remove(target)
+        if name == "location.json" or mode == "copy":
+            shutil.copyfile(source, target)
+        elif mode == "symlink":
+            os.symlink(source, target)
+        else:
+            try:
+                os.link(source, target)
+            except OSError:
+                logger.warning("Could not hard link snapshot, copying instead")
+                shutil.copyfile(source, target)
+
+    with open(os.path.join(snapshot_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
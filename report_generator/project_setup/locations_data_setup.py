@@ -15,10 +15,11 @@ import os
 import shutil
 import zipfile
 
-import requests
 import tqdm
 from loguru import logger
 
+from report_generator.project_setup.download_manager import download_file
+
 
 def insert_default_data(dir_path: str) -> None:
     """Insert default data.
@@ -72,24 +73,18 @@ def download_default_data(project_dir: str) -> None:
     """Download the default project data.
 
     Downloads the default data zip file from the project
-    git repository.
+    git repository through the download cache.
 
     Args:
         project_dir (str): The project directory for the files
                            to be downloaded into.
     """
-    logger.info("Downloading location data file")
+    logger.info("Downloading default data file")
     default_data_url = (
         "https://github.com/ccushnahan/report_generator/raw/main/data.zip"
     )
-    with requests.get(default_data_url, stream=True) as response:
-        file_path = os.path.join(project_dir, "data.zip")
-        response.raise_for_status()
-        with open(file_path, "wb") as file:
-            progress_bar = tqdm.tqdm(total=int(response.headers["Content-Length"]))
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-                progress_bar.update(len(chunk))
+    file_path = os.path.join(project_dir, "data.zip")
+    download_file(default_data_url, file_path)
 
 
 def extract_default_data(data_zip_path: str, data_path: str) -> None:
@@ -140,19 +135,13 @@ def location_data_cleanup(locations_path, locations_data_file_path):
 def download_location_data_file(location_dir: str) -> None:
     """Download location data files.
 
-    Download location data file from the geocodes website.
+    Download location data file from the geocodes website. The file
+    is fetched in parallel ranges and shared through the download cache.
     """
     logger.info("Downloading location data file")
     location_file_url = "https://download.geonames.org/export/dump/allCountries.zip"
-    with requests.get(location_file_url, stream=True) as response:
-        """"""
-        file_path = os.path.join(location_dir, "all_countries.zip")
-        response.raise_for_status()
-        with open(file_path, "wb") as file:
-            progress_bar = tqdm.tqdm(total=int(response.headers["Content-Length"]))
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-                progress_bar.update(len(chunk))
+    file_path = os.path.join(location_dir, "all_countries.zip")
+    download_file(location_file_url, file_path, segments=4)
 
 
 def extract_location_data_file(
@@ -184,7 +173,10 @@ def split_location_data_file(locations_path: str) -> None:
     file_location = os.path.join(locations_path, "allCountries.txt")
 
     logger.info("Splitting csv into chunks:")
-    os.makedirs(os.path.join(locations_path, "csv_files", "split_csv"))
+    split_path = os.path.join(locations_path, "csv_files", "split_csv")
+    # Split files are opened in append mode so clear out any earlier attempt
+    shutil.rmtree(split_path, ignore_errors=True)
+    os.makedirs(split_path)
     smallfile = None
     with open(file_location, "r", encoding="utf-8") as big_file:
         progress_bar = tqdm.tqdm(total=os.path.getsize(file_location), desc="Splitting")
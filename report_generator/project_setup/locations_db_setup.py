@@ -3,17 +3,50 @@
 Setup file to create a locations SQLITE database and load location information
 into the database to allow for queries.
 
+The database can be kept current with refresh_location_data, which applies
+the daily GeoNames modifications-YYYY-MM-DD.txt and deletes-YYYY-MM-DD.txt
+files instead of reloading the full dump.
+
 """
 
+import datetime
+import json
 import os
+import re
+import shutil
 import sqlite3
-import time
 from sqlite3 import Error
 
 import pandas
 import tqdm
 from loguru import logger
 
+import report_generator.config
+from report_generator.indexes import LOCATION_INDEXES, create_indexes
+
+GEOCODE_COLUMNS = [
+    "geoname_id",
+    "place_name",
+    "ascii_name",
+    "alternate_names",
+    "latitude",
+    "longitude",
+    "feature_class",
+    "feature_code",
+    "country_code",
+    "cc2",
+    "admin1_code",
+    "admin2_code",
+    "admin3_code",
+    "admin4_code",
+    "population_info",
+    "elevation",
+    "dem",
+    "timezone",
+    "modification",
+]
+DELTA_FILE_PATTERN = re.compile(r"^(modifications|deletes)-(\d{4}-\d{2}-\d{2})\.txt$")
+
 
 def locations_database_setup(location_path: str) -> None:
     """Location database setup.
@@ -31,15 +64,14 @@ def locations_database_setup(location_path: str) -> None:
     conn = create_connection(db_path)
     logger.info("Location Database Created")
     create_tables(conn)
-    time.sleep(1)
     logger.info("Tables Created")
     insert_country_data(conn, csv_path)
     logger.info("Country Data Populated")
-    time.sleep(1)
     logger.info("Populating Geocode data:")
     insert_geocode_data(conn, csv_path)
     logger.info("Geocode Data Populated")
-    time.sleep(1)
+    create_indexes(conn, LOCATION_INDEXES)
+    logger.info("Location Indexes Created")
     logger.info("Location database set up complete.")
     conn.close()
 
@@ -213,6 +245,233 @@ def insert_geocode_data_section(conn: object, file_path: str) -> None:
     data_frame.to_sql("geocode", conn, if_exists="append", index=False)
 
 
+def refresh_location_data(location_path: str, delta_dir: str) -> dict:
+    """Refresh location data.
+
+    Applies the GeoNames daily delta files found in delta_dir to the
+    location database. Modified rows are upserted and deleted rows are
+    removed by geoname_id. Each day is applied in date order in its own
+    transaction and recorded in the geonames_refresh table, so days that
+    were already applied are skipped.
+
+    Lexicon entries in location.json that were resolved from a changed
+    row are updated (continents and countries) or removed so they are
+    looked up again (regions).
+
+    Args:
+        location_path (str):    Path string to project location.
+        delta_dir (str):        Directory holding the delta files
+
+    Returns:
+        summary (dict):         Dates applied, rows modified and deleted and
+                                lexicon entries invalidated
+    """
+    db_path = os.path.join(location_path, "location_database")
+    detach_shared_database(os.path.join(db_path, "location.db"))
+    conn = create_connection(db_path)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS geonames_refresh (
+            refresh_date TEXT NOT NULL PRIMARY KEY,
+            applied TEXT NOT NULL,
+            modified integer NOT NULL,
+            deleted integer NOT NULL
+        )"""
+    )
+    applied = {
+        row[0] for row in conn.execute("SELECT refresh_date FROM geonames_refresh")
+    }
+
+    deltas = {}
+    for file_name in os.listdir(delta_dir):
+        match = DELTA_FILE_PATTERN.match(file_name)
+        if match and match.group(2) not in applied:
+            deltas.setdefault(match.group(2), {})[match.group(1)] = os.path.join(
+                delta_dir, file_name
+            )
+
+    summary = {"dates": [], "modified": 0, "deleted": 0, "invalidated": 0}
+    changes = []
+    for refresh_date in sorted(deltas):
+        modified = read_delta_file(deltas[refresh_date].get("modifications"))
+        deleted = [
+            row[0] for row in read_delta_file(deltas[refresh_date].get("deletes"))
+        ]
+        with conn:
+            changes.extend(apply_geocode_delta(conn, modified, deleted))
+            conn.execute(
+                "INSERT INTO geonames_refresh VALUES (?, ?, ?, ?)",
+                (
+                    refresh_date,
+                    datetime.datetime.now().isoformat(),
+                    len(modified),
+                    len(deleted),
+                ),
+            )
+        logger.info(
+            f"Applied GeoNames delta {refresh_date}: "
+            f"{len(modified)} modified, {len(deleted)} deleted"
+        )
+        summary["dates"].append(refresh_date)
+        summary["modified"] += len(modified)
+        summary["deleted"] += len(deleted)
+    conn.close()
+
+    json_path = os.path.join(location_path, "location_json", "location.json")
+    if changes and os.path.isfile(json_path):
+        summary["invalidated"] = invalidate_location_json(json_path, changes)
+    return summary
+
+
+def refresh_project_locations(delta_dir: str) -> None:
+    """Refresh project locations.
+
+    Applies GeoNames delta files to the location data of the project in
+    config.yaml.
+
+    Args:
+        delta_dir (str):    Directory holding the delta files
+    """
+    config = report_generator.config.load_config()
+    if config is None:
+        logger.error("No project config found.")
+        return
+    location_path = os.path.join(config["dir_path"], "data", "locations")
+    summary = refresh_location_data(location_path, delta_dir)
+    if not summary["dates"]:
+        logger.info("Location data is up to date")
+
+
+def read_delta_file(file_path: str) -> list:
+    """Read delta file.
+
+    Reads a tab separated GeoNames delta file. Empty values are read as
+    NULL, matching the full import.
+
+    Args:
+        file_path (str):    Path to the delta file, or None
+
+    Returns:
+        rows (list):        List of row value lists
+    """
+    if file_path is None:
+        return []
+    rows = []
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.rstrip("\n")
+            if line:
+                rows.append(
+                    [value if value != "" else None for value in line.split("\t")]
+                )
+    return rows
+
+
+def apply_geocode_delta(
+    conn: sqlite3.Connection, modified: list, deleted: list
+) -> list:
+    """Apply geocode delta.
+
+    Args:
+        conn:               SQLite3 connection object
+        modified (list):    Rows of modified geocode values
+        deleted (list):     geoname_ids of deleted rows
+
+    Returns:
+        changes (list):     (old row, new row) pairs of the changed rows. Each
+                            row is a (place_name, ascii_name, latitude,
+                            longitude) tuple or None.
+    """
+    select_sql = (
+        "SELECT place_name, ascii_name, latitude, longitude FROM geocode "
+        "WHERE geoname_id = ?"
+    )
+    changes = []
+    for row in modified:
+        old = conn.execute(select_sql, (row[0],)).fetchone()
+        changes.append((old, (row[1], row[2], row[4], row[5])))
+    for geoname_id in deleted:
+        old = conn.execute(select_sql, (geoname_id,)).fetchone()
+        if old is not None:
+            changes.append((old, None))
+
+    columns = ", ".join(GEOCODE_COLUMNS)
+    marks = ", ".join("?" * len(GEOCODE_COLUMNS))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO geocode ({columns}) VALUES ({marks})",
+        [row[: len(GEOCODE_COLUMNS)] for row in modified],
+    )
+    conn.executemany(
+        "DELETE FROM geocode WHERE geoname_id = ?", [(i,) for i in deleted]
+    )
+    return changes
+
+
+def invalidate_location_json(json_path: str, changes: list) -> int:
+    """Invalidate location json.
+
+    Continent and country entries resolved from a changed row take the
+    new coordinates. Region entries resolved from a changed row are
+    removed so they are searched for again.
+
+    Args:
+        json_path (str):    Path to location.json
+        changes (list):     (old row, new row) pairs from apply_geocode_delta
+
+    Returns:
+        count (int):        Number of entries updated or removed
+    """
+    with open(json_path, "r", encoding="utf-8") as file:
+        location_data = json.load(file)
+
+    replaced = {}
+    for old, new in changes:
+        if old is None or old[2] is None or old[3] is None:
+            continue
+        for name in old[:2]:
+            if name:
+                replaced[(name.lower(), float(old[2]), float(old[3]))] = new
+
+    count = 0
+    for section in ["continent", "country", "region"]:
+        for key, entry in list(location_data.get(section, {}).items()):
+            try:
+                lookup = (key, float(entry["latitude"]), float(entry["longitude"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if lookup not in replaced:
+                continue
+            new = replaced[lookup]
+            if section == "region" or new is None:
+                del location_data[section][key]
+            else:
+                entry["latitude"] = float(new[2])
+                entry["longitude"] = float(new[3])
+            count += 1
+
+    with open(json_path, "w", encoding="utf-8") as file:
+        file.write(json.dumps(location_data, ensure_ascii=False))
+    logger.info(f"Invalidated {count} location json entries")
+    return count
+
+
+def detach_shared_database(db_file: str) -> None:
+    """Detach shared database.
+
+    A location database attached from a snapshot may be a symlink or hard
+    link to the read-only snapshot store. It is replaced with a private
+    writable copy before it is modified.
+
+    Args:
+        db_file (str):      Path to location.db
+    """
+    if not os.path.islink(db_file) and os.stat(db_file).st_nlink == 1:
+        return
+    logger.info("Copying shared location database before refresh")
+    partial_path = f"{db_file}.part"
+    shutil.copyfile(db_file, partial_path)
+    os.replace(partial_path, db_file)
+
+
 def main():
     """Locations db main method."""
     locations_database_setup()
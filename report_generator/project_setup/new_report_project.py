@@ -2,72 +2,275 @@
 
 Setup configuration files and directories for report project.
 
-Will have more info soon
+The setup is run as a pipeline of checkpointed steps (see setup_pipeline.py).
+Independent steps run at the same time and an interrupted setup can be
+resumed, skipping the steps that already finished.
+
+A project can attach a prebuilt location snapshot (see
+location_snapshot.py) instead of downloading and loading the GeoNames data.
+
+Usage:
+    create-report-generator [--resume] [--snapshot=<bundle>] [--attach-mode=<mode>]
+    create-report-generator --export-snapshot=<bundle> [--label=<label>]
+
+Options:
+    -h --help               Show this screen.
+    --resume                Resume an interrupted setup using the existing
+                            config.yaml, skipping steps that already finished.
+    --snapshot=<bundle>     Attach the location data from a snapshot bundle.
+    --attach-mode=<mode>    How the snapshot database is attached: copy, link
+                            or symlink [default: copy].
+    --export-snapshot=<bundle>
+                            Export the current project's location data as a
+                            snapshot bundle.
+    --label=<label>         Label stored in the snapshot manifest.
 
 """
 
+import functools
 import os
 import pathlib
-import time
+import shutil
 
+import pandas
 import yaml
+from docopt import docopt
 from loguru import logger
 
+import report_generator.config
+import report_generator.excel_extraction.clean_data
 import report_generator.excel_extraction.excel_to_sql
+import report_generator.project_setup.location_snapshot
 import report_generator.project_setup.locations_data_setup
 import report_generator.project_setup.locations_db_setup
 import report_generator.project_setup.locations_json_setup
 import report_generator.project_setup.project_directory_setup
+from report_generator.project_setup.setup_pipeline import SetupPipeline, SetupStep
 
+CLEAN_DATA_FILE = os.path.join("data", "excel_src", "species_clean.pkl")
+LOCATION_DB_FILE = os.path.join("data", "locations", "location_database", "location.db")
+SPECIES_DB_FILE = os.path.join("data", "database", "species.db")
 
-def create_new_project(settings_dict: dict = None) -> None:
+
+def create_new_project(
+    settings_dict: dict = None,
+    resume: bool = False,
+    snapshot: str = None,
+    attach_mode: str = "copy",
+) -> None:
     """Create new report project.
 
-    Creates a new report project.
+    Creates a new report project. The project directory and config file
+    are created first, the remaining setup is run as a pipeline of steps.
 
     Examples:
-        Example of use.
+        create_new_project()
+        create_new_project(resume=True)
+        create_new_project(snapshot="locations.tar.gz", attach_mode="link")
 
+    Args:
+        settings_dict (dict):   Settings dict provided by the GUI. If None the
+                                user is asked for settings on the CLI.
+        resume (bool):          Resume an interrupted setup. Settings are
+                                loaded from the existing config.yaml when
+                                present.
+        snapshot (str):         Path to a location snapshot bundle to attach
+                                instead of building the location data
+        attach_mode (str):      How the snapshot database is attached
     """
     HOME_DIR = pathlib.Path.home()
     logger.info("Starting new Project")
     try:
-        settings = get_project_settings(settings_dict)
+        settings = None
+        if resume and settings_dict is None:
+            settings = report_generator.config.load_config()
+        if settings is None:
+            settings = get_project_settings(settings_dict)
         dir_path = report_generator.project_setup.project_directory_setup.create_dirs(
-            HOME_DIR, settings["project_name"]
+            HOME_DIR, settings["project_name"], exist_ok=resume
         )
         settings["dir_path"] = dir_path
         create_project_config_file(settings)
 
-        report_generator.project_setup.locations_data_setup.insert_default_data(
-            dir_path
-        )
-        # dir_path = os.path.join(HOME_DIR, "c",)
-        time.sleep(5)
-        report_generator.project_setup.locations_db_setup.locations_database_setup(
-            os.path.join(dir_path, "data", "locations")
-        )
-        time.sleep(5)
-        report_generator.project_setup.locations_json_setup.locations_json_setup(
-            os.path.join(dir_path, "data", "locations")
-        )
-
-        database_path = os.path.join(dir_path, "data", "database", "species.db")
-
-        report_generator.excel_extraction.excel_to_sql.export_to_database(
-            settings["data_set"], database_path
-        )
+        steps = get_setup_steps(settings, dir_path, snapshot, attach_mode)
+        SetupPipeline(dir_path, steps, resume=resume).run()
 
         logger.info("Report Project set up complete!")
     except FileExistsError as e:
         logger.error(e)
-    except FileNotFoundError as e:
+        logger.error("Use --resume to continue setting up an existing project.")
+    except (FileNotFoundError, ValueError) as e:
         logger.error(e)
     except KeyboardInterrupt as e:
         logger.error(e)
         logger.error("Quitting Application...")
 
 
+def get_setup_steps(
+    settings: dict, dir_path: str, snapshot: str = None, attach_mode: str = "copy"
+) -> list:
+    """Get setup steps.
+
+    Builds the graph of steps used to set up a project. If a snapshot is
+    given the GeoNames steps are replaced by a single attach step.
+
+    Args:
+        settings (dict):    Project settings
+        dir_path (str):     Path to the project directory
+        snapshot (str):     Path to a location snapshot bundle, or None
+        attach_mode (str):  How the snapshot database is attached
+
+    Returns:
+        steps (list):       List of SetupStep objects
+    """
+    data_path = os.path.join(dir_path, "data")
+    locations_path = os.path.join(data_path, "locations")
+    zip_path = os.path.join(locations_path, "all_countries.zip")
+    data_setup = report_generator.project_setup.locations_data_setup
+    json_setup = report_generator.project_setup.locations_json_setup
+    location_snapshot = report_generator.project_setup.location_snapshot
+
+    steps = [
+        SetupStep(
+            "default_data",
+            functools.partial(data_setup.default_data_setup, dir_path, data_path),
+            outputs=["data.zip"],
+        ),
+        SetupStep(
+            "species_sheet",
+            functools.partial(read_species_sheet, settings["data_set"], dir_path),
+            outputs=[CLEAN_DATA_FILE],
+        ),
+    ]
+    if snapshot is not None:
+        return [
+            *steps,
+            SetupStep(
+                "location_snapshot",
+                functools.partial(
+                    location_snapshot.attach_snapshot,
+                    snapshot,
+                    locations_path,
+                    attach_mode,
+                ),
+                requires=["default_data"],
+            ),
+            SetupStep(
+                "species_db",
+                functools.partial(setup_species_database, dir_path),
+                requires=["species_sheet", "location_snapshot"],
+                outputs=[SPECIES_DB_FILE],
+            ),
+        ]
+
+    return [
+        *steps,
+        SetupStep(
+            "location_download",
+            functools.partial(data_setup.download_location_data_file, locations_path),
+            outputs=[os.path.join("data", "locations", "all_countries.zip")],
+        ),
+        SetupStep(
+            "location_extract",
+            functools.partial(
+                data_setup.extract_location_data_file, locations_path, zip_path
+            ),
+            requires=["location_download"],
+            outputs=[os.path.join("data", "locations", "allCountries.txt")],
+        ),
+        SetupStep(
+            "location_split",
+            functools.partial(data_setup.split_location_data_file, locations_path),
+            requires=["location_extract"],
+        ),
+        SetupStep(
+            "location_cleanup",
+            functools.partial(
+                data_setup.location_data_cleanup, locations_path, zip_path
+            ),
+            requires=["location_split"],
+        ),
+        SetupStep(
+            "location_db",
+            functools.partial(setup_location_database, dir_path),
+            requires=["default_data", "location_split"],
+            outputs=[LOCATION_DB_FILE],
+        ),
+        SetupStep(
+            "location_json",
+            functools.partial(json_setup.locations_json_setup, locations_path),
+            requires=["location_db"],
+            # location.json is added to by the species import so only the
+            # marker is checked for this step.
+        ),
+        SetupStep(
+            "species_db",
+            functools.partial(setup_species_database, dir_path),
+            requires=["species_sheet", "location_json"],
+            outputs=[SPECIES_DB_FILE],
+        ),
+    ]
+
+
+def setup_location_database(dir_path: str) -> None:
+    """Set up location database.
+
+    Removes any partly loaded location database before loading the
+    GeoNames data, so the step can be safely rerun.
+
+    Args:
+        dir_path (str):     Path to the project directory
+    """
+    db_path = os.path.join(dir_path, LOCATION_DB_FILE)
+    if os.path.isfile(db_path):
+        os.remove(db_path)
+    report_generator.project_setup.locations_db_setup.locations_database_setup(
+        os.path.join(dir_path, "data", "locations")
+    )
+
+
+def read_species_sheet(data_set: str, dir_path: str) -> None:
+    """Read species sheet.
+
+    Reads and cleans the dataset spreadsheet and stores the result in
+    the project so it can be imported once the location data is ready.
+
+    Args:
+        data_set (str):     Path to the dataset spreadsheet
+        dir_path (str):     Path to the project directory
+    """
+    data_frame = report_generator.excel_extraction.excel_to_sql.create_data_frame(
+        data_set
+    )
+    if data_frame is None:
+        raise FileNotFoundError(f"Could not read data set: {data_set}")
+    clean_data_frame = report_generator.excel_extraction.clean_data.clean_data(
+        data_frame
+    )
+    clean_data_frame.to_pickle(os.path.join(dir_path, CLEAN_DATA_FILE))
+
+
+def setup_species_database(dir_path: str) -> None:
+    """Set up species database.
+
+    Exports the cleaned dataset into a fresh species database.
+
+    Args:
+        dir_path (str):     Path to the project directory
+    """
+    db_path = os.path.join(dir_path, SPECIES_DB_FILE)
+    partial_path = f"{db_path}.part"
+    if os.path.isfile(partial_path):
+        os.remove(partial_path)
+    clean_data_frame = pandas.read_pickle(os.path.join(dir_path, CLEAN_DATA_FILE))
+    excel_to_sql = report_generator.excel_extraction.excel_to_sql
+    excel_to_sql.export_data_frame_to_database(
+        clean_data_frame, partial_path, store=False
+    )
+    shutil.move(partial_path, db_path)
+    excel_to_sql.write_storage_backend(db_path)
+
+
 def get_project_settings(settings: dict = None) -> None:
     """CLI to query project setup from user.
 
@@ -142,15 +345,44 @@ def create_project_config_file(settings: dict) -> None:
         yaml.dump(settings, file)
 
 
+def export_project_snapshot(bundle_path: str, label: str = None) -> None:
+    """Export project snapshot.
+
+    Exports the location data of the project in config.yaml as a
+    snapshot bundle.
+
+    Args:
+        bundle_path (str):  Path the bundle is written to
+        label (str):        Label stored in the snapshot manifest
+    """
+    config = report_generator.config.load_config()
+    if config is None:
+        logger.error("No project config found.")
+        return
+    locations_path = os.path.join(config["dir_path"], "data", "locations")
+    report_generator.project_setup.location_snapshot.export_snapshot(
+        locations_path, bundle_path, label
+    )
+
+
 def main():
     """Create new Report.
 
     Main method for module.
 
     Example:
-        Example use case.
+        create-report-generator --resume
+        create-report-generator --snapshot=locations.tar.gz --attach-mode=link
     """
-    create_new_project()
+    arguments = docopt(__doc__)
+    if arguments["--export-snapshot"]:
+        export_project_snapshot(arguments["--export-snapshot"], arguments["--label"])
+        return
+    create_new_project(
+        resume=arguments["--resume"],
+        snapshot=arguments["--snapshot"],
+        attach_mode=arguments["--attach-mode"],
+    )
 
 
 if __name__ == "__main__":
@@ -11,10 +11,12 @@ Methods:
 import os
 
 
-def create_dirs(home_dir: str, directory_name: str) -> str:
+def create_dirs(home_dir: str, directory_name: str, exist_ok: bool = False) -> str:
     """Create the project directories.
 
-    Creates directories for project files to be inserted.
+    Creates directories for project files to be inserted. If exist_ok
+    is set, an existing project directory is reused, for example when
+    resuming an interrupted setup.
 
     Examples:
         Example of use.
@@ -25,22 +27,24 @@ def create_dirs(home_dir: str, directory_name: str) -> str:
 
         directory_name (str):   String value for the name of the
                                 directory that is created.
+
+        exist_ok (bool):        Reuse the directory if it already exists.
     Returns:
         dir_path (str):         String value for the path to the
                                 project's directory
     """
     dir_path = os.path.join(home_dir, directory_name)
 
-    if check_if_dir_exists(dir_path):
+    if check_if_dir_exists(dir_path) and not exist_ok:
         raise FileExistsError(f"Directory {directory_name} already exists")
 
-    os.makedirs(dir_path)
-    os.makedirs(os.path.join(dir_path, "data"))
-    os.makedirs(os.path.join(dir_path, "data", "database"))
-    os.makedirs(os.path.join(dir_path, "data", "excel_src"))
-    os.makedirs(os.path.join(dir_path, "data", "duplicates"))
+    os.makedirs(dir_path, exist_ok=exist_ok)
+    os.makedirs(os.path.join(dir_path, "data"), exist_ok=exist_ok)
+    os.makedirs(os.path.join(dir_path, "data", "database"), exist_ok=exist_ok)
+    os.makedirs(os.path.join(dir_path, "data", "excel_src"), exist_ok=exist_ok)
+    os.makedirs(os.path.join(dir_path, "data", "duplicates"), exist_ok=exist_ok)
     # os.makedirs(os.path.join(dir_path, "data", "locations"))
-    os.makedirs(os.path.join(dir_path, "report"))
+    os.makedirs(os.path.join(dir_path, "report"), exist_ok=exist_ok)
 
     return dir_path
 
@@ -0,0 +1,254 @@
+"""# Setup pipeline.
+
+Runs the project setup as a graph of checkpointed steps.
+
+Each step declares the steps it requires and the files it produces. When a
+step finishes a completion marker is written to the project's '.setup'
+directory recording a checksum of each output file. Steps whose
+requirements are complete are run concurrently, so independent work such
+as reading the species sheet overlaps with the GeoNames download and load.
+
+When resuming, a step is skipped if its marker is present and its outputs
+still match their checksums. A step is also skipped when every step that
+depends on it is already satisfied, as its outputs are no longer needed.
+This allows intermediate files, such as the GeoNames zip, to be cleaned up
+without forcing them to be rebuilt.
+
+Classes:
+    SetupStep:      A single step of the setup
+    SetupPipeline:  Runs setup steps in dependency order
+
+Functions:
+    file_checksum:  Returns the sha256 checksum of a file
+"""
+import datetime
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from loguru import logger
+
+
+def file_checksum(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """Get file checksum.
+
+    Args:
+        file_path (str):    Path to the file
+        chunk_size (int):   Number of bytes read at a time
+
+    Returns:
+        checksum (str):     Hex sha256 digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SetupStep:
+    """SetupStep.
+
+    Class representing a single setup step.
+
+    Args:
+        name (str):         Unique name of the step
+        func (callable):    Function called with no arguments to run the step
+        requires (list):    Names of steps that must complete first
+        outputs (list):     Paths, relative to the project directory, of files
+                            produced by the step
+    """
+
+    def __init__(
+        self, name: str, func, requires: list = None, outputs: list = None
+    ) -> None:
+        """Init method for SetupStep."""
+        self.name = name
+        self.func = func
+        self.requires = requires or []
+        self.outputs = outputs or []
+
+
+class SetupPipeline:
+    """SetupPipeline.
+
+    Runs setup steps in dependency order with completion markers.
+
+    Args:
+        dir_path (str):     Path to the project directory
+        steps (list):       List of SetupStep objects
+        resume (bool):      Skip steps that already completed
+        max_workers (int):  Maximum number of steps run at once
+    """
+
+    def __init__(
+        self, dir_path: str, steps: list, resume: bool = False, max_workers: int = 4
+    ) -> None:
+        """Init method for SetupPipeline."""
+        self.dir_path = dir_path
+        self.steps = {step.name: step for step in steps}
+        self.resume = resume
+        self.max_workers = max_workers
+        self.marker_path = os.path.join(dir_path, ".setup")
+        self.order = self.topological_order()
+
+    def topological_order(self) -> list:
+        """Get topological order.
+
+        Returns:
+            order (list):   Step names ordered so each step follows the
+                            steps it requires
+
+        Raises:
+            ValueError:     If a requirement is unknown or steps form a cycle
+        """
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if name not in self.steps:
+                raise ValueError(f"Unknown setup step: {name}")
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Setup steps form a cycle: {' -> '.join(path)}")
+            state[name] = "visiting"
+            for required in self.steps[name].requires:
+                visit(required, [*path, required])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.steps:
+            visit(name, [name])
+        return order
+
+    def marker_file(self, name: str) -> str:
+        """Get the marker file path for a step."""
+        return os.path.join(self.marker_path, f"{name}.json")
+
+    def write_marker(self, step: SetupStep) -> None:
+        """Write completion marker.
+
+        Records the completion time and the checksum of each output.
+
+        Args:
+            step (SetupStep):   The completed step
+        """
+        outputs = {}
+        for output in step.outputs:
+            outputs[output] = file_checksum(os.path.join(self.dir_path, output))
+        marker = {
+            "step": step.name,
+            "completed": datetime.datetime.now().isoformat(),
+            "outputs": outputs,
+        }
+        with open(self.marker_file(step.name), "w", encoding="utf-8") as file:
+            json.dump(marker, file, indent=2)
+
+    def is_complete(self, step: SetupStep) -> bool:
+        """Check if step is complete.
+
+        A step is complete if its marker exists and each output file
+        still matches the checksum recorded in the marker.
+
+        Args:
+            step (SetupStep):   The step to check
+
+        Returns:
+            complete (bool):    Whether the step is complete
+        """
+        try:
+            with open(self.marker_file(step.name), "r", encoding="utf-8") as file:
+                marker = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+        for output in step.outputs:
+            output_path = os.path.join(self.dir_path, output)
+            if not os.path.isfile(output_path):
+                return False
+            if marker["outputs"].get(output) != file_checksum(output_path):
+                logger.warning(f"Checksum mismatch for {output}")
+                return False
+        return True
+
+    def satisfied_steps(self) -> set:
+        """Get satisfied steps.
+
+        Walks the steps in reverse dependency order. A step is satisfied
+        if it is complete, or if it has dependents and every one of them
+        is satisfied.
+
+        Returns:
+            satisfied (set):    Names of steps that do not need to run
+        """
+        dependents = {name: [] for name in self.steps}
+        for step in self.steps.values():
+            for required in step.requires:
+                dependents[required].append(step.name)
+
+        satisfied = set()
+        for name in reversed(self.order):
+            step_dependents = dependents[name]
+            if self.is_complete(self.steps[name]):
+                satisfied.add(name)
+            elif step_dependents and all(d in satisfied for d in step_dependents):
+                satisfied.add(name)
+        return satisfied
+
+    def run(self) -> list:
+        """Run setup steps.
+
+        Runs each step once all of its requirements are complete. Steps
+        that are ready at the same time are run concurrently. If a step
+        fails the remaining steps are not started and the error is raised
+        once running steps have finished.
+
+        Returns:
+            ran (list):     Names of the steps that were run
+        """
+        if self.resume:
+            done = self.satisfied_steps()
+            for name in self.order:
+                if name in done:
+                    logger.info(f"Skipping completed setup step: {name}")
+        else:
+            shutil.rmtree(self.marker_path, ignore_errors=True)
+            done = set()
+        os.makedirs(self.marker_path, exist_ok=True)
+
+        ran = []
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                if error is None:
+                    for name in self.order:
+                        step = self.steps[name]
+                        ready = all(r in done for r in step.requires)
+                        if name in done or name in running.values() or not ready:
+                            continue
+                        logger.info(f"Starting setup step: {name}")
+                        running[executor.submit(step.func)] = name
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                        self.write_marker(self.steps[name])
+                    except Exception as e:  # noqa: B902
+                        logger.error(f"Setup step failed: {name}")
+                        error = error or e
+                        continue
+                    logger.info(f"Finished setup step: {name}")
+                    done.add(name)
+                    ran.append(name)
+
+        if error is not None:
+            raise error
+        return ran
@@ -1,6 +1,18 @@
 """# Read From DB
 
-This package consists of only one module:
+This package consists of the following modules:
 - query_db.py: This module is used to structure database queries based upon varying filter parameters.
+- query_compiler.py: Compiles query options into parameterised SQL with cached
+  statement templates.
+- connection_pool.py: Thread-safe pool of read-only connections to the species database.
+- species_store.py: In-memory columnar species store for --no-db reports.
+- query_log.py: Query plan inspector and slow-query log.
+- storage.py: Storage backend interface and the columnar backend.
+- species_search.py: Full-text species search index ranked by BM25.
+- species_report.py: Builds and refreshes the materialised species_report table.
+- bitmap_index.py: In-process bitmap index over the species facets.
+- facets.py: Match and facet counts for live filter feedback.
+- result_cache.py: Memory and disk cache of query results keyed by options and
+  database fingerprint.
 
 """
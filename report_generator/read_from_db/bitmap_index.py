@@ -0,0 +1,293 @@
+"""# Bitmap Index.
+
+In-process bitmap index over the species facets.
+
+The index is built once per database version from the normalised
+tables. Each species has a fixed position, and every value of a text
+facet (Order, Family, Genus, Species, IUCN, ParityMode, PopTrend, the
+Activity, MicroHabitat and NestingSite junctions and the species
+locations) has a bitmap of the species that hold it, packed eight
+species to a byte with numpy. Numeric columns are kept as sorted value
+and position arrays and answer =, BETWEEN, >= and <= by binary search.
+
+Query options are matched against the facet values in Python and
+combined with bitwise OR within an option and AND across options, so
+only the final species_ids are fetched from SQLite. The matching follows
+SQLite: LIKE is case-insensitive for ASCII letters, NULLs never match
+and text stored in a numeric column sorts after every number. Options
+the index can not answer exactly, such as LIKE patterns with their own
+wildcards, and full-text searches return None and are left to SQL.
+
+Classes:
+    BitmapIndex:        Facet bitmaps and sorted numeric columns
+
+Functions:
+    get_bitmap_index:   Returns the index of a database, built if needed
+"""
+import bisect
+import sqlite3
+import threading
+
+import numpy
+from loguru import logger
+
+from report_generator.read_from_db.query_compiler import (
+    QUERY_COLUMNS,
+    SEARCH_KEY,
+    format_species_query,
+    normalise_option,
+)
+from report_generator.read_from_db.result_cache import get_db_fingerprint
+
+# Output columns matched as text facets
+TEXT_COLUMNS = [
+    "Order",
+    "Family",
+    "Genus",
+    "Species",
+    "ParityMode",
+    "IUCN",
+    "PopTrend",
+]
+
+# Output columns matched as numbers
+NUMERIC_COLUMNS = [
+    "SVLMMx",
+    "SVLFMx",
+    "SVLMx",
+    "Longevity",
+    "ClutchMin",
+    "ClutchMax",
+    "Clutch",
+    "EggDiameter",
+    "RangeSize",
+    "ElevationMin",
+    "ElevationMax",
+    "Elevation",
+]
+
+# Junction facets and the query returning (species_id, value) rows
+JUNCTION_SQL = {
+    "Activity": """SELECT species_id, activity_kind FROM activity_species
+        JOIN activity ON activity_species.activity_id = activity.activity_id""",
+    "MicroHabitat": """SELECT species_id, micro_habitat_name
+        FROM micro_habitat_species JOIN micro_habitat
+        ON micro_habitat_species.micro_habitat_id = micro_habitat.micro_habitat_id""",
+    "NestingSite": """SELECT species_id, nesting_site_desc
+        FROM nesting_site_species JOIN nesting_site
+        ON nesting_site_species.nesting_site_id = nesting_site.nesting_site_id""",
+}
+
+LOCATION_SQL = f"""SELECT geo_location_species.species_id,
+        {QUERY_COLUMNS["GeographicRegion"]}
+    FROM geo_location_species
+        JOIN geo_location
+            ON geo_location_species.geo_location_id = geo_location.geo_location_id
+        JOIN country ON geo_location.country_id = country.country_id
+        JOIN continent ON country.continent_id = continent.continent_id"""
+
+ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+INDEXES = {}
+INDEXES_LOCK = threading.Lock()
+
+
+class BitmapIndex:
+    """BitmapIndex.
+
+    Facet bitmaps and sorted numeric columns of the species table.
+
+    Args:
+        conn (sqlite3.Connection):  Connection to the species database
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        """Init method for BitmapIndex, reads the tables."""
+        cursor = conn.execute(format_species_query("", "", with_id=True))
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        self.species_ids = numpy.array([row[0] for row in rows], dtype=numpy.int64)
+        self.size = len(rows)
+        positions = {row[0]: i for i, row in enumerate(rows)}
+
+        self.facets = {}
+        for column in TEXT_COLUMNS:
+            index = columns.index(column)
+            self.facets[column] = self.build_facet(
+                (i, row[index]) for i, row in enumerate(rows)
+            )
+        for column, sql in JUNCTION_SQL.items():
+            self.facets[column] = self.build_facet(
+                (positions[species_id], value)
+                for species_id, value in conn.execute(sql)
+                if species_id in positions
+            )
+        self.facets["GeographicRegion"] = self.build_facet(
+            (positions[species_id], value)
+            for species_id, value in conn.execute(LOCATION_SQL)
+            if species_id in positions
+        )
+
+        self.numbers = {}
+        for column in NUMERIC_COLUMNS:
+            index = columns.index(column)
+            pairs = sorted(
+                (sort_number(row[index]), i)
+                for i, row in enumerate(rows)
+                if row[index] is not None
+            )
+            self.numbers[column] = (
+                [value for value, _ in pairs],
+                numpy.array([i for _, i in pairs], dtype=numpy.int64),
+            )
+
+    def build_facet(self, pairs) -> dict:
+        """Build facet.
+
+        Args:
+            pairs (iterable):   (position, value) pairs
+
+        Returns:
+            facet (dict):       Bitmap of each non null value
+        """
+        members = {}
+        for position, value in pairs:
+            if value is not None:
+                members.setdefault(str(value), []).append(position)
+        return {value: self.to_bitmap(found) for value, found in members.items()}
+
+    def to_bitmap(self, positions) -> numpy.ndarray:
+        """Pack species positions into a bitmap."""
+        bits = numpy.zeros(self.size, dtype=bool)
+        bits[positions] = True
+        return numpy.packbits(bits, bitorder="little")
+
+    def empty(self) -> numpy.ndarray:
+        """Get a bitmap with no species set."""
+        return numpy.zeros((self.size + 7) // 8, dtype=numpy.uint8)
+
+    def full(self) -> numpy.ndarray:
+        """Get a bitmap with every species set."""
+        return self.to_bitmap(slice(None))
+
+    def filter(self, query_options: dict) -> list:
+        """Filter species.
+
+        Args:
+            query_options (dict):   Options from get_query_options
+
+        Returns:
+            species_ids (list):     Matching species_ids in ascending order,
+                                    or None if an option can not be answered
+                                    by the index
+        """
+        result = self.full()
+        for key, value in query_options.items():
+            bitmap = self.match_option(key, value)
+            if bitmap is None:
+                return None
+            result &= bitmap
+        return self.to_species_ids(result)
+
+    def to_species_ids(self, bitmap: numpy.ndarray) -> list:
+        """Unpack a bitmap into sorted species_ids."""
+        bits = numpy.unpackbits(bitmap, count=self.size, bitorder="little")
+        return sorted(self.species_ids[numpy.flatnonzero(bits)].tolist())
+
+    def match_option(self, key: str, value) -> numpy.ndarray:
+        """Match option.
+
+        Args:
+            key (str):          Query option key
+            value (str|list):   Query option value
+
+        Returns:
+            bitmap (ndarray):   Species matching any of the option values,
+                                or None if the option is not supported
+        """
+        if key == SEARCH_KEY:
+            return None
+        ops, values = normalise_option(key, value)
+        column = "Order" if QUERY_COLUMNS[key] == "order_taxon_name" else key
+        if not ops:
+            return self.full()
+        if ops == ("BETWEEN",):
+            if column not in self.numbers:
+                return None
+            return self.match_range(column, values[0], values[1])
+
+        result = self.empty()
+        for op, item in zip(ops, values):
+            if column in self.numbers and op == "=":
+                bitmap = self.match_range(column, item, item)
+            elif column in self.numbers and op == ">=":
+                bitmap = self.match_range(column, item, None)
+            elif column in self.numbers and op == "<=":
+                bitmap = self.match_range(column, None, item)
+            elif column in self.facets and op == "LIKE":
+                bitmap = self.match_like(column, item)
+            else:
+                bitmap = None
+            if bitmap is None:
+                return None
+            result |= bitmap
+        return result
+
+    def match_range(self, column: str, low, high) -> numpy.ndarray:
+        """Match species with low <= value <= high, either bound optional."""
+        values, positions = self.numbers[column]
+        start = 0 if low is None else bisect.bisect_left(values, low)
+        end = len(values) if high is None else bisect.bisect_right(values, high)
+        return self.to_bitmap(positions[start:end])
+
+    def match_like(self, column: str, pattern: str) -> numpy.ndarray:
+        """Match species with a facet value LIKE the pattern.
+
+        Only patterns without wildcards, or with a single leading and
+        trailing %, are supported.
+        """
+        text = pattern
+        substring = len(text) >= 2 and text.startswith("%") and text.endswith("%")
+        if substring:
+            text = text[1:-1]
+        if "%" in text or "_" in text:
+            return None
+        text = text.translate(ASCII_LOWER)
+
+        result = self.empty()
+        for value, bitmap in self.facets[column].items():
+            value = value.translate(ASCII_LOWER)
+            if (text in value) if substring else (text == value):
+                result |= bitmap
+        return result
+
+
+def get_bitmap_index(db_path: str, conn: sqlite3.Connection) -> BitmapIndex:
+    """Get bitmap index.
+
+    The index of each database is kept in memory and rebuilt when the
+    database fingerprint changes.
+
+    Args:
+        db_path (str):              Path to the species database
+        conn (sqlite3.Connection):  Connection used to build the index
+
+    Returns:
+        index (BitmapIndex):        Index of the current database version
+    """
+    fingerprint = get_db_fingerprint(db_path)
+    with INDEXES_LOCK:
+        cached = INDEXES.get(fingerprint[0])
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        logger.info("Building species bitmap index")
+        index = BitmapIndex(conn)
+        INDEXES[fingerprint[0]] = (fingerprint, index)
+        return index
+
+
+def sort_number(value) -> float:
+    """Sort key of a numeric column value, text sorts after every number."""
+    if isinstance(value, (int, float)):
+        return value
+    return float("inf")
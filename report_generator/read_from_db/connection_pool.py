@@ -0,0 +1,190 @@
+"""# Connection Pool.
+
+Thread-safe pool of read-only connections to the species database.
+
+Connections are opened with a mode=ro URI and tuned pragmas, and are
+handed out to one thread at a time. Idle connections are kept for reuse
+so repeated queries from the GUI, the CLI or batch renderers do not pay
+for opening the database and warming its cache each time. If the
+database file is replaced, for example by a new import, idle
+connections are closed and new ones are opened on the new file.
+
+Pools are shared per database path through get_pool and closed when the
+interpreter exits.
+
+Classes:
+    ConnectionPool:     Pool of read-only SQLite connections
+
+Functions:
+    get_pool:           Returns the shared pool for a database path
+    close_all:          Closes every shared pool
+"""
+import atexit
+import contextlib
+import os
+import pathlib
+import sqlite3
+import threading
+
+from loguru import logger
+
+# Pragmas applied to each pooled connection
+READ_PRAGMAS = {
+    "query_only": "ON",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+
+
+class ConnectionPool:
+    """ConnectionPool.
+
+    Pool of read-only SQLite connections.
+
+    Args:
+        db_path (str):      Path to the database file
+        max_size (int):     Maximum number of open connections. Threads
+                            wait for a connection when all are in use.
+        pragmas (dict):     Pragmas applied to each connection
+    """
+
+    def __init__(self, db_path: str, max_size: int = 4, pragmas: dict = None) -> None:
+        """Init method for ConnectionPool."""
+        self.db_path = os.path.abspath(db_path)
+        self.max_size = max_size
+        self.pragmas = READ_PRAGMAS if pragmas is None else pragmas
+        self.idle = []
+        self.open_count = 0
+        self.closed = False
+        self.file_id = None
+        self.condition = threading.Condition()
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a read-only connection with the pool pragmas.
+
+        Raises:
+            sqlite3.OperationalError:   If the database can not be opened
+        """
+        uri = f"{pathlib.Path(self.db_path).as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def get_file_id(self) -> tuple:
+        """Get an id that changes when the database file is replaced."""
+        stat = os.stat(self.db_path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def acquire(self) -> sqlite3.Connection:
+        """Acquire connection.
+
+        Returns an idle connection, opens a new one if the pool is not
+        full, or waits for a connection to be released.
+
+        Returns:
+            conn (sqlite3.Connection):  Read-only connection
+
+        Raises:
+            RuntimeError:               If the pool is closed
+        """
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Connection pool is closed")
+            file_id = self.get_file_id()
+            if file_id != self.file_id:
+                if self.file_id is not None:
+                    logger.info(f"Database changed, reopening: {self.db_path}")
+                self.close_idle()
+                self.file_id = file_id
+            while not self.idle and self.open_count >= self.max_size:
+                self.condition.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.open_count += 1
+
+        try:
+            return self.connect()
+        except sqlite3.Error as e:
+            logger.error(f"Unable to open database {self.db_path}: {e}")
+            with self.condition:
+                self.open_count -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Release connection.
+
+        Returns the connection to the pool, or closes it if the pool is
+        closed or the database file was replaced while it was in use.
+
+        Args:
+            conn (sqlite3.Connection):  Connection from acquire
+        """
+        with self.condition:
+            stale = self.closed or self.get_file_id() != self.file_id
+            if stale:
+                conn.close()
+                self.open_count -= 1
+            else:
+                self.idle.append(conn)
+            self.condition.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Context manager that acquires and releases a connection.
+
+        Example:
+            with get_pool(db_path).connection() as conn:
+                conn.execute(sql)
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_idle(self) -> None:
+        """Close idle connections. Must be called holding the condition."""
+        while self.idle:
+            self.idle.pop().close()
+            self.open_count -= 1
+
+    def close(self) -> None:
+        """Close the pool. Connections in use are closed when released."""
+        with self.condition:
+            self.closed = True
+            self.close_idle()
+            self.condition.notify_all()
+
+
+def get_pool(db_path: str, max_size: int = 4) -> ConnectionPool:
+    """Get pool.
+
+    Args:
+        db_path (str):          Path to the database file
+        max_size (int):         Maximum open connections for a new pool
+
+    Returns:
+        pool (ConnectionPool):  Shared pool for the database path
+    """
+    key = os.path.abspath(db_path)
+    with POOLS_LOCK:
+        pool = POOLS.get(key)
+        if pool is None or pool.closed:
+            pool = ConnectionPool(key, max_size)
+            POOLS[key] = pool
+        return pool
+
+
+@atexit.register
+def close_all() -> None:
+    """Close every shared pool."""
+    with POOLS_LOCK:
+        for pool in POOLS.values():
+            pool.close()
+        POOLS.clear()
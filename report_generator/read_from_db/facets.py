@@ -0,0 +1,94 @@
+"""# Facets.
+
+Match and facet counts for live filter feedback.
+
+Counts the species matching a set of query options, and the number of
+matching species for each value of the facet columns, without reading
+the full results. While species_report is fresh the counts are single
+aggregates over the report table, answered from its facet indexes, and
+take a few milliseconds. Junction options or a stale report fall back
+to counting the normalised tables.
+
+Functions:
+    count_matches:          Returns the number of matching species
+    get_facet_counts:       Returns the match count and per facet counts
+    query_facet_counts:     Counts on an open connection
+"""
+import sqlite3
+
+from loguru import logger
+
+from report_generator.read_from_db.connection_pool import get_pool
+from report_generator.read_from_db.query_compiler import compile_count_query
+from report_generator.read_from_db.query_db import get_db_path, get_query_options
+from report_generator.read_from_db.species_report import get_report_source
+
+# Facets counted by default
+DEFAULT_FACETS = [
+    "Order",
+    "Family",
+    "IUCN",
+    "ParityMode",
+    "PopTrend",
+    "Activity",
+    "MicroHabitat",
+    "NestingSite",
+]
+
+
+def count_matches(options: dict) -> int:
+    """Count matches.
+
+    Args:
+        options (dict):     Dictionary of query parameters supplied by GUI
+                            selection or CLI options
+
+    Returns:
+        count (int):        Number of species matching the options
+    """
+    return get_facet_counts(options, facets=[])["count"]
+
+
+def get_facet_counts(options: dict, facets: list = None) -> dict:
+    """Get facet counts.
+
+    Args:
+        options (dict):     Dictionary of query parameters supplied by GUI
+                            selection or CLI options
+        facets (list):      Output columns to count, defaults to
+                            DEFAULT_FACETS
+
+    Returns:
+        counts (dict):      {"count": matches, "facets": {facet: {value:
+                            count}}} with the values of each facet in
+                            descending order of count
+    """
+    query_options = get_query_options(options)
+    with get_pool(get_db_path()).connection() as conn:
+        return query_facet_counts(conn, query_options, facets)
+
+
+def query_facet_counts(
+    conn: sqlite3.Connection, query_options: dict, facets: list = None
+) -> dict:
+    """Query facet counts.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite connection instance
+        query_options (dict):       Options from get_query_options
+        facets (list):              Output columns to count, defaults to
+                                    DEFAULT_FACETS
+
+    Returns:
+        counts (dict):              See get_facet_counts
+    """
+    if facets is None:
+        facets = DEFAULT_FACETS
+    source = get_report_source(conn, query_options)
+    logger.debug(f"Facet source: {source}")
+    sql, params = compile_count_query(query_options, source)
+    counts = {"count": conn.execute(sql, params).fetchone()[0], "facets": {}}
+    for facet in facets:
+        sql, params = compile_count_query(query_options, source, facet)
+        counts["facets"][facet] = dict(conn.execute(sql, params).fetchall())
+    return counts
@@ -0,0 +1,666 @@
+"""# Query Compiler.
+
+Compiles query options into parameterised SQL.
+
+The options dict supplied by the GUI or CLI is turned into a fixed
+statement shape with bound parameters. Statements that differ only in
+their values share the same SQL text, so the compiled template is reused
+from an LRU cache and SQLite can reuse the prepared statement from the
+connection's statement cache instead of parsing and planning the query
+again. Values are never written into the SQL text.
+
+Taxon, trait and region filters are pushed into the species_comp CTE so
+only the matching species are joined to the other tables. Region filters
+are an EXISTS semi-join on the indexed geo tables.
+
+Option values are interpreted as follows:
+
+- "value":          text is matched with LIKE '%value%', numbers with =
+- ["min", "max"]:   numbers are matched with BETWEEN. If one side is empty
+                    only the other bound is applied.
+- ["a", "b", ...]:  any of the values, text matched with LIKE and numbers
+                    with =
+
+GeographicRegion values are always matched with LIKE '%value%'.
+
+The search option is free text matched against the species_search FTS5
+index (see species_search.py). Each word matches the start of a word in
+the names, nesting sites, habitats or regions of a species, and every
+word must match.
+
+The GeographicRegion column is a JSON array of the species locations,
+"continent country region" with the Nocontinent, Nocountry and Noregion
+placeholders left out, deduplicated in the order they were imported.
+
+Queries can be compiled against the normalised tables or against the
+materialised species_report table (see species_report.py), which holds
+the same columns one row per species. Results are ordered by species_id,
+or in the taxonomic order the report sections are rendered in.
+
+Functions:
+    compile_query:      Compiles options into SQL and parameters
+    compile_count_query: Compiles options into a match or facet count query
+    compile_id_query:   Compiles a query for a list of species_ids
+    compile_base_query: Compiles the unfiltered query with species_ids (cached)
+    compile_template:   Builds the SQL for a statement shape (cached)
+    format_species_query: Formats the species query with the given clauses
+    normalise_option:   Returns the predicate shape and parameters of an option
+    build_match_query:  Builds the FTS5 query of free search text
+"""
+import functools
+import json
+import math
+import re
+
+# Query option keys and the column each one filters
+QUERY_COLUMNS = {
+    "order_taxon_name": "order_taxon_name",
+    "Order": "order_taxon_name",
+    "Family": "family_name",
+    "Genus": "genus_name",
+    "Species": "species_name_latin",
+    "SVLMMx": "size_max_male",
+    "SVLFMx": "size_max_female",
+    "SVLMx": "size_max_record",
+    "Longevity": "longevity",
+    "NestingSite": "nesting_site_desc",
+    "ClutchMin": "clutch_min",
+    "ClutchMax": "clutch_max",
+    "Clutch": "clutch_avg",
+    "ParityMode": "parity_mode_desc",
+    "EggDiameter": "egg_diameter",
+    "Activity": "activity_kind",
+    "MicroHabitat": "micro_habitat_name",
+    "GeographicRegion": "continent_name || ' ' || country_name || ' ' || region_name",
+    "IUCN": "iucn_status",
+    "PopTrend": "pop_trend_status",
+    "RangeSize": "range_size",
+    "ElevationMin": "elevation_min",
+    "ElevationMax": "elevation_max",
+    "Elevation": "elevation_avg",
+}
+
+# Columns returned by read_from_db, in order
+OUTPUT_COLUMNS = [
+    "Order",
+    "Family",
+    "Genus",
+    "Species",
+    "SVLMMx",
+    "SVLFMx",
+    "SVLMx",
+    "Longevity",
+    "NestingSite",
+    "ClutchMin",
+    "ClutchMax",
+    "Clutch",
+    "ParityMode",
+    "EggDiameter",
+    "Activity",
+    "MicroHabitat",
+    "GeographicRegion",
+    "IUCN",
+    "PopTrend",
+    "RangeSize",
+    "ElevationMin",
+    "ElevationMax",
+    "Elevation",
+]
+
+# Location name returned in GeographicRegion, without the placeholders
+REGION_NAME_SQL = """trim(
+                CASE WHEN continent_name = 'Nocontinent' THEN ''
+                    ELSE continent_name END
+                || CASE WHEN country_name = 'Nocountry' THEN ''
+                    ELSE ' ' || country_name END
+                || CASE WHEN region_name = 'Noregion' THEN ''
+                    ELSE ' ' || region_name END
+            )"""
+
+# Query sources
+SOURCE_TABLES = "tables"
+SOURCE_REPORT = "report"
+
+# Result orders. Taxonomic order is the order sections are rendered in,
+# with ties kept in species_id order.
+ORDER_SPECIES = "species"
+ORDER_TAXONOMIC = "taxonomic"
+ORDER_BY_SQL = {
+    ORDER_SPECIES: "species_id ASC",
+    ORDER_TAXONOMIC: '"Order", Family, Genus, Species, species_id',
+}
+
+# Options on the junction tables, filtered on the joined rows
+JUNCTION_KEYS = ["NestingSite", "Activity", "MicroHabitat"]
+
+# Options matched against the species locations with a semi-join
+REGION_KEYS = ["GeographicRegion"]
+
+# Shape key of a species_id list, bound as one JSON array parameter
+ID_KEY = "species_id"
+ID_OPS = ("IN",)
+
+# Free text search option, matched against the FTS5 index
+SEARCH_KEY = "search"
+SEARCH_OPS = ("MATCH",)
+SEARCH_TABLE = "species_search"
+
+SPECIES_QUERY_SQL = """
+    WITH species_comp as (
+    SELECT
+        species.*,
+        species.species_id as species_comp_id,
+        genus_name,
+        family_name,
+        order_taxon_name,
+        iucn_status,
+        parity_mode_desc,
+        pop_trend_status
+    FROM
+        species
+        JOIN genus ON species.genus_id = genus.genus_id
+        JOIN family ON genus.family_id = family.family_id
+        JOIN order_taxon ON family.order_id = order_taxon.order_id
+        LEFT JOIN iucn ON species.iucn_id = iucn.iucn_id
+        LEFT JOIN parity_mode ON species.parity_mode_id = parity_mode.parity_mode_id
+        LEFT JOIN pop_trend ON species.pop_trend_id = pop_trend.pop_trend_id
+    {species_where}
+    )
+    SELECT{select_id}
+    order_taxon_name as 'Order',
+    family_name as Family,
+    genus_name as Genus,
+    species_name_latin as Species,
+    size_max_male as SVLMMx,
+    size_max_female as SVLFMx,
+    size_max_record as SVLMx,
+    longevity as Longevity,
+    nesting_site_desc as NestingSite,
+    clutch_min as ClutchMin,
+    clutch_max as ClutchMax,
+    clutch_avg as Clutch,
+    parity_mode_desc as ParityMode,
+    egg_diameter as EggDiameter,
+    activity_kind as Activity,
+    micro_habitat_name as MicroHabitat,
+    (
+        SELECT json_group_array(location_name)
+        FROM (
+            SELECT {location_name} as location_name
+            FROM {location_tables}
+            WHERE geo_location_species.species_id = species_comp.species_comp_id
+            GROUP BY location_name
+            HAVING location_name != ''
+            ORDER BY min(geo_location_species.geo_location_species_id)
+        )
+    ) as GeographicRegion,
+    iucn_status as IUCN,
+    pop_trend_status as PopTrend,
+    range_size as RangeSize,
+    elevation_min as ElevationMin,
+    elevation_max as ElevationMax,
+    elevation_avg as Elevation
+    FROM
+    species_comp
+    LEFT JOIN activity_species
+        ON species_comp.species_comp_id = activity_species.species_id
+    LEFT JOIN activity ON activity_species.activity_id = activity.activity_id
+    LEFT JOIN micro_habitat_species
+        ON species_comp.species_comp_id = micro_habitat_species.species_id
+    LEFT JOIN micro_habitat
+        ON micro_habitat_species.micro_habitat_id = micro_habitat.micro_habitat_id
+    LEFT JOIN nesting_site_species
+        ON species_comp.species_comp_id = nesting_site_species.species_id
+    LEFT JOIN nesting_site
+        ON nesting_site_species.nesting_site_id = nesting_site.nesting_site_id
+    {outer_where}
+    GROUP BY
+    species_comp_id
+    ORDER BY
+    {order_by}
+    """
+
+REPORT_QUERY_SQL = """
+    SELECT
+    {columns}
+    FROM
+    species_report
+    {where}
+    ORDER BY
+    {order_by}
+    """
+
+COUNT_QUERY_SQL = """
+    SELECT
+    {facet_select}count(*)
+    FROM
+    {source}
+    {where}
+    {group_by}
+    """
+
+LOCATION_TABLES_SQL = """geo_location_species
+        JOIN geo_location
+            ON geo_location_species.geo_location_id = geo_location.geo_location_id
+        JOIN country ON geo_location.country_id = country.country_id
+        JOIN continent ON country.continent_id = continent.continent_id"""
+
+
+def compile_query(
+    options: dict, source: str = SOURCE_TABLES, order: str = ORDER_SPECIES
+) -> tuple:
+    """Compile query.
+
+    Args:
+        options (dict):     Query options, as returned by get_query_options
+        source (str):       SOURCE_TABLES or SOURCE_REPORT
+        order (str):        ORDER_SPECIES or ORDER_TAXONOMIC
+
+    Returns:
+        sql (str):          SQL statement with ? placeholders
+        params (list):      Values bound to the placeholders
+
+    Raises:
+        ValueError:         If an option key is not a known query column, or
+                            can not be answered from the source
+    """
+    shape, params = compile_options(options, source)
+    return compile_template(shape, source, order), params
+
+
+def compile_id_query(
+    species_ids: list,
+    options: dict = None,
+    source: str = SOURCE_TABLES,
+    order: str = ORDER_SPECIES,
+) -> tuple:
+    """Compile id query.
+
+    Compiles a query for a list of species_ids, for example the species
+    matched by the bitmap index, with any further options applied.
+
+    Args:
+        species_ids (list): Species to select
+        options (dict):     Further query options
+        source (str):       SOURCE_TABLES or SOURCE_REPORT
+        order (str):        ORDER_SPECIES or ORDER_TAXONOMIC
+
+    Returns:
+        sql (str):          SQL statement with ? placeholders
+        params (list):      Values bound to the placeholders, starting with
+                            the species_ids as a JSON array
+    """
+    shape, params = compile_options(options or {}, source)
+    shape = ((ID_KEY, ID_OPS),) + shape
+    params = [json.dumps([int(species_id) for species_id in species_ids])] + params
+    return compile_template(shape, source, order), params
+
+
+def compile_options(options: dict, source: str = SOURCE_TABLES) -> tuple:
+    """Compile options.
+
+    Args:
+        options (dict):     Query options, as returned by get_query_options
+        source (str):       SOURCE_TABLES or SOURCE_REPORT
+
+    Returns:
+        shape (tuple):      Tuple of (key, ops) pairs
+        params (list):      Values bound to the placeholders
+
+    Raises:
+        ValueError:         If an option key is not a known query column, or
+                            can not be answered from the source
+    """
+    if source == SOURCE_REPORT and any(key in JUNCTION_KEYS for key in options):
+        raise ValueError("Junction options can not be queried from species_report")
+    shape = []
+    params = []
+    # Keys are ordered by the clause they are compiled into so the
+    # parameters follow the order of the placeholders
+    for key in sorted(options, key=lambda k: (k in JUNCTION_KEYS, k)):
+        ops, values = normalise_option(key, options[key])
+        if not ops:
+            continue
+        shape.append((key, ops))
+        params.extend(values)
+    return tuple(shape), params
+
+
+def normalise_option(key: str, value) -> tuple:
+    """Normalise option.
+
+    Args:
+        key (str):          Query option key
+        value (str|list):   Query option value
+
+    Returns:
+        ops (tuple):        Comparison operators, one per value, or
+                            ("BETWEEN",) for a range
+        values (list):      Values bound to the placeholders
+
+    Raises:
+        ValueError:         If the key is not a known query column
+    """
+    if key == SEARCH_KEY:
+        match_query = build_match_query(value)
+        if match_query is None:
+            return (), []
+        return SEARCH_OPS, [match_query]
+
+    if key not in QUERY_COLUMNS:
+        raise ValueError(f"Unknown query option: {key}")
+
+    if key in REGION_KEYS:
+        values = value if isinstance(value, list) else [value]
+        values = [f"%{item}%" for item in values if item != ""]
+        return ("LIKE",) * len(values), values
+
+    if not isinstance(value, list):
+        number = to_number(value)
+        if number is not None:
+            return ("=",), [number]
+        return ("LIKE",), [f"%{value}%"]
+
+    if len(value) == 2:
+        low, high = to_number(value[0]), to_number(value[1])
+        if low is not None and high is not None:
+            return ("BETWEEN",), [low, high]
+        if low is not None and value[1] == "":
+            return (">=",), [low]
+        if value[0] == "" and high is not None:
+            return ("<=",), [high]
+
+    ops = []
+    values = []
+    for item in value:
+        if item == "":
+            continue
+        number = to_number(item)
+        if number is not None:
+            ops.append("=")
+            values.append(number)
+        else:
+            ops.append("LIKE")
+            values.append(item)
+    return tuple(ops), values
+
+
+@functools.lru_cache(maxsize=128)
+def compile_template(
+    shape: tuple, source: str = SOURCE_TABLES, order: str = ORDER_SPECIES
+) -> str:
+    """Compile template.
+
+    Builds the SQL text for a statement shape. Taxon, trait and region
+    predicates are applied inside the species_comp CTE so species are
+    filtered before they are joined to the junction tables. Region
+    predicates are an EXISTS semi-join on the geo tables. Results are
+    cached so queries with the same shape share one SQL string.
+
+    Args:
+        shape (tuple):      Tuple of (key, ops) pairs
+        source (str):       SOURCE_TABLES or SOURCE_REPORT
+        order (str):        ORDER_SPECIES or ORDER_TAXONOMIC
+
+    Returns:
+        sql (str):          SQL statement with ? placeholders
+    """
+    if source == SOURCE_REPORT:
+        return compile_report_template(shape, order)
+
+    species_list = []
+    outer_list = []
+    for key, ops in shape:
+        if key in (ID_KEY, SEARCH_KEY):
+            species_list.append(build_predicate("species.species_id", ops))
+            continue
+        predicate = build_predicate(QUERY_COLUMNS[key], ops)
+        if key in REGION_KEYS:
+            species_list.append(build_region_predicate(predicate, "species.species_id"))
+        elif key in JUNCTION_KEYS:
+            outer_list.append(predicate)
+        else:
+            species_list.append(predicate)
+
+    return format_species_query(
+        build_where(species_list), build_where(outer_list), order=order
+    )
+
+
+def compile_report_template(shape: tuple, order: str = ORDER_SPECIES) -> str:
+    """Compile report template.
+
+    Builds the SQL text for a statement shape against the species_report
+    table.
+
+    Args:
+        shape (tuple):      Tuple of (key, ops) pairs
+        order (str):        ORDER_SPECIES or ORDER_TAXONOMIC
+
+    Returns:
+        sql (str):          SQL statement with ? placeholders
+    """
+    return REPORT_QUERY_SQL.format(
+        columns=",\n    ".join(f'"{column}"' for column in OUTPUT_COLUMNS),
+        where=build_report_where(shape),
+        order_by=ORDER_BY_SQL[order],
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def compile_base_query(source: str = SOURCE_TABLES, order: str = ORDER_SPECIES) -> str:
+    """Compile base query.
+
+    Compiles an unfiltered query for every species, selecting species_id
+    as the first column, so one scan can be split into the results of
+    several option sets.
+
+    Args:
+        source (str):       SOURCE_TABLES or SOURCE_REPORT
+        order (str):        ORDER_SPECIES or ORDER_TAXONOMIC
+
+    Returns:
+        sql (str):          SQL statement
+    """
+    if source == SOURCE_REPORT:
+        columns = ",\n    ".join(f'"{column}"' for column in OUTPUT_COLUMNS)
+        return REPORT_QUERY_SQL.format(
+            columns=f"species_id,\n    {columns}",
+            where="",
+            order_by=ORDER_BY_SQL[order],
+        )
+    return format_species_query("", "", with_id=True, order=order)
+
+
+def compile_count_query(
+    options: dict, source: str = SOURCE_TABLES, facet: str = None
+) -> tuple:
+    """Compile count query.
+
+    Compiles options into a query counting the matching rows, or the
+    matching rows per value of a facet column.
+
+    Args:
+        options (dict):     Query options, as returned by get_query_options
+        source (str):       SOURCE_TABLES or SOURCE_REPORT
+        facet (str):        Output column to group the counts by
+
+    Returns:
+        sql (str):          SQL statement with ? placeholders, returning
+                            count rows or (value, count) rows
+        params (list):      Values bound to the placeholders
+
+    Raises:
+        ValueError:         If an option or the facet is not known
+    """
+    if facet is not None and facet not in OUTPUT_COLUMNS:
+        raise ValueError(f"Unknown facet: {facet}")
+    shape, params = compile_options(options, source)
+    return compile_count_template(shape, source, facet), params
+
+
+@functools.lru_cache(maxsize=128)
+def compile_count_template(
+    shape: tuple, source: str = SOURCE_TABLES, facet: str = None
+) -> str:
+    """Compile count template.
+
+    Against species_report the counts are a single aggregate over the
+    filtered table, which the facet indexes answer without reading the
+    table rows. Against the normalised tables the species query is
+    counted as a subquery.
+
+    Args:
+        shape (tuple):      Tuple of (key, ops) pairs
+        source (str):       SOURCE_TABLES or SOURCE_REPORT
+        facet (str):        Output column to group the counts by
+
+    Returns:
+        sql (str):          SQL statement with ? placeholders
+    """
+    if source == SOURCE_REPORT:
+        table = "species_report"
+        where = build_report_where(shape)
+    else:
+        table = f"({compile_template(shape, source)})"
+        where = ""
+    facet_select = ""
+    group_by = ""
+    if facet is not None:
+        facet_select = f'"{facet}",\n    '
+        group_by = (
+            f'GROUP BY\n    "{facet}"\n    ORDER BY\n    count(*) DESC, "{facet}"'
+        )
+    return COUNT_QUERY_SQL.format(
+        facet_select=facet_select, source=table, where=where, group_by=group_by
+    )
+
+
+def build_report_where(shape: tuple) -> str:
+    """Build the WHERE clause of a statement shape against species_report."""
+    where_list = []
+    for key, ops in shape:
+        if key in (ID_KEY, SEARCH_KEY):
+            where_list.append(build_predicate("species_report.species_id", ops))
+        elif key in REGION_KEYS:
+            predicate = build_predicate(QUERY_COLUMNS[key], ops)
+            where_list.append(
+                build_region_predicate(predicate, "species_report.species_id")
+            )
+        else:
+            where_list.append(build_predicate(report_column(key), ops))
+    return build_where(where_list)
+
+
+def format_species_query(
+    species_where: str,
+    outer_where: str,
+    with_id: bool = False,
+    order: str = ORDER_SPECIES,
+) -> str:
+    """Format species query.
+
+    Args:
+        species_where (str):    WHERE clause applied inside species_comp
+        outer_where (str):      WHERE clause applied to the joined rows
+        with_id (bool):         Also select species_id as the first column
+        order (str):            ORDER_SPECIES or ORDER_TAXONOMIC
+
+    Returns:
+        sql (str):              SQL statement
+    """
+    return SPECIES_QUERY_SQL.format(
+        select_id="\n    species_comp_id as species_id," if with_id else "",
+        species_where=species_where,
+        outer_where=outer_where,
+        location_name=REGION_NAME_SQL,
+        location_tables=LOCATION_TABLES_SQL,
+        order_by=ORDER_BY_SQL[order].replace("species_id", "species_comp_id"),
+    )
+
+
+def report_column(key: str) -> str:
+    """Get the quoted species_report column filtered by a query option."""
+    if QUERY_COLUMNS[key] == "order_taxon_name":
+        return '"Order"'
+    return f'"{key}"'
+
+
+def build_where(predicates: list) -> str:
+    """Join predicates into a WHERE clause, or an empty string if none."""
+    if not predicates:
+        return ""
+    return "WHERE " + "\n        AND ".join(predicates)
+
+
+def build_region_predicate(predicate: str, species_column: str) -> str:
+    """Build region predicate.
+
+    Args:
+        predicate (str):        Predicate on the location name
+        species_column (str):   Column holding the outer species_id
+
+    Returns:
+        predicate (str):    EXISTS semi-join matching species with a
+                            location that satisfies the predicate
+    """
+    return f"""EXISTS (
+        SELECT 1
+        FROM {LOCATION_TABLES_SQL}
+        WHERE geo_location_species.species_id = {species_column}
+        AND {predicate}
+    )"""
+
+
+def build_predicate(column: str, ops: tuple) -> str:
+    """Build predicate.
+
+    Args:
+        column (str):       Column name
+        ops (tuple):        Comparison operators, one per value
+
+    Returns:
+        predicate (str):    Bracketed SQL predicate with ? placeholders
+    """
+    if ops == ("BETWEEN",):
+        return f"({column} BETWEEN ? AND ?)"
+    if ops == ID_OPS:
+        return f"({column} IN (SELECT value FROM json_each(?)))"
+    if ops == SEARCH_OPS:
+        return (
+            f"({column} IN (SELECT species_id FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH ?))"
+        )
+    return "(" + " OR ".join(f"{column} {op} ?" for op in ops) + ")"
+
+
+def build_match_query(text) -> str:
+    """Build match query.
+
+    Splits free text into words and quotes each one as an FTS5 prefix
+    query, so the text can not be parsed as FTS5 query syntax.
+
+    Args:
+        text (str|list):    Search text, or a list of search texts
+
+    Returns:
+        query (str):        FTS5 query matching species with every word,
+                            or None if the text has no words
+    """
+    if isinstance(text, list):
+        text = " ".join(text)
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def to_number(value):
+    """Convert a string to an int or float, or None if it is not a number."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number):
+        return None
+    return int(number) if number.is_integer() else number
@@ -1,19 +1,67 @@
 """Read From DB."""
 import os
 import sqlite3
+from typing import Iterator
 
+import numpy
 import pandas
 from loguru import logger
 
 from report_generator.config import load_config
-from report_generator.excel_extraction.excel_to_sql import create_connection
+from report_generator.read_from_db.bitmap_index import get_bitmap_index
+from report_generator.read_from_db.connection_pool import get_pool
+from report_generator.read_from_db.query_compiler import (
+    JUNCTION_KEYS,
+    ORDER_SPECIES,
+    ORDER_TAXONOMIC,
+    compile_base_query,
+    compile_id_query,
+    compile_query,
+)
+from report_generator.read_from_db.query_log import (
+    inspect_query,
+    log_explanation,
+    record_query,
+    time_stream,
+)
+from report_generator.read_from_db.result_cache import get_result_cache, make_key
+from report_generator.read_from_db.species_report import get_report_source
+from report_generator.read_from_db.storage import (
+    BACKEND_COLUMNAR,
+    BACKEND_SQLITE,
+    ColumnarBackend,
+    StorageBackend,
+)
+
+# CLI/GUI options that are not query parameters
+NON_QUERY_ARGS = [
+    "new",
+    "cli",
+    "gui",
+    "no-setup",
+    "help",
+    "version",
+    "no-db",
+    "output",
+    "rebuild-indexes",
+    "verify-indexes",
+    "refresh-locations",
+    "explain",
+    "workers",
+    "batch",
+]
+
+# Rows per chunk when streaming results
+CHUNK_SIZE = 500
 
 
 def read_from_db(options: dict) -> pandas.DataFrame:
     """Queries Database.
 
     Queries database based on options dict parameters supplied by GUI
-    selection or CLI options.
+    selection or CLI options. Results are served from the result cache
+    when the same options were queried on the unchanged database,
+    otherwise they are read from the configured storage backend.
 
     Args:
         options (dict):                 Dictionary of query parameters
@@ -23,17 +71,272 @@ def read_from_db(options: dict) -> pandas.DataFrame:
                                         SQL query
     """
     logger.info("Reading from Species Database")
-    config = load_config()
-    dir_path = config["dir_path"]
-    conn_path = os.path.join(dir_path, "data", "database", "species.db")
+    conn_path = get_db_path()
     logger.debug(conn_path)
-    conn = create_connection(conn_path)
     query_options = get_query_options(options)
-    query = build_query(query_options)
-    results = query_db(conn, query)
+    cache = get_result_cache()
+    key = make_key(query_options, conn_path)
+    results = cache.get(key)
+    if results is not None:
+        logger.debug("Query result read from cache")
+        return results
+    results = get_backend(conn_path).read(query_options)
+    cache.put(key, results)
+    return results
+
+
+def read_batch_from_db(options_list: list) -> list:
+    """Query the database for several option sets.
+
+    Reads the results of many reports in one pass. Option sets already
+    in the result cache are served from it. With the SQLite backend the
+    other option sets are matched with the bitmap index and split from a
+    single scan of every species, so only option sets the index can not
+    answer run their own query.
+
+    Args:
+        options_list (list):            Dictionaries of query parameters
+
+    Returns:
+        results (list):                 DataFrame of each option set, as
+                                        returned by read_from_db
+    """
+    logger.info(f"Reading {len(options_list)} queries from Species Database")
+    conn_path = get_db_path()
+    query_options_list = [get_query_options(options) for options in options_list]
+    cache = get_result_cache()
+    keys = [make_key(query_options, conn_path) for query_options in query_options_list]
+    results = [cache.get(key) for key in keys]
+    pending = [i for i, result in enumerate(results) if result is None]
+    logger.debug(f"{len(options_list) - len(pending)} query results read from cache")
+    if pending:
+        batch = get_backend(conn_path).read_batch(
+            [query_options_list[i] for i in pending]
+        )
+        for i, result in zip(pending, batch):
+            cache.put(keys[i], result)
+            results[i] = result
     return results
 
 
+def stream_from_db(
+    options: dict, chunk_size: int = CHUNK_SIZE
+) -> Iterator[pandas.DataFrame]:
+    """Streams query results.
+
+    Queries the database like read_from_db, but yields the results in
+    taxonomic order (Order, Family, Genus, Species) as DataFrames of at
+    most chunk_size rows, so a report can be rendered while the query
+    runs without holding every species in memory. The result cache is
+    not used.
+
+    Args:
+        options (dict):                 Dictionary of query parameters
+        chunk_size (int):               Maximum rows per chunk
+
+    Yields:
+        chunk (pandas.DataFrame):       DataFrame of consecutive results
+    """
+    logger.info("Streaming from Species Database")
+    query_options = get_query_options(options)
+    yield from get_backend(get_db_path()).stream(query_options, chunk_size)
+
+
+def read_taxa(options: dict) -> pandas.DataFrame:
+    """Read the distinct taxa matching the query options.
+
+    Args:
+        options (dict):                 Dictionary of query parameters
+
+    Returns:
+        taxa (pandas.DataFrame):        Distinct Order, Family and Genus rows
+    """
+    query_options = get_query_options(options)
+    return get_backend(get_db_path()).read_taxa(query_options)
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLiteBackend.
+
+    Storage backend running the compiled SQL on pooled read-only
+    connections to the SQLite database.
+
+    Args:
+        db_path (str):      Path to the species database
+    """
+
+    name = BACKEND_SQLITE
+
+    def read(self, query_options: dict, order: str = ORDER_SPECIES) -> pandas.DataFrame:
+        """Read species, see StorageBackend.read."""
+        with get_pool(self.db_path).connection() as conn:
+            return self.query(conn, query_options, order)
+
+    def read_batch(self, query_options_list: list, order: str = ORDER_SPECIES) -> list:
+        """Read species for several option sets in one scan.
+
+        The species of each option set are matched with the bitmap index,
+        and the rows are taken from one unfiltered read of every species.
+        Junction options, which change the joined values shown, and
+        options the index can not answer are queried separately on the
+        same connection.
+        """
+        results = []
+        with get_pool(self.db_path).connection() as conn:
+            index = get_bitmap_index(self.db_path, conn)
+            matches = [
+                None
+                if any(key in JUNCTION_KEYS for key in query_options)
+                else index.filter(query_options)
+                for query_options in query_options_list
+            ]
+            if any(species_ids is not None for species_ids in matches):
+                base, base_ids = self.query_base(conn, order)
+            for query_options, species_ids in zip(query_options_list, matches):
+                if species_ids is None:
+                    results.append(self.query(conn, query_options, order))
+                    continue
+                mask = numpy.isin(base_ids, species_ids)
+                results.append(base[mask].reset_index(drop=True))
+        return results
+
+    def query(
+        self, conn: sqlite3.Connection, query_options: dict, order: str
+    ) -> pandas.DataFrame:
+        """Query the species matching one option set on a connection."""
+        query, params = compile_read_query(conn, self.db_path, query_options, order)
+        with record_query(conn, query, params, query_options):
+            return query_db(conn, query, params)
+
+    def query_base(self, conn: sqlite3.Connection, order: str) -> tuple:
+        """Query every species.
+
+        Returns:
+            base (pandas.DataFrame):    Every species with the output columns
+            species_ids (ndarray):      species_id of each row
+        """
+        query = compile_base_query(get_report_source(conn, {}), order)
+        with record_query(conn, query, [], {}):
+            base = query_db(conn, query)
+        return base.drop(columns="species_id"), base["species_id"].to_numpy()
+
+    def stream(
+        self, query_options: dict, chunk_size: int, order: str = ORDER_TAXONOMIC
+    ) -> Iterator[pandas.DataFrame]:
+        """Stream species with fetchmany.
+
+        The pooled connection is held until the generator is exhausted
+        or closed.
+        """
+        with get_pool(self.db_path).connection() as conn:
+            query, params = compile_read_query(conn, self.db_path, query_options, order)
+            yield from time_stream(
+                conn,
+                query,
+                params,
+                query_options,
+                stream_query(conn, query, params, chunk_size),
+            )
+
+    def read_taxa(self, query_options: dict) -> pandas.DataFrame:
+        """Read the distinct taxa with SELECT DISTINCT."""
+        with get_pool(self.db_path).connection() as conn:
+            query, params = compile_read_query(conn, self.db_path, query_options)
+            query = f'SELECT DISTINCT "Order", Family, Genus FROM ({query})'
+            with record_query(conn, query, params, query_options):
+                return query_db(conn, query, params)
+
+
+def get_backend(db_path: str, name: str = None) -> StorageBackend:
+    """Get a storage backend.
+
+    Args:
+        db_path (str):              Path to the species database
+        name (str):                 BACKEND_SQLITE or BACKEND_COLUMNAR,
+                                    defaults to the storage_backend config
+                                    setting
+
+    Returns:
+        backend (StorageBackend):   Backend reading the database
+    """
+    if name is None:
+        config = load_config() or {}
+        name = config.get("storage_backend", BACKEND_SQLITE)
+    if name == BACKEND_COLUMNAR:
+        return ColumnarBackend(db_path, SQLiteBackend(db_path))
+    if name != BACKEND_SQLITE:
+        logger.warning(f"Unknown storage backend: {name}, using {BACKEND_SQLITE}")
+    return SQLiteBackend(db_path)
+
+
+def explain_from_db(options: dict) -> dict:
+    """Explains the query for a set of options without running it.
+
+    The query is compiled as read_from_db would compile it, and its
+    SQL, parameters, plan and full scans are logged.
+
+    Args:
+        options (dict):                 Dictionary of query parameters
+
+    Returns:
+        explanation (dict):             query, params, options, plan and
+                                        full_scans
+    """
+    query_options = get_query_options(options)
+    conn_path = get_db_path()
+    with get_pool(conn_path).connection() as conn:
+        query, params = compile_read_query(conn, conn_path, query_options)
+        explanation = {"query": query, "params": params}
+        explanation.update(inspect_query(conn, query, params, query_options))
+    log_explanation(explanation)
+    return explanation
+
+
+def compile_read_query(
+    conn: sqlite3.Connection,
+    db_path: str,
+    query_options: dict,
+    order: str = ORDER_SPECIES,
+) -> tuple:
+    """Compiles the query for a set of options.
+
+    Options are first matched with the bitmap index, and only the
+    matched species_ids are fetched. Junction options are also kept in
+    the query so the joined rows shown match them. Options the index can
+    not answer are compiled into SQL predicates.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite connection instance
+        db_path (str):              Path to the species database
+        query_options (dict):       Options from get_query_options
+        order (str):                ORDER_SPECIES or ORDER_TAXONOMIC
+
+    Returns:
+        query (str):                SQL query string
+        params (list):              Values bound to the query placeholders
+    """
+    species_ids = None
+    if query_options:
+        species_ids = get_bitmap_index(db_path, conn).filter(query_options)
+    if species_ids is None:
+        source = get_report_source(conn, query_options)
+        logger.debug(f"Query source: {source}")
+        return compile_query(query_options, source, order)
+
+    junction_options = {
+        key: value for key, value in query_options.items() if key in JUNCTION_KEYS
+    }
+    source = get_report_source(conn, junction_options)
+    logger.debug(f"Query source: {source}, {len(species_ids)} indexed matches")
+    return compile_id_query(species_ids, junction_options, source, order)
+
+
+def get_db_path() -> str:
+    """Get the species database path of the configured project."""
+    config = load_config()
+    return os.path.join(config["dir_path"], "data", "database", "species.db")
+
+
 def get_query_options(options: dict) -> dict:
     """Parses Query options from options dict.
 
@@ -53,8 +356,7 @@ def get_query_options(options: dict) -> dict:
             value = None
         if value == ["", ""]:
             value = []
-        s_args = ["new", "cli", "gui", "no-setup", "help", "version", "no-db", "output"]
-        if (key not in s_args) and (value is not None) and (len(value) != 0):
+        if (key not in NON_QUERY_ARGS) and (value is not None) and (len(value) != 0):
             query_options[key] = value
     return query_options
 
@@ -63,7 +365,9 @@ def build_query(params: dict) -> str:
     """Builds query.
 
     Takes dictionary of query parameters and builds an
-    SQL query string.
+    SQL query string with the values written into the text.
+    read_from_db uses query_compiler.compile_query, which binds
+    the values as parameters instead.
 
     Args:
         params (dict):      Query params
@@ -183,7 +487,9 @@ def build_where_statements(key: str, values) -> str:
     return where
 
 
-def query_db(conn: sqlite3.Connection, query: str) -> pandas.DataFrame:
+def query_db(
+    conn: sqlite3.Connection, query: str, params: list = None
+) -> pandas.DataFrame:
     """Queries database.
 
     Queries database based on query string.
@@ -191,9 +497,46 @@ def query_db(conn: sqlite3.Connection, query: str) -> pandas.DataFrame:
     Args:
         conn (sqlite3.Connection):  SQLite connection instance
         query (str):                SQL query string
+        params (list):              Values bound to the query placeholders
 
     Returns:
         data_frame (pandas.DataFrame): Pandas dataframe of results
     """
-    data_frame = pandas.read_sql_query(query, conn)
+    data_frame = pandas.read_sql_query(query, conn, params=params)
     return data_frame
+
+
+def stream_query(
+    conn: sqlite3.Connection,
+    query: str,
+    params: list = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[pandas.DataFrame]:
+    """Streams query results.
+
+    Fetches rows from a cursor with fetchmany. The index of each chunk
+    continues from the previous chunk.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite connection instance
+        query (str):                SQL query string
+        params (list):              Values bound to the query placeholders
+        chunk_size (int):           Maximum rows per chunk
+
+    Yields:
+        chunk (pandas.DataFrame):   DataFrame of consecutive rows
+    """
+    cursor = conn.execute(query, params or [])
+    columns = [column[0] for column in cursor.description]
+    start = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = pandas.DataFrame.from_records(rows, columns=columns)
+            chunk.index = pandas.RangeIndex(start, start + len(rows))
+            start += len(rows)
+            yield chunk
+    finally:
+        cursor.close()
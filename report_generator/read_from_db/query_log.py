@@ -0,0 +1,280 @@
+"""# Query Log.
+
+Query plan inspector and slow-query log for the read path.
+
+Each query run by read_from_db, stream_from_db and read_taxa is timed
+and its EXPLAIN QUERY PLAN is captured. The plan is logged at debug
+level, and full scans of tables with at least LARGE_TABLE_ROWS rows are
+logged as warnings. Queries taking SLOW_QUERY_SECONDS or longer are
+written as JSON lines to a rotating slow-query log together with the
+normalised filter set, so a slow report can be traced back to the
+options that produced it.
+
+Functions:
+    explain_query:      Returns the EXPLAIN QUERY PLAN rows of a query
+    find_full_scans:    Returns the large tables a plan scans in full
+    inspect_query:      Returns the plan, full scans and filter set of a query
+    record_query:       Context manager timing and logging a query
+    time_stream:        Times the chunks fetched from a result stream
+    log_query:          Logs a timed query, and writes it to the slow log
+    log_explanation:    Logs the explanation of a query
+    normalise_options:  Returns the normalised filter set of query options
+    set_slow_log:       Sets the slow-query log file and threshold
+"""
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Iterator
+
+from loguru import logger
+
+from report_generator.config import load_config
+from report_generator.read_from_db.query_compiler import normalise_option
+
+# Queries taking at least this many seconds are written to the slow log
+SLOW_QUERY_SECONDS = 0.5
+
+# Tables with at least this many rows are flagged when scanned in full
+LARGE_TABLE_ROWS = 1000
+
+SLOW_LOG_ROTATION = "1 MB"
+SLOW_LOG_RETENTION = 5
+
+# Plan detail of a full table scan, e.g. "SCAN species" or "SCAN species AS s"
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+SLOW_LOG = {"path": None, "seconds": SLOW_QUERY_SECONDS, "sink": None}
+
+
+def explain_query(conn: sqlite3.Connection, query: str, params: list = None) -> list:
+    """Explain query.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite connection instance
+        query (str):                SQL query string
+        params (list):              Values bound to the query placeholders
+
+    Returns:
+        plan (list):                Plan rows as {"id", "parent", "detail"}
+                                    dicts
+    """
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params or []).fetchall()
+    return [{"id": row[0], "parent": row[1], "detail": row[-1]} for row in rows]
+
+
+def find_full_scans(
+    conn: sqlite3.Connection, plan: list, min_rows: int = LARGE_TABLE_ROWS
+) -> dict:
+    """Find full scans.
+
+    Tables are sized with max(rowid), which is answered from the end of
+    the table b-tree without counting. CTEs, subqueries and virtual
+    tables are not sized and never flagged.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite connection instance
+        plan (list):                Plan rows from explain_query
+        min_rows (int):             Smallest table flagged
+
+    Returns:
+        scans (dict):               Rows of each large table scanned in full
+    """
+    scans = {}
+    for row in plan:
+        match = FULL_SCAN.match(row["detail"])
+        if match is None:
+            continue
+        table = match.group(1)
+        try:
+            rows = conn.execute(f'SELECT max(rowid) FROM "{table}"').fetchone()[0]
+        except sqlite3.Error:
+            continue
+        if rows is not None and rows >= min_rows:
+            scans[table] = rows
+    return scans
+
+
+def inspect_query(
+    conn: sqlite3.Connection, query: str, params: list, query_options: dict
+) -> dict:
+    """Inspect query.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite connection instance
+        query (str):                SQL query string
+        params (list):              Values bound to the query placeholders
+        query_options (dict):       Options the query was compiled from
+
+    Returns:
+        inspection (dict):          Filter set, plan and full scans
+    """
+    plan = explain_query(conn, query, params)
+    return {
+        "options": normalise_options(query_options),
+        "plan": plan,
+        "full_scans": find_full_scans(conn, plan),
+    }
+
+
+@contextlib.contextmanager
+def record_query(
+    conn: sqlite3.Connection, query: str, params: list, query_options: dict
+) -> Iterator[None]:
+    """Record query.
+
+    Times the body of the with statement as the execution of the query,
+    then logs it with log_query.
+
+    Args:
+        conn (sqlite3.Connection):  Connection the query runs on
+        query (str):                SQL query string
+        params (list):              Values bound to the query placeholders
+        query_options (dict):       Options the query was compiled from
+    """
+    start = time.perf_counter()
+    yield
+    log_query(conn, query, params, query_options, time.perf_counter() - start)
+
+
+def time_stream(
+    conn: sqlite3.Connection,
+    query: str,
+    params: list,
+    query_options: dict,
+    chunks: Iterator,
+) -> Iterator:
+    """Time stream.
+
+    Only the time spent fetching chunks is counted, not the time the
+    consumer spends between chunks. The query is logged when the stream
+    is exhausted or closed.
+
+    Args:
+        conn (sqlite3.Connection):  Connection the query runs on
+        query (str):                SQL query string
+        params (list):              Values bound to the query placeholders
+        query_options (dict):       Options the query was compiled from
+        chunks (Iterator):          Result chunks of the query
+
+    Yields:
+        chunk:                      Each chunk of chunks
+    """
+    seconds = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            finally:
+                seconds += time.perf_counter() - start
+            yield chunk
+    finally:
+        log_query(conn, query, params, query_options, seconds)
+
+
+def log_query(
+    conn: sqlite3.Connection,
+    query: str,
+    params: list,
+    query_options: dict,
+    seconds: float,
+) -> dict:
+    """Log query.
+
+    Args:
+        conn (sqlite3.Connection):  Connection the query ran on
+        query (str):                SQL query string
+        params (list):              Values bound to the query placeholders
+        query_options (dict):       Options the query was compiled from
+        seconds (float):            Execution time
+
+    Returns:
+        entry (dict):               Logged entry, see inspect_query
+    """
+    try:
+        entry = inspect_query(conn, query, params, query_options)
+    except sqlite3.Error as e:
+        logger.error(e)
+        return None
+    entry["seconds"] = round(seconds, 6)
+    plan = "; ".join(row["detail"] for row in entry["plan"])
+    logger.debug(f"Query ran in {seconds:.3f}s: {plan}")
+    for table, rows in entry["full_scans"].items():
+        logger.warning(f"Query scans all {rows} rows of {table}")
+    if seconds >= SLOW_LOG["seconds"]:
+        write_slow_query(entry)
+    return entry
+
+
+def log_explanation(explanation: dict) -> None:
+    """Log the SQL, parameters, plan and full scans of an explained query."""
+    logger.info(f"Filters: {json.dumps(explanation['options'])}")
+    logger.info(f"Query:\n{explanation['query'].strip()}")
+    logger.info(f"Parameters: {explanation['params']}")
+    depth = {0: 0}
+    lines = []
+    for row in explanation["plan"]:
+        depth[row["id"]] = depth.get(row["parent"], 0) + 1
+        lines.append(f"{'  ' * depth[row['id']]}{row['detail']}")
+    logger.info("Query plan:\n" + "\n".join(lines))
+    for table, rows in explanation["full_scans"].items():
+        logger.warning(f"Full scan of {table} ({rows} rows)")
+
+
+def normalise_options(query_options: dict) -> dict:
+    """Normalise options.
+
+    Args:
+        query_options (dict):   Options from get_query_options
+
+    Returns:
+        filters (dict):         Operators and values of each option, by key
+    """
+    filters = {}
+    for key in sorted(query_options):
+        try:
+            ops, values = normalise_option(key, query_options[key])
+        except (KeyError, ValueError):
+            filters[key] = {"value": query_options[key]}
+            continue
+        filters[key] = {"ops": list(ops), "values": values}
+    return filters
+
+
+def set_slow_log(path: str = None, seconds: float = SLOW_QUERY_SECONDS) -> None:
+    """Set slow log.
+
+    Args:
+        path (str):         Slow-query log file, defaults to
+                            logs/slow_queries.log in the project directory
+        seconds (float):    Threshold of slow queries
+    """
+    if SLOW_LOG["sink"] is not None:
+        logger.remove(SLOW_LOG["sink"])
+    SLOW_LOG.update(path=path, seconds=seconds, sink=None)
+
+
+def get_slow_log_path() -> str:
+    """Get the slow-query log path of the configured project."""
+    config = load_config()
+    return os.path.join(config["dir_path"], "logs", "slow_queries.log")
+
+
+def write_slow_query(entry: dict) -> None:
+    """Write an entry to the rotating slow-query log, adding its sink once."""
+    if SLOW_LOG["sink"] is None:
+        path = SLOW_LOG["path"] or get_slow_log_path()
+        SLOW_LOG["sink"] = logger.add(
+            path,
+            format="{message}",
+            filter=lambda record: record["extra"].get("slow_query", False),
+            rotation=SLOW_LOG_ROTATION,
+            retention=SLOW_LOG_RETENTION,
+        )
+    line = json.dumps(entry, default=str)
+    logger.bind(slow_query=True).warning(line)
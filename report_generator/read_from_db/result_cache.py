@@ -0,0 +1,365 @@
+"""# Result Cache.
+
+Two tier cache of read_from_db results.
+
+Results are keyed by the canonical form of the query options and a
+fingerprint of the species database: its path, modification time, size
+and the schema cookie and change counter from the SQLite file header.
+The fingerprint is read without opening the database, so a repeated
+report on an unchanged database does not run any SQL. Any change to the
+database gives a new fingerprint and old entries are no longer used.
+
+Results are stored in a compact columnar format. Numeric columns are
+kept as arrays and text columns are dictionary encoded as integer codes
+and a list of distinct values, then the columns are written to a
+compressed numpy archive. Encoded results are held in an in-memory LRU
+and written to an on-disk LRU in the cache directory, each with a byte
+budget.
+
+Classes:
+    ResultCache:            Memory and disk LRU of encoded results
+
+Functions:
+    get_result_cache:       Returns the shared result cache
+    make_key:               Builds the cache key for a query
+    get_db_fingerprint:     Returns the fingerprint of a database file
+    encode_frame:           Encodes a DataFrame to bytes
+    decode_frame:           Decodes bytes to a DataFrame
+"""
+import collections
+import hashlib
+import io
+import json
+import os
+import struct
+import threading
+
+import numpy
+import pandas
+from loguru import logger
+
+from report_generator.project_setup.download_manager import get_cache_dir
+
+# Bump when the key or the encoded format changes
+CACHE_FORMAT = 2
+
+MEMORY_BUDGET = 64 * 1024 * 1024
+DISK_BUDGET = 256 * 1024 * 1024
+
+# Offsets of big-endian 4 byte fields in the SQLite file header
+HEADER_CHANGE_COUNTER = 24
+HEADER_SCHEMA_COOKIE = 40
+
+CACHE = None
+CACHE_LOCK = threading.Lock()
+
+
+class ResultCache:
+    """ResultCache.
+
+    Memory and disk LRU of encoded query results.
+
+    Args:
+        cache_dir (str):        Directory of the disk tier, defaults to
+                                get_cache_dir("results")
+        memory_budget (int):    Bytes held in memory
+        disk_budget (int):      Bytes held on disk
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = None,
+        memory_budget: int = MEMORY_BUDGET,
+        disk_budget: int = DISK_BUDGET,
+    ) -> None:
+        """Init method for ResultCache."""
+        self.cache_dir = cache_dir or get_cache_dir("results")
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.memory = collections.OrderedDict()
+        self.memory_size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> pandas.DataFrame:
+        """Get cached result.
+
+        Args:
+            key (str):                      Key from make_key
+
+        Returns:
+            data_frame (pandas.DataFrame):  Cached result, or None
+        """
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+        if data is None:
+            data = self.read_disk(key)
+            if data is None:
+                return None
+            self.put_memory(key, data)
+        try:
+            return decode_frame(data)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Discarding unreadable cached result {key}: {e}")
+            self.discard(key)
+            return None
+
+    def put(self, key: str, data_frame: pandas.DataFrame) -> bool:
+        """Store result.
+
+        Args:
+            key (str):                      Key from make_key
+            data_frame (pandas.DataFrame):  Query result
+
+        Returns:
+            stored (bool):                  False if the result can not be
+                                            encoded
+        """
+        try:
+            data = encode_frame(data_frame)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Result not cached: {e}")
+            return False
+        self.put_memory(key, data)
+        self.write_disk(key, data)
+        return True
+
+    def put_memory(self, key: str, data: bytes) -> None:
+        """Add encoded result to the memory tier and evict over budget."""
+        if len(data) > self.memory_budget:
+            return
+        with self.lock:
+            old = self.memory.pop(key, None)
+            if old is not None:
+                self.memory_size -= len(old)
+            self.memory[key] = data
+            self.memory_size += len(data)
+            while self.memory_size > self.memory_budget:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_size -= len(evicted)
+
+    def get_path(self, key: str) -> str:
+        """Get the disk tier path of a key."""
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def read_disk(self, key: str) -> bytes:
+        """Read encoded result from the disk tier.
+
+        The file modification time is updated so eviction is least
+        recently used.
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def write_disk(self, key: str, data: bytes) -> None:
+        """Write encoded result to the disk tier and evict over budget."""
+        if len(data) > self.disk_budget:
+            return
+        path = self.get_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Unable to write result cache: {e}")
+            return
+        self.evict_disk()
+
+    def evict_disk(self) -> None:
+        """Remove the least recently used files over the disk budget."""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".npz"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_budget:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def discard(self, key: str) -> None:
+        """Remove a key from both tiers."""
+        with self.lock:
+            data = self.memory.pop(key, None)
+            if data is not None:
+                self.memory_size -= len(data)
+        try:
+            os.remove(self.get_path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        """Remove every cached result."""
+        with self.lock:
+            self.memory.clear()
+            self.memory_size = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def get_result_cache() -> ResultCache:
+    """Get the shared result cache."""
+    global CACHE
+    with CACHE_LOCK:
+        if CACHE is None:
+            CACHE = ResultCache()
+        return CACHE
+
+
+def make_key(query_options: dict, db_path: str) -> str:
+    """Make cache key.
+
+    Args:
+        query_options (dict):   Options from get_query_options
+        db_path (str):          Path to the species database
+
+    Returns:
+        key (str):              Hex digest of the canonical options and the
+                                database fingerprint
+    """
+    canonical = {
+        "format": CACHE_FORMAT,
+        "options": canonical_options(query_options),
+        "database": get_db_fingerprint(db_path),
+    }
+    text = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def canonical_options(query_options: dict) -> dict:
+    """Canonical options.
+
+    Values are compared as stripped strings. The order of list values is
+    kept, since a two item list is a range.
+
+    Args:
+        query_options (dict):   Options from get_query_options
+
+    Returns:
+        options (dict):         Canonical options
+    """
+    options = {}
+    for key, value in query_options.items():
+        if isinstance(value, (list, tuple)):
+            options[key] = [str(item).strip() for item in value]
+        else:
+            options[key] = str(value).strip()
+    return options
+
+
+def get_db_fingerprint(db_path: str) -> list:
+    """Get database fingerprint.
+
+    Reads the schema cookie and change counter from the SQLite header. A
+    write ahead log, if present, is included since writes to it do not
+    change the main file.
+
+    Args:
+        db_path (str):          Path to the database file
+
+    Returns:
+        fingerprint (list):     Values that change when the database does
+    """
+    db_path = os.path.abspath(db_path)
+    stat = os.stat(db_path)
+    with open(db_path, "rb") as f:
+        header = f.read(100).ljust(100, b"\0")
+    fingerprint = [
+        db_path,
+        stat.st_mtime_ns,
+        stat.st_size,
+        struct.unpack_from(">I", header, HEADER_SCHEMA_COOKIE)[0],
+        struct.unpack_from(">I", header, HEADER_CHANGE_COUNTER)[0],
+    ]
+    wal_path = f"{db_path}-wal"
+    if os.path.exists(wal_path):
+        wal_stat = os.stat(wal_path)
+        fingerprint += [wal_stat.st_mtime_ns, wal_stat.st_size]
+    return fingerprint
+
+
+def encode_frame(data_frame: pandas.DataFrame) -> bytes:
+    """Encode frame.
+
+    Args:
+        data_frame (pandas.DataFrame):  Query result
+
+    Returns:
+        data (bytes):                   Compressed columnar archive
+
+    Raises:
+        ValueError:                     If a column holds values other than
+                                        numbers or text
+    """
+    if not isinstance(data_frame.index, pandas.RangeIndex):
+        raise ValueError("only a default index can be encoded")
+    index = data_frame.index
+    arrays = {}
+    meta = {"index": [index.start, index.stop, index.step], "columns": []}
+    for position, (name, column) in enumerate(data_frame.items()):
+        dtype = str(column.dtype)
+        if column.dtype.kind in "biuf":
+            arrays[f"values_{position}"] = column.to_numpy()
+            encoding = "values"
+        else:
+            values = column[column.notna()]
+            if not all(isinstance(value, str) for value in values):
+                raise ValueError(f"column {name} holds values other than text")
+            codes, categories = pandas.factorize(column)
+            arrays[f"codes_{position}"] = codes.astype(numpy.int32)
+            arrays[f"categories_{position}"] = numpy.asarray(
+                list(categories), dtype=str
+            )
+            encoding = "dictionary"
+        meta["columns"].append({"name": name, "dtype": dtype, "encoding": encoding})
+    arrays["meta"] = numpy.frombuffer(json.dumps(meta).encode("utf-8"), numpy.uint8)
+    buffer = io.BytesIO()
+    numpy.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def decode_frame(data: bytes) -> pandas.DataFrame:
+    """Decode frame.
+
+    Args:
+        data (bytes):                   Archive from encode_frame
+
+    Returns:
+        data_frame (pandas.DataFrame):  Decoded result
+    """
+    with numpy.load(io.BytesIO(data), allow_pickle=False) as archive:
+        meta = json.loads(archive["meta"].tobytes().decode("utf-8"))
+        columns = {}
+        for position, column in enumerate(meta["columns"]):
+            if column["encoding"] == "values":
+                values = archive[f"values_{position}"]
+            else:
+                codes = archive[f"codes_{position}"]
+                categories = archive[f"categories_{position}"].astype(object)
+                values = numpy.empty(len(codes), dtype=object)
+                values[codes >= 0] = categories[codes[codes >= 0]]
+                values[codes < 0] = None
+            columns[column["name"]] = pandas.Series(
+                values, dtype=column["dtype"], copy=False
+            )
+    data_frame = pandas.DataFrame(columns)
+    data_frame.index = pandas.RangeIndex(*meta["index"])
+    return data_frame
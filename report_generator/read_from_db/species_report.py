@@ -0,0 +1,223 @@
+"""# Species Report.
+
+Materialised, denormalised species_report table.
+
+The species_report table holds exactly the columns returned by
+read_from_db, one row per species, keyed by species_id. It is built when
+the dataset is imported so reports can be read with a single indexed
+table scan instead of the full join and group_concat.
+
+Triggers on the species, junction and lookup tables record changed
+species in species_report_dirty. refresh_species_report rebuilds only
+those rows, or the whole table if a lookup table changed. read_from_db
+only reads from species_report while it is fresh.
+
+Functions:
+    build_species_report:       Creates and fills the species_report table
+    refresh_species_report:     Rebuilds the rows of changed species
+    is_report_fresh:            Whether species_report matches the tables
+    get_report_source:          Chooses the query source for a set of options
+"""
+import sqlite3
+from sqlite3 import Error
+
+from loguru import logger
+
+from report_generator.indexes import SPECIES_INDEXES, create_indexes
+from report_generator.read_from_db.query_compiler import (
+    JUNCTION_KEYS,
+    OUTPUT_COLUMNS,
+    SOURCE_REPORT,
+    SOURCE_TABLES,
+    format_species_query,
+)
+
+REPORT_TABLE = "species_report"
+DIRTY_TABLE = "species_report_dirty"
+
+# Marker in the dirty table meaning every row must be rebuilt
+ALL_SPECIES = 0
+
+# Tables whose rows belong to a single species
+SPECIES_TABLES = [
+    "species",
+    "activity_species",
+    "micro_habitat_species",
+    "nesting_site_species",
+    "geo_location_species",
+]
+
+# Lookup tables shared by many species
+LOOKUP_TABLES = [
+    "genus",
+    "family",
+    "order_taxon",
+    "iucn",
+    "parity_mode",
+    "pop_trend",
+    "activity",
+    "micro_habitat",
+    "nesting_site",
+    "geo_location",
+    "country",
+    "continent",
+]
+
+
+def build_species_report(conn: sqlite3.Connection) -> None:
+    """Build species report.
+
+    Creates the species_report table, its change triggers and indexes,
+    and fills it from the normalised tables.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+    """
+    logger.info("Building species report table")
+    columns = ",\n        ".join(f'"{column}"' for column in OUTPUT_COLUMNS)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {REPORT_TABLE}")
+        cursor.execute(
+            f"""CREATE TABLE {REPORT_TABLE} (
+        species_id INTEGER NOT NULL PRIMARY KEY,
+        {columns}
+    )"""
+        )
+        cursor.execute(
+            f"""CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (
+        species_id INTEGER NOT NULL PRIMARY KEY
+    )"""
+        )
+        for sql in get_trigger_sql():
+            cursor.execute(sql)
+        cursor.execute(
+            f"INSERT INTO {REPORT_TABLE} {format_species_query('', '', True)}"
+        )
+        cursor.execute(f"DELETE FROM {DIRTY_TABLE}")
+        conn.commit()
+        cursor.close()
+    except Error as e:
+        logger.error(e)
+        return
+    create_indexes(conn, SPECIES_INDEXES)
+
+
+def refresh_species_report(conn: sqlite3.Connection) -> int:
+    """Refresh species report.
+
+    Rebuilds the species_report rows of species changed since the last
+    refresh. The table is built if it does not exist.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+
+    Returns:
+        count (int):                Number of species marked as changed, or
+                                    -1 if the whole table was rebuilt
+    """
+    if not table_exists(conn, REPORT_TABLE):
+        build_species_report(conn)
+        return -1
+
+    dirty = [row[0] for row in conn.execute(f"SELECT species_id FROM {DIRTY_TABLE}")]
+    if not dirty:
+        return 0
+    logger.info("Refreshing species report table")
+    with conn:
+        if ALL_SPECIES in dirty:
+            conn.execute(f"DELETE FROM {REPORT_TABLE}")
+            conn.execute(
+                f"INSERT INTO {REPORT_TABLE} {format_species_query('', '', True)}"
+            )
+        else:
+            conn.execute(
+                f"DELETE FROM {REPORT_TABLE} "
+                f"WHERE species_id IN (SELECT species_id FROM {DIRTY_TABLE})"
+            )
+            species_where = (
+                f"WHERE species.species_id IN (SELECT species_id FROM {DIRTY_TABLE})"
+            )
+            conn.execute(
+                f"INSERT INTO {REPORT_TABLE} "
+                f"{format_species_query(species_where, '', True)}"
+            )
+        conn.execute(f"DELETE FROM {DIRTY_TABLE}")
+    return -1 if ALL_SPECIES in dirty else len(dirty)
+
+
+def is_report_fresh(conn: sqlite3.Connection) -> bool:
+    """Check if species_report exists and has no pending changes.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+
+    Returns:
+        fresh (bool):               Whether species_report can be read
+    """
+    if not table_exists(conn, REPORT_TABLE) or not table_exists(conn, DIRTY_TABLE):
+        return False
+    return conn.execute(f"SELECT 1 FROM {DIRTY_TABLE} LIMIT 1").fetchone() is None
+
+
+def get_report_source(conn: sqlite3.Connection, options: dict) -> str:
+    """Get report source.
+
+    Options on the junction tables filter the joined rows, which the one
+    row per species table can not reproduce, so they are always answered
+    from the normalised tables.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+        options (dict):             Query options
+
+    Returns:
+        source (str):               SOURCE_REPORT or SOURCE_TABLES
+    """
+    if any(key in JUNCTION_KEYS for key in options):
+        return SOURCE_TABLES
+    if is_report_fresh(conn):
+        return SOURCE_REPORT
+    return SOURCE_TABLES
+
+
+def get_trigger_sql() -> list:
+    """Get trigger sql.
+
+    Returns:
+        sql_list (list):    CREATE TRIGGER sql strings recording changed
+                            species in the dirty table
+    """
+    sql_list = []
+    for table in SPECIES_TABLES:
+        for event, rows in [
+            ("INSERT", ["NEW"]),
+            ("UPDATE", ["OLD", "NEW"]),
+            ("DELETE", ["OLD"]),
+        ]:
+            values = ", ".join(f"({row}.species_id)" for row in rows)
+            sql_list.append(
+                f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_report
+    AFTER {event} ON {table}
+    BEGIN
+        INSERT OR IGNORE INTO {DIRTY_TABLE} (species_id) VALUES {values};
+    END"""
+            )
+    for table in LOOKUP_TABLES:
+        for event in ["UPDATE", "DELETE"]:
+            sql_list.append(
+                f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_report
+    AFTER {event} ON {table}
+    BEGIN
+        INSERT OR IGNORE INTO {DIRTY_TABLE} (species_id) VALUES ({ALL_SPECIES});
+    END"""
+            )
+    return sql_list
+
+
+def table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    """Check if a table exists."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
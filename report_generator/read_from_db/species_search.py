@@ -0,0 +1,175 @@
+"""# Species Search.
+
+Full-text species search index.
+
+The species_search FTS5 table holds one row per species with its
+species, genus, family and order names, nesting sites, microhabitats and
+regions. It is built when the dataset is imported. Free text is matched
+word by word as prefixes, so "sala spa" finds Salamandra species found
+in Spain, and results are ranked with BM25, weighting names above
+traits.
+
+The same index answers the search query option of read_from_db (see
+query_compiler.build_match_query), so a search can be used to select
+the species of a report.
+
+Functions:
+    build_species_search:   Creates and fills the species_search table
+    search:                 Searches the species database, ranked by BM25
+    search_species:         Searches on an open connection
+"""
+import sqlite3
+from sqlite3 import Error
+
+import pandas
+from loguru import logger
+
+from report_generator.read_from_db.connection_pool import get_pool
+from report_generator.read_from_db.query_compiler import (
+    LOCATION_TABLES_SQL,
+    REGION_NAME_SQL,
+    SEARCH_TABLE,
+    build_match_query,
+)
+from report_generator.read_from_db.query_db import get_db_path
+
+# Indexed columns and their BM25 weights
+SEARCH_COLUMNS = {
+    "species": 10.0,
+    "genus": 8.0,
+    "family": 4.0,
+    "taxon_order": 4.0,
+    "nesting_site": 1.0,
+    "micro_habitat": 1.0,
+    "region": 2.0,
+}
+
+# Results returned by default
+SEARCH_LIMIT = 50
+
+SEARCH_INSERT_SQL = f"""
+    INSERT INTO {SEARCH_TABLE} (species_id, {", ".join(SEARCH_COLUMNS)})
+    SELECT
+    species.species_id,
+    species_name_latin,
+    genus_name,
+    family_name,
+    order_taxon_name,
+    (
+        SELECT group_concat(nesting_site_desc, ' ')
+        FROM nesting_site_species
+            JOIN nesting_site
+                ON nesting_site_species.nesting_site_id = nesting_site.nesting_site_id
+        WHERE nesting_site_species.species_id = species.species_id
+    ),
+    (
+        SELECT group_concat(micro_habitat_name, ' ')
+        FROM micro_habitat_species
+            JOIN micro_habitat
+                ON micro_habitat_species.micro_habitat_id
+                = micro_habitat.micro_habitat_id
+        WHERE micro_habitat_species.species_id = species.species_id
+    ),
+    (
+        SELECT group_concat(location_name, ' ')
+        FROM (
+            SELECT DISTINCT {REGION_NAME_SQL} as location_name
+            FROM {LOCATION_TABLES_SQL}
+            WHERE geo_location_species.species_id = species.species_id
+        )
+    )
+    FROM
+    species
+    JOIN genus ON species.genus_id = genus.genus_id
+    JOIN family ON genus.family_id = family.family_id
+    JOIN order_taxon ON family.order_id = order_taxon.order_id
+    """
+
+SEARCH_QUERY_SQL = f"""
+    SELECT
+    species_id,
+    taxon_order as 'Order',
+    family as Family,
+    genus as Genus,
+    species as Species,
+    bm25({SEARCH_TABLE}, 0.0, {", ".join(map(str, SEARCH_COLUMNS.values()))}) as rank
+    FROM
+    {SEARCH_TABLE}
+    WHERE
+    {SEARCH_TABLE} MATCH ?
+    ORDER BY
+    rank, species_id
+    LIMIT ?
+    """
+
+
+def build_species_search(conn: sqlite3.Connection) -> None:
+    """Build species search.
+
+    Creates the species_search FTS5 table and fills it from the
+    normalised tables.
+
+    Args:
+        conn (sqlite3.Connection):  SQLite3 connection object
+    """
+    logger.info("Building species search index")
+    try:
+        with conn:
+            conn.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+            conn.execute(
+                f"""CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+        species_id UNINDEXED,
+        {", ".join(SEARCH_COLUMNS)},
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )"""
+            )
+            conn.execute(SEARCH_INSERT_SQL)
+            conn.execute(
+                f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"
+            )
+    except Error as e:
+        logger.error(e)
+
+
+def search(text: str, limit: int = SEARCH_LIMIT) -> pandas.DataFrame:
+    """Search.
+
+    Args:
+        text (str):                     Free search text
+        limit (int):                    Maximum results
+
+    Returns:
+        results (pandas.DataFrame):     See search_species
+    """
+    with get_pool(get_db_path()).connection() as conn:
+        return search_species(conn, text, limit)
+
+
+def search_species(
+    conn: sqlite3.Connection, text: str, limit: int = SEARCH_LIMIT
+) -> pandas.DataFrame:
+    """Search species.
+
+    Args:
+        conn (sqlite3.Connection):      SQLite connection instance
+        text (str):                     Free search text
+        limit (int):                    Maximum results
+
+    Returns:
+        results (pandas.DataFrame):     species_id, Order, Family, Genus,
+                                        Species and rank of the matching
+                                        species, best match first. Lower
+                                        ranks are better matches.
+    """
+    match_query = build_match_query(text)
+    columns = ["species_id", "Order", "Family", "Genus", "Species", "rank"]
+    if match_query is None:
+        return pandas.DataFrame(columns=columns)
+    try:
+        return pandas.read_sql_query(
+            SEARCH_QUERY_SQL, conn, params=[match_query, limit]
+        )
+    except pandas.errors.DatabaseError as e:
+        logger.error(e)
+        return pandas.DataFrame(columns=columns)
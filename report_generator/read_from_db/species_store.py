@@ -0,0 +1,376 @@
+"""# Species Store.
+
+In-memory columnar species store for reports made without the database.
+
+When a report is made with --no-db the species are read straight from
+the dataset spreadsheet. The sheet is loaded into a SpeciesStore once:
+text columns are dictionary encoded as integer codes and a list of
+distinct values, and numeric columns are NumPy float arrays. The encoded
+columns are cached next to the other caches, keyed by the spreadsheet
+path, size and modification time, so later reports do not parse the
+spreadsheet again.
+
+Query options are evaluated with the same semantics as read_from_db
+(see query_compiler.normalise_option) as vectorised masks. Text options
+are matched against the distinct values of a column, then expanded to
+rows through the codes. As in SQLite, LIKE is case-insensitive for ASCII
+letters, missing values never match and text in a numeric column sorts
+after every number. The search option matches each word as the start of
+a word in the names, nesting sites, habitats or regions, like the
+species_search index.
+
+Classes:
+    SpeciesStore:           Columnar species table with filtering
+
+Functions:
+    load_species_store:     Loads the store of a spreadsheet, cached
+"""
+import hashlib
+import os
+import re
+
+import numpy
+import pandas
+from loguru import logger
+
+from report_generator.project_setup.download_manager import get_cache_dir
+from report_generator.read_from_db.query_compiler import (
+    OUTPUT_COLUMNS,
+    QUERY_COLUMNS,
+    SEARCH_KEY,
+    normalise_option,
+    to_number,
+)
+
+# Bump when the cached format changes
+STORE_FORMAT = 1
+
+# Output columns held as numbers
+NUMERIC_COLUMNS = [
+    "SVLMMx",
+    "SVLFMx",
+    "SVLMx",
+    "Longevity",
+    "ClutchMin",
+    "ClutchMax",
+    "Clutch",
+    "EggDiameter",
+    "RangeSize",
+    "ElevationMin",
+    "ElevationMax",
+    "Elevation",
+]
+
+# Columns matched by the search option, as in the species_search index
+SEARCH_COLUMNS = [
+    "Species",
+    "Genus",
+    "Family",
+    "Order",
+    "NestingSite",
+    "MicroHabitat",
+    "GeographicRegion",
+]
+
+# Spreadsheet headings that differ from the output columns
+SHEET_COLUMNS = {"Microhabitat": "MicroHabitat"}
+
+ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+class SpeciesStore:
+    """SpeciesStore.
+
+    Columnar species table with filtering.
+
+    Args:
+        columns (dict):     Column name to ("text", codes, categories) or
+                            ("number", values, text_mask) tuples
+        size (int):         Number of rows
+    """
+
+    def __init__(self, columns: dict, size: int) -> None:
+        """Init method for SpeciesStore."""
+        self.columns = columns
+        self.size = size
+
+    @classmethod
+    def from_data_frame(
+        cls, data_frame: pandas.DataFrame, clean: bool = True
+    ) -> "SpeciesStore":
+        """Build a store from a dataset DataFrame.
+
+        Values of "ND" or empty strings are treated as missing, as they
+        are when the dataset is imported into the database.
+
+        Args:
+            data_frame (pandas.DataFrame):  Dataset with the output columns
+            clean (bool):                   Clean the values with clean_value,
+                                            False for database results
+
+        Returns:
+            store (SpeciesStore):           Encoded store
+        """
+        data_frame = data_frame.rename(columns=SHEET_COLUMNS)
+        columns = {}
+        for name in OUTPUT_COLUMNS:
+            if name in data_frame.columns:
+                column = data_frame[name].astype(object)
+            else:
+                column = pandas.Series([None] * len(data_frame.index), dtype=object)
+            if clean:
+                column = column.map(clean_value, na_action="ignore")
+            if name in NUMERIC_COLUMNS:
+                values = pandas.to_numeric(column, errors="coerce").to_numpy(
+                    dtype=numpy.float64
+                )
+                text_mask = column.notna().to_numpy() & numpy.isnan(values)
+                columns[name] = ("number", values, text_mask)
+            else:
+                codes, categories = pandas.factorize(
+                    column.map(str, na_action="ignore")
+                )
+                columns[name] = ("text", codes.astype(numpy.int32), list(categories))
+        return cls(columns, len(data_frame.index))
+
+    @classmethod
+    def load(cls, path: str) -> "SpeciesStore":
+        """Load a store saved with save.
+
+        Raises:
+            OSError:        If the file can not be read
+            ValueError:     If the file is not a saved store
+        """
+        with numpy.load(path, allow_pickle=False) as archive:
+            if int(archive["format"]) != STORE_FORMAT:
+                raise ValueError(f"Unsupported species store format: {path}")
+            columns = {}
+            for name in OUTPUT_COLUMNS:
+                if name in NUMERIC_COLUMNS:
+                    columns[name] = (
+                        "number",
+                        archive[f"{name}.values"],
+                        archive[f"{name}.text"],
+                    )
+                else:
+                    columns[name] = (
+                        "text",
+                        archive[f"{name}.codes"],
+                        archive[f"{name}.categories"].tolist(),
+                    )
+            return cls(columns, int(archive["size"]))
+
+    def save(self, path: str) -> None:
+        """Save the encoded columns to a compressed numpy archive."""
+        arrays = {"format": STORE_FORMAT, "size": self.size}
+        for name, (kind, first, second) in self.columns.items():
+            if kind == "number":
+                arrays[f"{name}.values"] = first
+                arrays[f"{name}.text"] = second
+            else:
+                arrays[f"{name}.codes"] = first
+                arrays[f"{name}.categories"] = numpy.asarray(second, dtype=str)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            numpy.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+
+    def filter(self, query_options: dict) -> numpy.ndarray:
+        """Filter rows.
+
+        Args:
+            query_options (dict):   Options from get_query_options
+
+        Returns:
+            mask (ndarray):         Boolean mask of the matching rows
+
+        Raises:
+            ValueError:             If an option key is not a known column
+        """
+        mask = numpy.ones(self.size, dtype=bool)
+        for key, value in query_options.items():
+            mask &= self.match_option(key, value)
+        return mask
+
+    def select(self, query_options: dict) -> pandas.DataFrame:
+        """Select the rows matching the options.
+
+        Args:
+            query_options (dict):           Options from get_query_options
+
+        Returns:
+            data_frame (pandas.DataFrame):  Matching rows with the
+                                            read_from_db output columns
+        """
+        rows = numpy.flatnonzero(self.filter(query_options))
+        data = {}
+        for name, (kind, first, second) in self.columns.items():
+            if kind == "number":
+                data[name] = first[rows]
+            else:
+                categories = numpy.asarray(second + [None], dtype=object)
+                data[name] = categories[first[rows]]
+        return pandas.DataFrame(data, columns=OUTPUT_COLUMNS)
+
+    def match_option(self, key: str, value) -> numpy.ndarray:
+        """Match option.
+
+        Args:
+            key (str):          Query option key
+            value (str|list):   Query option value
+
+        Returns:
+            mask (ndarray):     Rows matching any of the option values
+        """
+        if key == SEARCH_KEY:
+            return self.match_search(value)
+        ops, values = normalise_option(key, value)
+        column = "Order" if QUERY_COLUMNS[key] == "order_taxon_name" else key
+        if not ops:
+            return numpy.ones(self.size, dtype=bool)
+        if ops == ("BETWEEN",):
+            return self.match_range(column, values[0], values[1])
+
+        mask = numpy.zeros(self.size, dtype=bool)
+        for op, item in zip(ops, values):
+            if op == ">=":
+                mask |= self.match_range(column, item, None)
+            elif op == "<=":
+                mask |= self.match_range(column, None, item)
+            elif op == "=":
+                mask |= self.match_equal(column, item)
+            else:
+                mask |= self.match_like(column, item)
+        return mask
+
+    def match_range(self, column: str, low, high) -> numpy.ndarray:
+        """Match rows with low <= value <= high, either bound optional."""
+        kind, values, text_mask = self.columns[column]
+        if kind != "number":
+            return self.match_categories(
+                column, lambda text: in_range(to_number(text), low, high)
+            )
+        values = numpy.where(text_mask, numpy.inf, values)
+        with numpy.errstate(invalid="ignore"):
+            mask = ~numpy.isnan(values)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return mask
+
+    def match_equal(self, column: str, number) -> numpy.ndarray:
+        """Match rows equal to a number."""
+        kind = self.columns[column][0]
+        if kind == "number":
+            return self.match_range(column, number, number)
+        return self.match_categories(column, lambda text: to_number(text) == number)
+
+    def match_like(self, column: str, pattern: str) -> numpy.ndarray:
+        """Match rows LIKE a pattern, with % and _ wildcards."""
+        regex = like_to_regex(pattern)
+        kind, values, text_mask = self.columns[column]
+        if kind == "text":
+            return self.match_categories(
+                column, lambda text: regex.fullmatch(text.translate(ASCII_LOWER))
+            )
+        mask = numpy.zeros(self.size, dtype=bool)
+        for row in numpy.flatnonzero(~numpy.isnan(values)):
+            text = format_number(values[row]).translate(ASCII_LOWER)
+            mask[row] = regex.fullmatch(text) is not None
+        return mask
+
+    def match_search(self, text) -> numpy.ndarray:
+        """Match rows with every word of the text starting a word."""
+        if isinstance(text, list):
+            text = " ".join(text)
+        mask = numpy.ones(self.size, dtype=bool)
+        for word in re.findall(r"\w+", text.lower()):
+            regex = re.compile(r"(?<!\w)" + re.escape(word))
+            found = numpy.zeros(self.size, dtype=bool)
+            for column in SEARCH_COLUMNS:
+                found |= self.match_categories(
+                    column, lambda value: regex.search(value.lower())
+                )
+            mask &= found
+        return mask
+
+    def match_categories(self, column: str, predicate) -> numpy.ndarray:
+        """Match rows whose text value satisfies a predicate.
+
+        The predicate is evaluated once per distinct value.
+        """
+        _, codes, categories = self.columns[column]
+        matched = [i for i, text in enumerate(categories) if predicate(text)]
+        return numpy.isin(codes, matched)
+
+
+def load_species_store(sheet_path: str, cache_dir: str = None) -> SpeciesStore:
+    """Load species store.
+
+    Loads the store of a spreadsheet from the cache, or reads and encodes
+    the spreadsheet and caches the store.
+
+    Args:
+        sheet_path (str):       Path to the dataset spreadsheet
+        cache_dir (str):        Cache directory, defaults to
+                                get_cache_dir("species_store")
+
+    Returns:
+        store (SpeciesStore):   Store of the spreadsheet
+    """
+    cache_dir = cache_dir or get_cache_dir("species_store")
+    stat = os.stat(sheet_path)
+    key = f"{os.path.abspath(sheet_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    cache_path = os.path.join(
+        cache_dir, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.npz"
+    )
+    try:
+        store = SpeciesStore.load(cache_path)
+        logger.debug(f"Species store read from cache: {cache_path}")
+        return store
+    except (OSError, ValueError, KeyError):
+        pass
+
+    logger.info(f"Reading species spreadsheet: {sheet_path}")
+    store = SpeciesStore.from_data_frame(pandas.read_excel(sheet_path))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        store.save(cache_path)
+    except OSError as e:
+        logger.warning(f"Unable to cache species store: {e}")
+    return store
+
+
+def clean_value(value):
+    """Strip a value and treat "ND" and empty strings as missing."""
+    if isinstance(value, str):
+        value = value.strip().strip('"')
+        if value in ["", "ND"]:
+            return None
+    return value
+
+
+def like_to_regex(pattern: str) -> re.Pattern:
+    """Convert a LIKE pattern to a regex over ASCII lower-cased text."""
+    parts = []
+    for char in pattern.translate(ASCII_LOWER):
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def format_number(value: float) -> str:
+    """Format a number as SQLite does when it is compared as text."""
+    return repr(float(value))
+
+
+def in_range(number, low, high) -> bool:
+    """Check low <= number <= high, either bound optional."""
+    if number is None:
+        return False
+    return (low is None or number >= low) and (high is None or number <= high)
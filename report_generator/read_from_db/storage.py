@@ -0,0 +1,230 @@
+"""# Storage.
+
+Storage backend interface of the read path.
+
+read_from_db, read_batch_from_db, stream_from_db and read_taxa read the
+species through a StorageBackend. Every backend returns the read_from_db output columns,
+applies query options with the semantics of query_compiler and returns
+species in species_id or taxonomic order, so backends are
+interchangeable. The SQLite backend (query_db.SQLiteBackend) runs the
+compiled SQL on the normalised tables.
+
+ColumnarBackend is an embedded columnar engine for whole-dataset and
+range-heavy reports. The species query is materialised once per
+database version into a SpeciesStore (see species_store.py) of
+dictionary encoded text columns and NumPy numeric arrays, saved as a
+compressed archive in the cache directory. Options are answered with
+vectorised masks instead of row-store joins. Junction and region
+options, whose joined rows the store does not hold, and searches, which
+use the SQLite full-text index, are passed to the fallback backend.
+
+The backend is chosen with the storage_backend key of config.yaml,
+"sqlite" (default) or "columnar".
+
+Classes:
+    StorageBackend:     Interface of a storage backend
+    ColumnarBackend:    Columnar backend built from the SQLite tables
+"""
+import abc
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Iterator
+
+import pandas
+from loguru import logger
+
+from report_generator.project_setup.download_manager import get_cache_dir
+from report_generator.read_from_db.query_compiler import (
+    JUNCTION_KEYS,
+    ORDER_SPECIES,
+    ORDER_TAXONOMIC,
+    REGION_KEYS,
+    SEARCH_KEY,
+    format_species_query,
+)
+from report_generator.read_from_db.result_cache import get_db_fingerprint
+from report_generator.read_from_db.species_store import SpeciesStore
+
+# Storage backend names
+BACKEND_SQLITE = "sqlite"
+BACKEND_COLUMNAR = "columnar"
+
+# Columns of the taxonomic order, ties are kept in species_id order
+TAXONOMIC_COLUMNS = ["Order", "Family", "Genus", "Species"]
+
+# Options read from the fallback backend
+FALLBACK_KEYS = JUNCTION_KEYS + REGION_KEYS + [SEARCH_KEY]
+
+STORES = {}
+STORES_LOCK = threading.Lock()
+
+
+class StorageBackend(abc.ABC):
+    """StorageBackend.
+
+    Interface of a storage backend. Subclasses implement read, and may
+    override stream, read_taxa and write.
+
+    Args:
+        db_path (str):      Path to the species database
+    """
+
+    name = None
+
+    def __init__(self, db_path: str) -> None:
+        """Init method for StorageBackend."""
+        self.db_path = db_path
+
+    @abc.abstractmethod
+    def read(self, query_options: dict, order: str = ORDER_SPECIES) -> pandas.DataFrame:
+        """Read species.
+
+        Args:
+            query_options (dict):           Options from get_query_options
+            order (str):                    ORDER_SPECIES or ORDER_TAXONOMIC
+
+        Returns:
+            results (pandas.DataFrame):     Matching species with the
+                                            read_from_db output columns
+        """
+
+    def read_batch(self, query_options_list: list, order: str = ORDER_SPECIES) -> list:
+        """Read species for several option sets.
+
+        Args:
+            query_options_list (list):      Options from get_query_options
+            order (str):                    ORDER_SPECIES or ORDER_TAXONOMIC
+
+        Returns:
+            results (list):                 DataFrame of each option set, see
+                                            read
+        """
+        return [self.read(query_options, order) for query_options in query_options_list]
+
+    def stream(
+        self, query_options: dict, chunk_size: int, order: str = ORDER_TAXONOMIC
+    ) -> Iterator[pandas.DataFrame]:
+        """Stream species.
+
+        Args:
+            query_options (dict):           Options from get_query_options
+            chunk_size (int):               Maximum rows per chunk
+            order (str):                    ORDER_SPECIES or ORDER_TAXONOMIC
+
+        Yields:
+            chunk (pandas.DataFrame):       Consecutive results, with the
+                                            index continuing across chunks
+        """
+        results = self.read(query_options, order)
+        for start in range(0, len(results.index), chunk_size):
+            end = start + chunk_size
+            yield results.iloc[start:end]
+
+    def read_taxa(self, query_options: dict) -> pandas.DataFrame:
+        """Read the distinct Order, Family and Genus of the matching species."""
+        results = self.read(query_options)
+        return results[["Order", "Family", "Genus"]].drop_duplicates(ignore_index=True)
+
+    def write(self, conn: sqlite3.Connection) -> None:
+        """Store the dataset from the populated SQLite tables.
+
+        Args:
+            conn (sqlite3.Connection):      Connection to the species database
+        """
+
+
+class ColumnarBackend(StorageBackend):
+    """ColumnarBackend.
+
+    Columnar backend built from the SQLite tables.
+
+    Args:
+        db_path (str):              Path to the species database
+        fallback (StorageBackend):  Backend used for junction, region and
+                                    search options
+        cache_dir (str):            Directory of the saved stores, defaults
+                                    to get_cache_dir("columnar")
+    """
+
+    name = BACKEND_COLUMNAR
+
+    def __init__(
+        self, db_path: str, fallback: StorageBackend, cache_dir: str = None
+    ) -> None:
+        """Init method for ColumnarBackend."""
+        super().__init__(db_path)
+        self.fallback = fallback
+        self.cache_dir = cache_dir or get_cache_dir("columnar")
+
+    def read(self, query_options: dict, order: str = ORDER_SPECIES) -> pandas.DataFrame:
+        """Read species, see StorageBackend.read."""
+        if any(key in FALLBACK_KEYS for key in query_options):
+            logger.debug("Columnar backend passing options to fallback")
+            return self.fallback.read(query_options, order)
+        results = self.load().select(query_options)
+        if order == ORDER_TAXONOMIC:
+            results["_position"] = results.index
+            results = results.sort_values(
+                TAXONOMIC_COLUMNS + ["_position"], na_position="first"
+            ).drop(columns="_position")
+            results = results.reset_index(drop=True)
+        return results
+
+    def write(self, conn: sqlite3.Connection) -> SpeciesStore:
+        """Build and save the store of the current database version.
+
+        Args:
+            conn (sqlite3.Connection):      Connection to the species database
+
+        Returns:
+            store (SpeciesStore):           Store of the species query
+        """
+        fingerprint = get_db_fingerprint(self.db_path)
+        logger.info("Building columnar species store")
+        data_frame = pandas.read_sql_query(format_species_query("", ""), conn)
+        store = SpeciesStore.from_data_frame(data_frame, clean=False)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            store.save(self.get_store_path(fingerprint))
+        except OSError as e:
+            logger.warning(f"Unable to save columnar store: {e}")
+        with STORES_LOCK:
+            STORES[fingerprint[0]] = (fingerprint, store)
+        return store
+
+    def load(self) -> SpeciesStore:
+        """Load the store of the current database version.
+
+        The store is read from memory, then from the cache directory, and
+        is built from the database if neither holds the current version.
+
+        Returns:
+            store (SpeciesStore):           Store of the species query
+        """
+        fingerprint = get_db_fingerprint(self.db_path)
+        with STORES_LOCK:
+            cached = STORES.get(fingerprint[0])
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        try:
+            store = SpeciesStore.load(self.get_store_path(fingerprint))
+            logger.debug("Columnar store read from cache")
+        except (OSError, ValueError, KeyError):
+            uri = f"{pathlib.Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True)
+            try:
+                return self.write(conn)
+            finally:
+                conn.close()
+        with STORES_LOCK:
+            STORES[fingerprint[0]] = (fingerprint, store)
+        return store
+
+    def get_store_path(self, fingerprint: list) -> str:
+        """Get the saved store path of a database fingerprint."""
+        key = json.dumps(fingerprint).encode("utf-8")
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(key).hexdigest()}.npz")
@@ -4,5 +4,10 @@ This is the core package of the project. It takes a data source and produces a P
 - amphibian.py: A class representing Amphibian species. Structures data for insertion into pdf templating engine.
 - create_report.py: Creates the PDF document.
 - main.py: An entry point for the package. Works with the CLI of the program to run the create_report module.
+- taxonomy_tree.py: Order, Family, Genus and Species index of the report rows.
+- parallel_render.py: Process-parallel rendering of the report sections.
+- images.py: Pre-scaled image renditions for the report.
+- page_plan.py: Page numbers of a report, planned before its pages are drawn.
+- batch.py: Many reports rendered from one warm session.
 
 """
@@ -4,6 +4,7 @@ AmphibianData class and associated methods. Used to represent the amphibian
 data from the dataset/database to insert into the create pdf process.
 
 """
+import json
 
 
 class AmphibianData:
@@ -50,7 +51,28 @@ class AmphibianData:
         # fecundity, egg hatching, age maturity, metamorphosis are missing
 
     def get_geographic_regions(self, amp_info: list) -> str:
+        """Get geographic regions.
+
+        The database returns the regions as a JSON array of cleaned,
+        deduplicated location names. Lists are used as they are, and
+        comma separated strings, as read from the spreadsheet or older
+        databases, have the placeholders stripped and are deduplicated.
+
+        Args:
+            amp_info: amphibian info list
+
+        Return:
+            regions(str): regions joined with "/"
+
+        """
         geo = amp_info[17]
+        if isinstance(geo, str) and geo.startswith("["):
+            try:
+                geo = json.loads(geo)
+            except ValueError:
+                pass
+        if isinstance(geo, list):
+            return "/".join(geo) if geo else "Unknown"
         geo = geo.split(",")
         geo_n = []
         for g in geo:
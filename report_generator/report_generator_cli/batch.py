@@ -0,0 +1,436 @@
+"""# Batch.
+
+Many reports rendered from one warm session.
+
+A batch manifest is a YAML file listing report specs: the name, the
+query filters and optionally the title, author, university, school,
+fonts and chapters pdf of each report. Keys under defaults apply to
+every report, and the report's own keys take precedence; filters and
+fonts are merged key by key. Fonts are merged over the fonts of
+config.yaml, and the author, university and school default to the
+project's.
+
+    defaults:
+        author: Herpetology Group
+        fonts:
+            header_size: 20
+    reports:
+        - name: Anura
+          filters:
+              order_taxon_name: Anura
+        - name: Critically Endangered
+          filters:
+              IUCN: CR
+        - name: Europe
+          title: Amphibians of Europe
+          filters:
+              GeographicRegion: Europe
+
+The config is loaded once and the results of every report are read in
+one pass, with query_db.read_batch_from_db or from the species store of
+the spreadsheet with --no-db. The fonts and image renditions of each
+font choice are then warmed by drawing a title page and a genus section
+onto a scratch pdf, filling the in-memory and on-disk caches of fonts
+and images. The reports are rendered in a pool of worker processes,
+which take the session when they start, so each report is rendered
+without reading the config, data, fonts or images again. A summary of
+the time, pages and size of each report is written next to the reports.
+
+Classes:
+    ReportSpec:         Report of a batch manifest
+
+Functions:
+    main:               Runs the batch manifest of the CLI options
+    run_batch:          Renders the reports of a manifest
+    load_manifest:      Reads the report specs of a manifest
+    to_option:          Converts a filter value to a CLI option value
+    read_reports:       Reads the rows of every report in one pass
+    warm_session:       Fills the font and image caches of the reports
+    start_session:      Sets the session of a worker process
+    render_session_report: Renders a report of the session
+    write_summary:      Writes the summary of a batch
+    get_batch_workers:  Returns the number of worker processes
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+import pandas
+import yaml
+from fpdf import FPDF
+from loguru import logger
+
+import report_generator.fonts as fonts
+import report_generator.read_from_db.query_db
+import report_generator.report_generator_cli.create_report as create_report
+from report_generator.config import load_config
+from report_generator.read_from_db.query_db import get_query_options
+from report_generator.read_from_db.species_store import load_species_store
+from report_generator.report_generator_cli.taxonomy_tree import TaxonomyTree
+
+# Keys of a report spec in the manifest
+SPEC_KEYS = [
+    "name",
+    "filters",
+    "title",
+    "author",
+    "university",
+    "school",
+    "fonts",
+    "chapters",
+]
+
+# File name of the batch summary, in the report directory
+SUMMARY_FILE = "batch_summary.csv"
+
+# Session of the reports rendered by this process, see start_session
+SESSION = {}
+
+
+class ReportSpec:
+    """ReportSpec.
+
+    Report of a batch manifest.
+
+    Args:
+        name (str):             Name of the report, and its file name
+        options (dict):         CLI style options of the report filters
+        title (str):            Title on the title page
+        author (str):           Author of the report
+        university (str):       Name of the university
+        school (str):           Name of the university school
+        font_options (dict):    Fonts dict of the report
+        chapters (str):         Path of a chapters pdf, "" for no
+                                introduction, None as the CLI does
+    """
+
+    def __init__(
+        self,
+        name: str,
+        options: dict,
+        title: str,
+        author: str,
+        university: str,
+        school: str,
+        font_options: dict,
+        chapters: str = None,
+    ) -> None:
+        """Init method for ReportSpec."""
+        self.name = name
+        self.options = options
+        self.title = title
+        self.author = author
+        self.university = university
+        self.school = school
+        self.font_options = font_options
+        self.chapters = chapters
+
+    def get_file_name(self) -> str:
+        """Get the file name of the report, as create_report names it."""
+        return f"{'_'.join(self.name.split(' '))}.pdf"
+
+
+def main(arguments: dict) -> list:
+    """Run the batch manifest of the CLI options.
+
+    Args:
+        arguments (dict):   Dictionary of CLI options, --batch is the
+                            manifest path
+
+    Returns:
+        results (list):     Summary row of each report, see run_batch
+    """
+    config = load_config()
+    if config is None:
+        logger.error("No report project found, run report-generator --new first")
+        return []
+    return run_batch(arguments["--batch"], arguments, config)
+
+
+def run_batch(manifest_path: str, options: dict, config: dict) -> list:
+    """Run batch.
+
+    Args:
+        manifest_path (str):    Path of the batch manifest
+        options (dict):         CLI options, --no-db and --workers are used
+        config (dict):          Config dict
+
+    Returns:
+        results (list):         Summary row of each report, a dict with
+                                the name, path, species, pages, seconds,
+                                size_mb and error of the report
+    """
+    start_time = time.time()
+    specs = load_manifest(manifest_path, config, options)
+    if not specs:
+        logger.warning(f"No reports in batch manifest: {manifest_path}")
+        return []
+    logger.info(f"Batch of {len(specs)} reports: {manifest_path}")
+
+    curtime = time.time()
+    frames = read_reports(specs, config, options)
+    logger.info(f"Read {len(specs)} reports: {round(time.time() - curtime, 2)}s")
+
+    curtime = time.time()
+    warm_session(specs, frames, config)
+    logger.info(f"Warmed fonts and images: {round(time.time() - curtime, 2)}s")
+
+    report_dir = os.path.join(config["dir_path"], "report")
+    os.makedirs(report_dir, exist_ok=True)
+    session = {"specs": specs, "frames": frames, "config": config}
+    positions = range(len(specs))
+    workers = min(get_batch_workers(options, config), len(specs))
+    if workers <= 1:
+        start_session(session)
+        results = [render_session_report(position) for position in positions]
+    else:
+        logger.info(f"Rendering {len(specs)} reports in {workers} processes")
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=start_session, initargs=(session,)
+        ) as executor:
+            results = list(executor.map(render_session_report, positions))
+
+    write_summary(results, os.path.join(report_dir, SUMMARY_FILE))
+    failed = sum(1 for result in results if result["error"])
+    logger.info(
+        f"Batch Finished: {len(results) - failed} reports, {failed} failed - "
+        f"Time Taken: {round(time.time() - start_time, 2)}s"
+    )
+    return results
+
+
+def load_manifest(manifest_path: str, config: dict, options: dict = None) -> list:
+    """Load manifest.
+
+    Reports without a name, with a name used by an earlier report, or
+    with unknown keys are logged and left out.
+
+    Args:
+        manifest_path (str):    Path of the batch manifest
+        config (dict):          Config dict, for the default fonts and names
+        options (dict):         CLI options, --no-db is passed to each report
+
+    Returns:
+        specs (list):           ReportSpec of each report, in manifest order
+    """
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        manifest = yaml.load(file, Loader=yaml.loader.SafeLoader) or {}
+    defaults = manifest.get("defaults") or {}
+    no_db = bool((options or {}).get("--no-db"))
+
+    specs = []
+    names = set()
+    for position, report in enumerate(manifest.get("reports") or []):
+        report = report or {}
+        unknown = (set(defaults) | set(report)) - set(SPEC_KEYS)
+        name = str(report.get("name") or "").strip()
+        if unknown:
+            logger.error(f"Report {position + 1}: unknown keys {sorted(unknown)}")
+            continue
+        if not name:
+            logger.error(f"Report {position + 1}: no name")
+            continue
+        if name in names:
+            logger.error(f"Report {position + 1}: duplicate name {name}")
+            continue
+        names.add(name)
+
+        spec = {**defaults, **report}
+        filters = {**(defaults.get("filters") or {}), **(report.get("filters") or {})}
+        report_options = {
+            f"--{key.strip('-')}": to_option(value) for key, value in filters.items()
+        }
+        report_options["--no-db"] = no_db
+        font_options = {
+            **config["fonts"],
+            **(defaults.get("fonts") or {}),
+            **(report.get("fonts") or {}),
+        }
+        specs.append(
+            ReportSpec(
+                name,
+                report_options,
+                str(spec.get("title") or name).upper(),
+                str(spec.get("author") or config.get("author_name", "")).upper(),
+                str(spec.get("university") or config.get("uni_name", "")).upper(),
+                str(spec.get("school") or config.get("school_name", "")).upper(),
+                font_options,
+                spec.get("chapters"),
+            )
+        )
+    return specs
+
+
+def to_option(value) -> object:
+    """Convert a manifest filter value to the strings docopt passes."""
+    if isinstance(value, list):
+        return ["" if v is None else str(v) for v in value]
+    return None if value is None else str(value)
+
+
+def read_reports(specs: list, config: dict, options: dict = None) -> list:
+    """Read the rows of every report in one pass.
+
+    Args:
+        specs (list):       ReportSpec of each report
+        config (dict):      Config dict, data_set is read with --no-db
+        options (dict):     CLI options
+
+    Returns:
+        frames (list):      DataFrame of each report, as read_data_source
+                            returns it
+    """
+    if create_report.use_database(options or {}):
+        frames = report_generator.read_from_db.query_db.read_batch_from_db(
+            [spec.options for spec in specs]
+        )
+    else:
+        store = load_species_store(config["data_set"])
+        frames = [store.select(get_query_options(spec.options)) for spec in specs]
+    return [
+        frame.assign(comb_name=frame["Order"] + " " + frame["Family"])
+        for frame in frames
+    ]
+
+
+def warm_session(specs: list, frames: list, config: dict) -> None:
+    """Warm session.
+
+    Draws the title page and the first genus of the reports, with its
+    headings, onto a scratch pdf for each font choice, so the fonts are registered and
+    the image renditions of every slot are made before the reports are
+    rendered. Worker processes forked afterwards start with the caches
+    in memory, other workers read them from disk.
+
+    Args:
+        specs (list):       ReportSpec of each report
+        frames (list):      DataFrame of each report
+        config (dict):      Config dict
+    """
+    rows = next((frame for frame in frames if not frame.empty), None)
+    genus = None
+    if rows is not None:
+        genus = TaxonomyTree(rows).roots[0].children[0].children[0]
+        genus = TaxonomyTree(genus.rows())
+
+    warmed = []
+    for spec in specs:
+        if spec.font_options in warmed:
+            continue
+        warmed.append(spec.font_options)
+        pdf = FPDF()
+        fonts.add_font_choices_to_pdf(pdf, spec.font_options, config)
+        create_report.create_title_page(
+            spec.title, "", "", "", pdf, config, spec.font_options
+        )
+        if genus is not None:
+            create_report.create_report_order_sections(
+                genus, pdf, config, spec.font_options
+            )
+
+
+def start_session(session: dict) -> None:
+    """Start session.
+
+    Sets the specs, frames and config the reports of this process are
+    rendered from. Runs once in each worker process.
+
+    Args:
+        session (dict):     Dict with the specs, frames and config
+    """
+    SESSION.clear()
+    SESSION.update(session)
+
+
+def render_session_report(position: int) -> dict:
+    """Render a report of the session.
+
+    Errors are logged and returned in the summary row, so one report
+    does not stop the batch.
+
+    Args:
+        position (int):     Position of the report in the manifest
+
+    Returns:
+        result (dict):      Summary row of the report, see run_batch
+    """
+    spec = SESSION["specs"][position]
+    frame = SESSION["frames"][position]
+    config = SESSION["config"]
+    pdf_path = os.path.join(config["dir_path"], "report", spec.get_file_name())
+    result = {
+        "name": spec.name,
+        "path": pdf_path,
+        "species": len(frame.index),
+        "pages": 0,
+        "seconds": 0.0,
+        "size_mb": 0.0,
+        "error": "",
+    }
+    if frame.empty:
+        logger.warning(f"No species match the filters of report: {spec.name}")
+        result["error"] = "No species match the filters"
+        return result
+
+    start_time = time.time()
+    logger.info(f"Create Report Started: {spec.name}")
+    try:
+        create_report.render_report(
+            TaxonomyTree(frame),
+            pdf_path,
+            spec.title,
+            spec.author,
+            spec.university,
+            spec.school,
+            config,
+            spec.font_options,
+            spec.chapters,
+        )
+        with fitz.open(pdf_path) as doc:
+            result["pages"] = doc.page_count
+        result["size_mb"] = round(os.path.getsize(pdf_path) / (1 << 20), 2)
+    except Exception as e:
+        logger.error(f"Unable to create report {spec.name}: {e}")
+        result["error"] = str(e) or type(e).__name__
+    result["seconds"] = round(time.time() - start_time, 2)
+    logger.info(
+        f"Create Report Finished: {spec.name} - Time Taken: {result['seconds']}s, "
+        f"Pages: {result['pages']}, File Size: {result['size_mb']}MB"
+    )
+    return result
+
+
+def write_summary(results: list, summary_path: str) -> None:
+    """Write summary.
+
+    Args:
+        results (list):         Summary row of each report
+        summary_path (str):     Path of the summary csv
+    """
+    summary = pandas.DataFrame(
+        results,
+        columns=["name", "path", "species", "pages", "seconds", "size_mb", "error"],
+    )
+    summary.to_csv(summary_path, index=False)
+    logger.info(f"Batch summary: {summary_path}")
+
+
+def get_batch_workers(options: dict, config: dict) -> int:
+    """Get the number of processes the reports are rendered in.
+
+    Args:
+        options (dict):     CLI options, --workers is used if set
+        config (dict):      Config dict, batch_workers is used otherwise,
+                            then the number of CPUs
+
+    Returns:
+        workers (int):      Number of worker processes, 1 renders the
+                            reports in this process
+    """
+    workers = options.get("--workers") or config.get("batch_workers") or os.cpu_count()
+    try:
+        return max(1, int(workers))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid number of batch workers: {workers}")
+        return 1
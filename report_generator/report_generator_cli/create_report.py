@@ -25,6 +25,7 @@ import os
 import sys
 import time
 from pathlib import Path
+from typing import Iterator
 
 import fitz
 import pandas
@@ -33,8 +34,14 @@ from loguru import logger
 
 import report_generator.fonts as fonts
 import report_generator.read_from_db.query_db
+import report_generator.report_generator_cli.images as images
+import report_generator.report_generator_cli.page_plan as page_plan
+import report_generator.report_generator_cli.parallel_render as parallel_render
 from report_generator.config import load_config
+from report_generator.read_from_db.query_db import get_query_options
+from report_generator.read_from_db.species_store import load_species_store
 from report_generator.report_generator_cli.amphibian import AmphibianData
+from report_generator.report_generator_cli.taxonomy_tree import TaxonNode, TaxonomyTree
 
 
 def create_report(
@@ -81,15 +88,88 @@ def create_report(
     if font_options is None:
         font_options = config["fonts"]
 
+    workers = get_render_workers(options, config)
+
     curtime = time.time()
     logger.info("Started reading data source")
-    ds = read_data_source(data_source, options)
+    sections = None
+    if use_database(options) and workers == 1:
+        # Species are streamed while the pages are rendered, only the
+        # distinct taxa are read up front to size the contents pages
+        ds = TaxonomyTree(report_generator.read_from_db.query_db.read_taxa(options))
+        if page_plan.needs_body_plan(ds):
+            logger.info("Contents size needs the page numbers, reading all species")
+        else:
+            sections = iter_genus_sections(stream_data_source(options))
+    if sections is None:
+        # The whole tree is read to render in parallel, or to plan the
+        # body pages the contents size depends on
+        ds = TaxonomyTree(read_data_source(data_source, options))
     logger.info(f"Finished reading data source: {round(time.time() - curtime, 2)}s")
 
+    pdf_title = f"{'_'.join(report_name.split(' '))}.pdf"
+    pdf_ouput_path = os.path.join(config["dir_path"], "report", pdf_title)
+    render_report(
+        ds,
+        pdf_ouput_path,
+        report_name,
+        report_author,
+        university_name,
+        university_school,
+        config,
+        font_options,
+        pdf_chapters,
+        sections,
+        workers,
+    )
+
+    fs = round(os.path.getsize(pdf_ouput_path) / (1 << 20), 2)
+    debug_mess = f"Create Report Finished: {report_name} - "
+    debug_mess += f"Time Taken: {round((time.time() - startTime), 2)}s"
+    debug_mess += ", File Size: "
+    debug_mess += f"{fs}MB"
+    logger.info(debug_mess)
+
+
+def render_report(
+    ds: object,
+    pdf_path: str,
+    report_name: str,
+    report_author: str,
+    university_name: str,
+    university_school: str,
+    config: dict,
+    font_options: dict,
+    pdf_chapters: str = None,
+    sections: Iterator[tuple] = None,
+    workers: int = 1,
+) -> None:
+    """Render report.
+
+    Renders the pages of a report from data that has already been read
+    and writes it to pdf_path. Used by create_report and by the batch
+    reports (see batch).
+
+    Args:
+        ds - TaxonomyTree or Pandas Dataframe object, the taxa only if
+             sections are given
+        pdf_path - path the report is written to
+        report_name - Title of the report
+        report_author - Author of the report
+        university_name - Name of the university
+        university_school - Name of the university school
+        config - config dict
+        font_options - fonts dict
+        pdf_chapters - path of a chapters pdf, "" for no introduction
+        sections - genus sections from iter_genus_sections, streamed
+                   while the pages are rendered
+        workers - number of processes the report pages are rendered in
+
+    """
     pdf = FPDF()
     curtime = time.time()
     logger.info("Started adding fonts")
-    fonts.add_font_choices_to_pdf(pdf, font_options)
+    fonts.add_font_choices_to_pdf(pdf, font_options, config)
     logger.info(f"Finished adding fonts: {round(time.time() - curtime,2)}s")
 
     curtime = time.time()
@@ -107,45 +187,48 @@ def create_report(
 
     curtime = time.time()
     logger.info("Started creating contents pages")
-    pdf = create_contents_page(pdf, ds)
+    pdf = create_contents_page(pdf, ds, font_options, pdf_chapters != "", config)
     logger.info(f"Finished creating contents pages: {round(time.time() - curtime, 2)}s")
 
     curtime = time.time()
 
     logger.info("Started inserting chapters")
-    create_chapter_space(pdf, pdf_chapters)
+    create_chapter_space(pdf, pdf_chapters, font_options)
     logger.info("Finished inserting chapters")
 
     logger.info("Started creating report pages")
 
-    pdf = create_report_order_sections(ds, pdf, config, font_options)
-    pdf_title = f"{'_'.join(report_name.split(' '))}.pdf"
-    pdf_ouput_path = os.path.join(config["dir_path"], "report", pdf_title)
-    pdf.output(pdf_ouput_path)
+    if sections is not None:
+        pdf = create_report_stream_sections(sections, pdf, config, font_options)
+        pdf.output(pdf_path)
+    elif workers > 1:
+        create_report_parallel_sections(
+            ds, pdf, config, font_options, workers, pdf_path
+        )
+    else:
+        pdf = create_report_order_sections(ds, pdf, config, font_options)
+        pdf.output(pdf_path)
 
     logger.info(f"Finished creating report pages: {round(time.time() - curtime, 2)}s")
-    fp = pdf_ouput_path
-    fs = round(os.path.getsize(fp) / (1 << 20), 2)
 
-    insert_chapter_pdf(fp, pdf_chapters)
+    insert_chapter_pdf(pdf_path, pdf_chapters)
 
-    debug_mess = f"Create Report Finished: {report_name} - "
-    debug_mess += f"Time Taken: {round((time.time() - startTime), 2)}s"
-    debug_mess += ", File Size: "
-    debug_mess += f"{fs}MB"
-    logger.info(debug_mess)
 
+def create_chapter_space(pdf, chapter_file_loc, font_options=None) -> object:
+    """Create Space for chapters.
 
-def create_chapter_space(pdf, chapter_file_loc) -> object:
-    """Create Space for chapters"""
+    The heading is written in the header font of font_options, one of
+    the fonts registered with the report, or of the config if not given.
+    """
     if chapter_file_loc != "":
-        config = load_config()
-        header_font = config["fonts"]["header_font"]
-        header_size = config["fonts"]["header_size"]
+        if font_options is None:
+            font_options = load_config()["fonts"]
+        header_font = font_options["header_font"]
+        header_size = font_options["header_size"]
         pdf.start_section(name="Introduction", level=0)
         pdf.set_font(header_font, "", header_size)
         pdf.ln(20)
-        pdf.write(30, f"Report Section: ", "C")
+        pdf.write(30, f"Report Section: ")
     return pdf
 
 
@@ -202,13 +285,20 @@ def create_title_page(
     IMAGES_PATH = os.path.join(DATA_DIR_PATH, "images")
     os.path.join(DATA_DIR_PATH, "location")
     (Path(os.path.dirname(os.path.realpath(__file__)))).parent
-    pdf = FPDF()
+    dpi = get_image_dpi(config)
     pdf.add_page()
     pdf.start_section(name="Title Page", level=0)
     with pdf.local_context(fill_opacity=0.5, stroke_opacity=0.5):
-        pdf.image(f"{ os.path.join(IMAGES_PATH ,'back.png')}", x=0, y=0, h=300)
-        pdf.image(
-            f"{ os.path.join(IMAGES_PATH ,'school_banner.png')}", x=30, y=250, h=50
+        images.place_image(
+            pdf, f"{ os.path.join(IMAGES_PATH ,'back.png')}", x=0, y=0, h=300, dpi=dpi
+        )
+        images.place_image(
+            pdf,
+            f"{ os.path.join(IMAGES_PATH ,'school_banner.png')}",
+            x=30,
+            y=250,
+            h=50,
+            dpi=dpi,
         )
     with pdf.local_context(
         text_mode=TextMode.FILL, text_color=(227, 6, 19), line_width=2
@@ -222,7 +312,6 @@ def create_title_page(
             title_sub_font = font_options["title_font"]
             font_options["title_size"]
 
-        pdf = fonts.add_font_choices_to_pdf(pdf, None)
         pdf.set_font(title_font, "b", title_font_size)
 
         pdf.set_draw_color(255, 255, 255)
@@ -253,27 +342,39 @@ def create_title_page(
 # Contents page
 
 
-def create_contents_page(pdf: object, data_frame: object) -> object:
+def create_contents_page(
+    pdf: object,
+    data_frame: object,
+    font_options: dict = None,
+    introduction: bool = False,
+    config: dict = None,
+) -> object:
     """Create contents page.
 
-    Creates space for contents to be created in the document. Currently hardcoded.
-    Will throw exception if the space isn't the correct amount.
-
-    53 on first contents page
-    63 every page after
+    Creates space for contents to be created in the document. The pages
+    of the report are planned first (see page_plan), so exactly as many
+    contents pages are reserved as render_toc will fill.
 
     Args:
         pdf - pdf object
+        data_frame - TaxonomyTree or Pandas Dataframe object
+        font_options - fonts dict, the body pages are planned if given
+        introduction - True if create_chapter_space adds an introduction
+        config - config dict, loaded for the fonts if not given
 
     Return:
         pdf - pdf object
 
     """
-    num_of_pages = calc_number_of_contents_pages(data_frame)
+    tree = get_taxonomy_tree(data_frame)
     pdf.add_page()
     pdf.set_text_color(0, 0, 0)
     pdf.start_section(name="Table Of Contents", level=0)
-    pdf.insert_toc_placeholder(render_toc, num_of_pages)
+    plan = page_plan.plan_report(
+        pdf, tree, font_options, get_section_amphibians, introduction, config
+    )
+    logger.info(f"Planned {plan.toc_pages} contents pages, {plan.pages} pages")
+    pdf.insert_toc_placeholder(render_toc, plan.toc_pages)
     return pdf
 
 
@@ -281,34 +382,29 @@ def calc_number_of_contents_pages(data_frame: object) -> int:
     """Calc number of contents pages.
 
     Works out the number of contents pages required for
-    pdf.insert_to_placeholder(render_toc, num_of_pages)
-
-    Currently hardcoded.
-
-    Formula used currently:
-        53 on first contents page
-        63 every page after
+    pdf.insert_toc_placeholder(render_toc, num_of_pages), for a report
+    with a title page and no introduction.
 
     Args:
-        data_frame: Pandas DataFrame object
+        data_frame: TaxonomyTree, or Pandas DataFrame object to build one from
 
     Returns:
         count: integer of count
 
     """
-    order_len = len((data_frame["Order"]).value_counts())
-    family_len = len((data_frame["Family"]).value_counts())
-    genus_len = len((data_frame["Genus"]).value_counts())
-
-    total = order_len + family_len + genus_len
-
-    additional_count = 0
-    if ((total - 53) % 63) != 0:
-        additional_count += 1
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.start_section(name="Title Page", level=0)
+    pdf.add_page()
+    pdf.start_section(name="Table Of Contents", level=0)
+    return page_plan.plan_report(pdf, get_taxonomy_tree(data_frame)).toc_pages
 
-    count = 1 + ((total - 53) // 63) + additional_count
 
-    return count
+def get_taxonomy_tree(data_frame: object) -> TaxonomyTree:
+    """Get the taxonomy tree of a dataframe, or the tree itself if given one."""
+    if isinstance(data_frame, TaxonomyTree):
+        return data_frame
+    return TaxonomyTree(data_frame)
 
 
 def create_report_order_sections(
@@ -316,18 +412,17 @@ def create_report_order_sections(
 ) -> object:
     """Create report order sections.
 
-    Filter function that splits the data frame (ds) into smaller dataframes
-    based on the 'Order' column in the dataframe.
+    Walks the order nodes of the taxonomy tree of the data frame (ds).
+    The tree is built once, by sorting and grouping the rows, and each
+    level takes its sections from it without filtering the frame again.
 
     Process:
-        Creates dataframe subsections
-        Sorts the new dataframes.
-        Loops through each of smaller dataframes to create contents section and level
+        Loops through each order to create contents section and level
         Writes section title
-        Passes section to the next filter function.
+        Passes order node to the next section function.
 
     Args:
-        ds - Pandas Dataframe object
+        ds - TaxonomyTree or Pandas Dataframe object
         pdf - pdf object
         config - config dict
         font_options - fonts dict
@@ -335,41 +430,27 @@ def create_report_order_sections(
         pdf - pdf object
 
     """
-    order = ds["Order"]
-    order_names = order.value_counts().index.tolist()
-    order_names.sort()
-    header_font = font_options["header_font"]
-    header_font_size = font_options["header_size"]
-    for name in order_names:
-        sect = ds[ds["Order"] == name]
-        pdf.add_page()
-        pdf.start_section(name=name, level=0)
-        pdf.set_font(header_font, "b", header_font_size)
-        pdf.ln(20)
-        pdf.write(30, f"Order {name}", "C")
-        pdf.ln(20)
-        pdf = create_report_family_sections(sect, pdf, config, font_options)
+    tree = get_taxonomy_tree(ds)
+    for order in tree.roots:
+        write_order_heading(pdf, order.name, font_options)
+        pdf = create_report_family_sections(order, pdf, config, font_options)
 
     return pdf
 
 
 def create_report_family_sections(
-    section_list: object, pdf: object, config: dict, font_options: dict
+    order: TaxonNode, pdf: object, config: dict, font_options: dict
 ) -> object:
     """Create report family sections.
 
-    Filter function that splits the data frame (section_list)
-    into smaller dataframes based on the 'Family' column in the dataframe.
-
     Process:
-        Creates dataframe subsections
-        Sorts the new dataframes.
-        Loops through each of smaller dataframes to create contents section and level
+        Loops through each family of the order to create contents section
+        and level
         Writes section title
-        Passes section to the next filter function.
+        Passes family node to the next section function.
 
     Args:
-        section_list - Pandas Dataframe object
+        order - TaxonNode of an order
         pdf - pdf object
         config - config dict
 
@@ -377,41 +458,26 @@ def create_report_family_sections(
         pdf - pdf object
 
     """
-    family = section_list["Family"]
-    family_names = family.value_counts().index.tolist()
-    family_names.sort()
-    header_font = font_options["header_font"]
-    header_font_size = font_options["header_size"]
-    for name in family_names:
-        sect = section_list[section_list["Family"] == name]
-        pdf.start_section(name=name, level=1)
-        pdf.set_font(header_font, "b", (header_font_size / 4) * 3)
-        pdf.ln(20)
-        pdf.write(10, f"Family {name}", "C")
-        pdf.add_page()
-        pdf = create_report_genus_sections(sect, pdf, config, font_options)
+    for family in order.children:
+        write_family_heading(pdf, family.name, font_options)
+        pdf = create_report_genus_sections(family, pdf, config, font_options)
 
     return pdf
 
 
 def create_report_genus_sections(
-    section_list: object, pdf: object, config: dict, font_options: dict
+    family: TaxonNode, pdf: object, config: dict, font_options: dict
 ) -> object:
     """Create report genus sections.
 
-    Filter function that splits the data frame (ds) into smaller dataframes
-    based on the 'Family' column in the dataframe.
-
     Process:
-        Creates dataframe subsections
-        Sorts the new dataframes.
-        Loops through each of smaller dataframes to create contents section
+        Loops through each genus of the family to create contents section
         and level
         Writes section title
-        Passes section to the create report pages function.
+        Passes the rows of the genus to the create report pages function.
 
     Args:
-        section_list - Pandas Dataframe object
+        family - TaxonNode of a family
         pdf - pdf object
         config - config dict
 
@@ -419,29 +485,154 @@ def create_report_genus_sections(
         pdf - pdf object
 
     """
-    genus = section_list["Genus"]
-    genus_names = genus.value_counts().index.tolist()
-    genus_names.sort()
-    header_font = font_options["header_font"]
-    header_font_size = font_options["header_size"]
-    for name in genus_names:
-        sect = section_list[section_list["Genus"] == name]
-        pdf.set_font(header_font, "bi", (header_font_size / 4) * 3)
-        pdf.write(10, f"Genus {name}")
-        pdf.start_section(name=name, level=2)
-        pdf.ln(10)
+    for genus in family.children:
+        write_genus_heading(pdf, genus.name, font_options)
+        pdf = create_report_section_pages(genus.rows(), pdf, config, font_options)
+
+    return pdf
+
+
+def create_report_stream_sections(
+    sections: Iterator[tuple], pdf: object, config: dict, font_options: dict
+) -> object:
+    """Create report stream sections.
+
+    Streaming counterpart of create_report_order_sections. Takes genus
+    sections in taxonomic order, as yielded by iter_genus_sections, and
+    writes the order and family headings whenever they change. Pages are
+    rendered as each section arrives, so only one genus is held in memory
+    at a time.
+
+    Args:
+        sections - iterator of ((order, family, genus), dataframe) tuples
+        pdf - pdf object
+        config - config dict
+        font_options - fonts dict
+
+    Returns:
+        pdf - pdf object
+
+    """
+    current_order = None
+    current_family = None
+    for (order, family, genus), sect in sections:
+        if order != current_order:
+            write_order_heading(pdf, order, font_options)
+            current_order = order
+            current_family = None
+        if family != current_family:
+            write_family_heading(pdf, family, font_options)
+            current_family = family
+        write_genus_heading(pdf, genus, font_options)
         pdf = create_report_section_pages(sect, pdf, config, font_options)
 
     return pdf
 
 
+def create_report_parallel_sections(
+    ds: object,
+    pdf: object,
+    config: dict,
+    font_options: dict,
+    workers: int,
+    pdf_path: str,
+) -> None:
+    """Create report parallel sections.
+
+    Process-parallel counterpart of create_report_order_sections. The
+    sections are split into shards at family boundaries, rendered with
+    render_shard in a pool of worker processes and merged after the front
+    pages, see parallel_render.
+
+    Args:
+        ds - TaxonomyTree or Pandas Dataframe object
+        pdf - pdf object with the front pages rendered
+        config - config dict
+        font_options - fonts dict
+        workers - number of worker processes
+        pdf_path - path the report is written to
+
+    """
+    tree = get_taxonomy_tree(ds)
+    shards = parallel_render.plan_shards(tree, workers)
+    results = parallel_render.render_shards(
+        shards, render_shard, (config, font_options), workers
+    )
+    parallel_render.write_report(pdf, results, pdf_path)
+
+
+def render_shard(
+    shard: parallel_render.Shard, config: dict, font_options: dict
+) -> parallel_render.ShardResult:
+    """Render shard.
+
+    Renders the sections of a shard to a new pdf, as
+    create_report_order_sections renders them in the report. Runs in the
+    worker processes of create_report_parallel_sections.
+
+    Args:
+        shard - Shard from parallel_render.plan_shards
+        config - config dict
+        font_options - fonts dict
+
+    Returns:
+        result - ShardResult with the pdf, page count and outline
+
+    """
+    pdf = parallel_render.ShardPDF()
+    fonts.add_font_choices_to_pdf(pdf, font_options, config)
+    tree = TaxonomyTree(shard.rows)
+    for position, order in enumerate(tree.roots):
+        if position == 0 and shard.continues_order:
+            # The family heading goes on the page the previous shard ended with
+            pdf.add_page()
+        else:
+            write_order_heading(pdf, order.name, font_options)
+        pdf = create_report_family_sections(order, pdf, config, font_options)
+
+    return parallel_render.ShardResult(
+        bytes(pdf.output()), pdf.page, pdf.sections, shard.continues_order
+    )
+
+
+def write_order_heading(pdf: object, name: str, font_options: dict) -> None:
+    """Start a new page and section for an order and write its heading."""
+    pdf.add_page()
+    pdf.start_section(name=name, level=0)
+    pdf.set_font(font_options["header_font"], "b", font_options["header_size"])
+    pdf.ln(20)
+    pdf.write(30, f"Order {name}")
+    pdf.ln(20)
+
+
+def write_family_heading(pdf: object, name: str, font_options: dict) -> None:
+    """Start a section for a family and write its heading."""
+    pdf.start_section(name=name, level=1)
+    pdf.set_font(
+        font_options["header_font"], "b", (font_options["header_size"] / 4) * 3
+    )
+    pdf.ln(20)
+    pdf.write(10, f"Family {name}")
+    pdf.add_page()
+
+
+def write_genus_heading(pdf: object, name: str, font_options: dict) -> None:
+    """Write the heading of a genus and start its section."""
+    pdf.set_font(
+        font_options["header_font"], "bi", (font_options["header_size"] / 4) * 3
+    )
+    pdf.write(10, f"Genus {name}")
+    pdf.start_section(name=name, level=2)
+    pdf.ln(10)
+
+
 # Create pages
 def create_report_section_pages(section, pdf, config, font_options):
     """Create report section pages.
 
-    Takes the section passed to it. Passes section to 'create_amphibian_list'
-    function to get the data transformed into a list of amphibian objects. Sorts
-    the list by name. Loops through list of amphibian objects and passes them to the
+    Takes the section passed to it. Passes section to 'get_section_amphibians'
+    function to get the data transformed into a list of amphibian objects, sorted
+    by name. Loops through list of amphibian objects and passes them to the
     'create_report_section_page' function.
 
     Args:
@@ -459,8 +650,7 @@ def create_report_section_pages(section, pdf, config, font_options):
     IMAGES_PATH = os.path.join(DATA_DIR_PATH, "images")
     os.path.join(DATA_DIR_PATH, "location")
     (Path(os.path.dirname(os.path.realpath(__file__)))).parent
-    amp_list = create_amphibian_list(section)
-    amp_list = sorted(amp_list, key=lambda a: a.species)
+    amp_list = get_section_amphibians(section)
 
     # Hardcoded example image will have to replace this
     amp_list[0].image_url_male = f"{ os.path.join(IMAGES_PATH ,'f1.jpg')}"
@@ -556,6 +746,7 @@ def insert_species_images(amp, pdf, config, font_options):
     IMAGES_PATH = os.path.join(DATA_DIR_PATH, "images")
     os.path.join(DATA_DIR_PATH, "location")
     (Path(os.path.dirname(os.path.realpath(__file__)))).parent
+    dpi = get_image_dpi(config)
     header_font = font_options["header_font"]
     header_font_size = font_options["header_size"]
     paragraph_font = font_options["paragraph_font"]
@@ -566,9 +757,17 @@ def insert_species_images(amp, pdf, config, font_options):
     pdf.write(5, "Species Images:")
     pdf.ln(75)
     if amp.has_image_url():
-        pdf.image(f"{amp.image_url_male}", x=10, y=70, w=(WIDTH / 2) - 25, h=50)
-        pdf.image(
-            f"{amp.image_url_female}", x=WIDTH / 2, y=70, w=(WIDTH / 2) - 25, h=50
+        images.place_image(
+            pdf, f"{amp.image_url_male}", x=10, y=70, w=(WIDTH / 2) - 25, h=50, dpi=dpi
+        )
+        images.place_image(
+            pdf,
+            f"{amp.image_url_female}",
+            x=WIDTH / 2,
+            y=70,
+            w=(WIDTH / 2) - 25,
+            h=50,
+            dpi=dpi,
         )
         tcell_width = 60
         tcell_height = 5
@@ -577,19 +776,23 @@ def insert_species_images(amp, pdf, config, font_options):
         pdf.cell(tcell_width - 20, tcell_height)
         pdf.cell(tcell_width, tcell_height, "Female Image", align="C", border=0)
     else:
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{os.path.join(IMAGES_PATH,'frogsil1.png')}",
             x=10,
             y=70,
             w=(WIDTH / 2) - 25,
             h=50,
+            dpi=dpi,
         )
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{os.path.join(IMAGES_PATH,'frogsil2.png')}",
             x=WIDTH / 2,
             y=70,
             w=(WIDTH / 2) - 25,
             h=50,
+            dpi=dpi,
         )
         tcell_width = 60
         tcell_height = 5
@@ -702,15 +905,7 @@ def create_report_page_table_compact(amphibian_data, pdf, config, font_options):
     pdf.set_font(paragraph_font, "b", paragraph_font_size - 2)
 
     for key, value in amphibian_data.__dict__.items():
-        if key not in [
-            "position",
-            "image_url_male",
-            "image_url_female",
-            "order",
-            "family",
-            "genus",
-            "species",
-        ]:
+        if key not in page_plan.COMPACT_HIDDEN_FIELDS:
             key = " ".join(key.split("_")).title()
             pdf.set_font(paragraph_font, "b", paragraph_font_size - 2)
             if key == "Iucn Category":
@@ -786,6 +981,7 @@ def insert_species_images_compact(amp, pdf, image_offset, config, font_options):
     IMAGES_PATH = os.path.join(DATA_DIR_PATH, "images")
     os.path.join(DATA_DIR_PATH, "location")
     (Path(os.path.dirname(os.path.realpath(__file__)))).parent
+    dpi = get_image_dpi(config)
     WIDTH = 210
     header_font = font_options["header_font"]
     header_font_size = font_options["header_size"]
@@ -793,58 +989,74 @@ def insert_species_images_compact(amp, pdf, image_offset, config, font_options):
     font_options["paragraph_size"]
     pdf.set_font(header_font, "", (header_font_size / 4) + 4)
     if amp.has_image_url():
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{amp.image_url_male}",
             x=145,
             y=(20 + image_offset),
             w=(WIDTH / 3) - 25,
             h=30,
+            dpi=dpi,
         )
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{ os.path.join(IMAGES_PATH ,'maletext.png')}",
             x=145,
             y=(50 + image_offset),
             h=5,
+            dpi=dpi,
         )
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{amp.image_url_female}",
             x=145,
             y=(55 + image_offset),
             w=(WIDTH / 3) - 25,
             h=30,
+            dpi=dpi,
         )
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{ os.path.join(IMAGES_PATH ,'femaleimage.png')}",
             x=145,
             y=(86 + image_offset),
             h=4,
+            dpi=dpi,
         )
     else:
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{ os.path.join(IMAGES_PATH ,'frogsil1.png')}",
             x=145,
             y=(20 + image_offset),
             w=(WIDTH / 3) - 25,
             h=30,
+            dpi=dpi,
         )
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{ os.path.join(IMAGES_PATH ,'maletext.png')}",
             x=145,
             y=(50 + image_offset),
             h=5,
+            dpi=dpi,
         )
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{ os.path.join(IMAGES_PATH ,'frogsil2.png')}",
             x=145,
             y=(55 + image_offset),
             w=(WIDTH / 3) - 25,
             h=30,
+            dpi=dpi,
         )
-        pdf.image(
+        images.place_image(
+            pdf,
             f"{ os.path.join(IMAGES_PATH ,'femaleimage.png')}",
             x=145,
             y=(86 + image_offset),
             h=4,
+            dpi=dpi,
         )
 
     return pdf
@@ -862,7 +1074,9 @@ def create_report_index():
 def read_data_source(file_name: str, options: dict) -> object:
     """Read data source.
 
-    Read the data_source file and transform it into a pandas dataframe
+    Read the data_source file and transform it into a pandas dataframe.
+    With --no-db the query options are applied to the in-memory species
+    store of the spreadsheet.
 
     Args:
         file_name (str):    String path to file
@@ -872,17 +1086,109 @@ def read_data_source(file_name: str, options: dict) -> object:
         df - Pandas dataframe object
 
     """
-    if len(options.keys()) == 0:
+    if use_database(options):
         df = report_generator.read_from_db.query_db.read_from_db(options)
-    elif options["--no-db"] is None:
-        df = pandas.read_excel(file_name)
     else:
-        df = report_generator.read_from_db.query_db.read_from_db(options)
+        store = load_species_store(file_name)
+        df = store.select(get_query_options(options))
     df["comb_name"] = df["Order"] + " " + df["Family"]
 
     return df
 
 
+def stream_data_source(options: dict) -> Iterator[object]:
+    """Stream data source.
+
+    Streaming counterpart of read_data_source for the database. Yields
+    the query results in taxonomic order as bounded dataframe chunks.
+
+    Args:
+        options (dict):     Dictionary with options
+
+    Yields:
+        df - Pandas dataframe object
+
+    """
+    for df in report_generator.read_from_db.query_db.stream_from_db(options):
+        df["comb_name"] = df["Order"] + " " + df["Family"]
+        yield df
+
+
+def get_render_workers(options: dict, config: dict) -> int:
+    """Get the number of processes the report pages are rendered in.
+
+    Args:
+        options (dict):     Dictionary with options, --workers is used if set
+        config (dict):      Config dict, render_workers is used otherwise
+
+    Returns:
+        workers - int, 1 renders the report in this process
+
+    """
+    workers = options.get("--workers") or config.get("render_workers", 1)
+    try:
+        return max(1, int(workers))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid number of render workers: {workers}")
+        return 1
+
+
+def get_image_dpi(config: dict) -> int:
+    """Get the resolution of the image renditions.
+
+    Args:
+        config (dict):      Config dict, image_dpi is used if set
+
+    Returns:
+        dpi - int, dots per inch of the renditions
+
+    """
+    return int(config.get("image_dpi", images.RENDITION_DPI))
+
+
+def use_database(options: dict) -> bool:
+    """Check whether the report is read from the species database.
+
+    Args:
+        options (dict):     Dictionary with options
+
+    Returns:
+        bool - True if the database is the data source
+
+    """
+    return not options.get("--no-db")
+
+
+def iter_genus_sections(chunks: Iterator[object]) -> Iterator[tuple]:
+    """Iterate genus sections.
+
+    Groups chunks of rows in taxonomic order into one dataframe per genus.
+    The last genus of a chunk is held back until the next chunk shows it
+    is complete. Rows without an order, family or genus are skipped, as
+    they are by the taxonomy tree.
+
+    Args:
+        chunks - iterator of Pandas dataframe objects in taxonomic order
+
+    Yields:
+        section - ((order, family, genus), dataframe) tuple
+
+    """
+    taxa = ["Order", "Family", "Genus"]
+    pending = None
+    for chunk in chunks:
+        chunk = chunk.dropna(subset=taxa)
+        if pending is not None:
+            chunk = pandas.concat([pending, chunk])
+        if chunk.empty:
+            continue
+        groups = list(chunk.groupby(taxa, sort=False))
+        yield from groups[:-1]
+        pending = groups[-1][1]
+    if pending is not None:
+        yield from pending.groupby(taxa, sort=False)
+
+
 def create_amphibian_list(data_section: object) -> list:
     """Create amphibian list.
 
@@ -897,13 +1203,9 @@ def create_amphibian_list(data_section: object) -> list:
 
     """
     amphibian_list = []
-    for row in data_section.iterrows():
-        vals = []
-        for value in row:
-            if isinstance(value, int):
-                vals.append(value)
-            else:
-                vals = [*vals, *value.values]
+    # The rows as DataFrame.iterrows gives them, without a Series per row
+    for index, values in zip(data_section.index, data_section.values):
+        vals = [index, *values]
         for i in range(len(vals)):
             if pandas.isna(vals[i]):
                 vals[i] = "Unknown"
@@ -914,13 +1216,17 @@ def create_amphibian_list(data_section: object) -> list:
     return amphibian_list
 
 
+def get_section_amphibians(data_section: object) -> list:
+    """Get the amphibian objects of a section, in page order."""
+    return sorted(create_amphibian_list(data_section), key=lambda a: a.species)
+
+
 def render_toc(pdf, outline):
     """Render table of contents.
 
     Function to render table of contents - taken from example code of
-    FPDF2 documentation
-
-    53 on first contents, 63 after
+    FPDF2 documentation. Laid out by page_plan.count_toc_pages, keep
+    the two in step.
 
     Args:
         pdf - pdf object
@@ -930,7 +1236,7 @@ def render_toc(pdf, outline):
     pdf.ln(20)
     pdf.set_font("Helvetica", size=24)
     pdf.underline = False
-    pdf.write(5, "Table of contents:")
+    pdf.write(5, page_plan.TOC_TITLE)
     pdf.underline = False
     pdf.ln(20)
     pdf.set_font("Courier", size=12)
@@ -940,9 +1246,9 @@ def render_toc(pdf, outline):
 
             link = pdf.add_link()
             pdf.set_link(link, page=section.page_number)
-            text = f'{" " * section.level * 2}{section.name}'
-            text += f' {"." * (60 - section.level*2 - len(section.name))} '
-            text += f"{section.page_number}"
+            text = page_plan.format_toc_entry(
+                section.name, section.level, section.page_number
+            )
             pdf.multi_cell(
                 w=pdf.epw,
                 h=pdf.font_size,
@@ -0,0 +1,214 @@
+"""# Images.
+
+Pre-scaled image renditions for the report.
+
+The report places its images in fixed slots: the title page background
+and banner, the species photos and silhouettes and their captions. The
+source files are much larger than their slots, and FPDF embeds an image
+at its source resolution. place_image sizes the slot as FPDF does, then
+embeds a rendition of the image scaled to the slot at RENDITION_DPI.
+
+Renditions are never larger than their source. Images with transparency
+or few colours (silhouettes, captions, banners) are saved as PNG, which
+FPDF embeds with flate compression, and photos are saved as JPEG, which
+FPDF embeds without decoding. Renditions are cached on disk under the
+hash of the source content and the rendition size, so each one is made
+once, and in memory by source path, size and modification time, so
+repeated placements do not read the source again. FPDF embeds an image
+once per document and references it from every later placement by its
+path, and images with the same content share a rendition path, so each
+image is embedded once.
+
+Functions:
+    place_image:        Places an image in a slot, using a rendition
+    get_rendition:      Returns the cached rendition of an image
+    get_slot_size:      Returns the size of an image slot in mm
+    make_rendition:     Scales and encodes a rendition
+"""
+import hashlib
+import math
+import os
+import threading
+
+from loguru import logger
+from PIL import Image
+
+from report_generator.project_setup.download_manager import get_cache_dir
+
+# Resolution of the renditions in dots per inch
+RENDITION_DPI = 150
+
+# Bump when the rendition encoding changes
+RENDITION_FORMAT = 1
+
+JPEG_QUALITY = 85
+
+# Images with at most this many colours are saved as PNG
+PNG_MAX_COLOURS = 256
+
+MM_PER_INCH = 25.4
+
+SOURCES = {}
+RENDITIONS = {}
+RENDITIONS_LOCK = threading.Lock()
+
+
+def place_image(
+    pdf: object,
+    path: str,
+    x: float,
+    y: float,
+    w: float = 0,
+    h: float = 0,
+    dpi: int = RENDITION_DPI,
+) -> None:
+    """Place image.
+
+    Args:
+        pdf (FPDF):     Fpdf2 pdf object
+        path (str):     Path to the source image
+        x (float):      Left of the slot in mm
+        y (float):      Top of the slot in mm
+        w (float):      Width of the slot in mm, 0 to keep the aspect ratio
+        h (float):      Height of the slot in mm, 0 to keep the aspect ratio
+        dpi (int):      Resolution of the rendition
+    """
+    try:
+        source = get_source(path)
+    except OSError as e:
+        logger.warning(f"Unable to read image {path}: {e}")
+        pdf.image(path, x=x, y=y, w=w, h=h)
+        return
+    if not (w or h):
+        pdf.image(path, x=x, y=y)
+        return
+    w, h = get_slot_size(source["size"], w, h)
+    pdf.image(get_rendition(path, w, h, dpi), x=x, y=y, w=w, h=h)
+
+
+def get_rendition(
+    path: str, w: float, h: float, dpi: int = RENDITION_DPI, cache_dir: str = None
+) -> str:
+    """Get rendition.
+
+    Args:
+        path (str):         Path to the source image
+        w (float):          Width of the slot in mm
+        h (float):          Height of the slot in mm
+        dpi (int):          Resolution of the rendition
+        cache_dir (str):    Cache directory, defaults to
+                            get_cache_dir("renditions")
+
+    Returns:
+        rendition (str):    Path to the rendition, or to the source image
+                            if it can not be made
+    """
+    source = get_source(path)
+    width, height = source["size"]
+    size = (
+        min(width, math.ceil(w / MM_PER_INCH * dpi)),
+        min(height, math.ceil(h / MM_PER_INCH * dpi)),
+    )
+    key = (source["key"], size)
+    with RENDITIONS_LOCK:
+        rendition = RENDITIONS.get(key)
+    if rendition is not None:
+        return rendition
+
+    cache_dir = cache_dir or get_cache_dir("renditions")
+    name = f"{source['sha256']}:{size[0]}x{size[1]}:{RENDITION_FORMAT}"
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+    rendition = next(
+        (
+            os.path.join(cache_dir, f"{digest}{extension}")
+            for extension in [".jpg", ".png"]
+            if os.path.isfile(os.path.join(cache_dir, f"{digest}{extension}"))
+        ),
+        None,
+    )
+    if rendition is None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            rendition = make_rendition(path, size, os.path.join(cache_dir, digest))
+        except OSError as e:
+            logger.warning(f"Unable to make rendition of {path}: {e}")
+            return path
+    with RENDITIONS_LOCK:
+        RENDITIONS[key] = rendition
+    return rendition
+
+
+def get_slot_size(size: tuple, w: float, h: float) -> tuple:
+    """Get the width and height of a slot, as FPDF sizes it.
+
+    Args:
+        size (tuple):   Width and height of the source image in pixels
+        w (float):      Width of the slot in mm, 0 to keep the aspect ratio
+        h (float):      Height of the slot in mm, 0 to keep the aspect ratio
+
+    Returns:
+        size (tuple):   Width and height of the slot in mm
+    """
+    width, height = size
+    if not w:
+        w = h * width / height
+    if not h:
+        h = w * height / width
+    return w, h
+
+
+def make_rendition(path: str, size: tuple, base_path: str) -> str:
+    """Make rendition.
+
+    Args:
+        path (str):         Path to the source image
+        size (tuple):       Width and height of the rendition in pixels
+        base_path (str):    Path of the rendition without its extension
+
+    Returns:
+        rendition (str):    Path to the rendition
+    """
+    with Image.open(path) as source:
+        image = source.copy()
+    if image.mode not in ["L", "LA", "RGB", "RGBA"]:
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode in ["LA", "RGBA"] and image.getextrema()[-1][0] == 255:
+        # Fully opaque, the alpha channel would only add a soft mask
+        image = image.convert(image.mode[:-1])
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+
+    if image.mode in ["LA", "RGBA"] or image.getcolors(PNG_MAX_COLOURS):
+        extension, image_format, options = ".png", "PNG", {"optimize": True}
+    else:
+        extension, image_format = ".jpg", "JPEG"
+        options = {"quality": JPEG_QUALITY, "optimize": True}
+
+    rendition = f"{base_path}{extension}"
+    temp_path = f"{base_path}.{os.getpid()}.tmp"
+    image.save(temp_path, format=image_format, **options)
+    os.replace(temp_path, rendition)
+    logger.debug(f"Made {image.size[0]}x{image.size[1]} rendition of {path}")
+    return rendition
+
+
+def get_source(path: str) -> dict:
+    """Get the size and content hash of a source image, cached by path.
+
+    Raises:
+        OSError:    If the image can not be read
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with RENDITIONS_LOCK:
+        source = SOURCES.get(key)
+    if source is not None:
+        return source
+    with open(path, "rb") as f:
+        sha256 = hashlib.sha256(f.read()).hexdigest()
+    with Image.open(path) as image:
+        size = image.size
+    source = {"key": key, "sha256": sha256, "size": size}
+    with RENDITIONS_LOCK:
+        SOURCES[key] = source
+    return source
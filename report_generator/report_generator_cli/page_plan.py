@@ -0,0 +1,495 @@
+"""# Page Plan.
+
+Page numbers of a report, planned before its pages are drawn.
+
+FPDF renders the table of contents at the end of the document, on the
+pages reserved for it by insert_toc_placeholder, and fails if it does
+not span exactly that many pages. plan_report lays the report out
+without drawing it: a PageCursor follows the page and y position of
+each heading, species block and contents entry as FPDF moves them,
+breaking the page where FPDF's automatic page break would. Text is
+measured with the fonts of the report, so headings, region cells and
+contents entries that wrap take as many lines as they will when drawn.
+
+The contents entries show the page number of each section, and an
+entry wrapping onto a second line depends on the length of its number,
+so the contents size and the page numbers are planned together until
+they agree. Without the species rows, as when the report is streamed
+from the database, the body can not be planned. The contents are then
+sized from the headings alone, which is exact unless an entry only
+wraps for some page numbers (see needs_body_plan).
+
+Classes:
+    PageCursor:         Page and y position of a pdf being laid out
+    TextMeasure:        Measures text in the fonts of a report
+    PagePlan:           Planned pages of a report
+
+Functions:
+    plan_report:        Plans the contents and page numbers of a report
+    plan_body:          Plans the order, family and genus sections
+    plan_species_pages: Plans the compact species blocks of a genus
+    count_toc_pages:    Counts the pages of the table of contents
+    needs_body_plan:    Checks if the contents size needs the page numbers
+    format_toc_entry:   Formats a table of contents entry
+    iter_headings:      Iterates the heading nodes of a tree
+"""
+from typing import Callable
+
+from fpdf import FPDF
+from loguru import logger
+
+import report_generator.fonts as fonts
+from report_generator.report_generator_cli.taxonomy_tree import (
+    HEADING_LEVELS,
+    TaxonomyTree,
+)
+
+# Title and font of the table of contents, see create_report.render_toc
+TOC_TITLE = "Table of contents:"
+TOC_TITLE_FONT = ("Helvetica", "", 24)
+TOC_FONT = ("Courier", "", 12)
+
+# Width of an entry name padded with dots
+TOC_ENTRY_WIDTH = 60
+
+# Longest page number considered when the pages are not planned
+MAX_PAGE_DIGITS = 6
+
+# Species blocks on a compact page
+BLOCKS_PER_PAGE = 3
+
+# Amphibian fields left out of the compact table
+COMPACT_HIDDEN_FIELDS = [
+    "position",
+    "image_url_male",
+    "image_url_female",
+    "order",
+    "family",
+    "genus",
+    "species",
+]
+
+# Compact table cells in mm, see create_report.create_report_page_table_compact
+COMPACT_LABEL_WIDTH = 35
+COMPACT_VALUE_WIDTH = 95
+COMPACT_ROW_HEIGHT = 4.5
+REGION_LINE_HEIGHT = 3.5
+REGION_MIN_HEIGHT = 16
+
+
+class PageCursor:
+    """PageCursor.
+
+    Page and y position of a pdf being laid out, moved as FPDF moves
+    them when drawing, without drawing anything.
+
+    Args:
+        pdf (FPDF):     Pdf with the page size and margins of the report
+        page (int):     Current page
+        y (float):      Current y position, defaults to the top margin
+    """
+
+    def __init__(self, pdf: FPDF, page: int = 0, y: float = None) -> None:
+        """Init method for PageCursor."""
+        self.top = pdf.t_margin
+        self.trigger = pdf.page_break_trigger
+        self.page = page
+        self.y = self.top if y is None else y
+
+    def add_page(self) -> None:
+        """Start a new page."""
+        self.page += 1
+        self.y = self.top
+
+    def ln(self, h: float) -> None:
+        """Move down, as FPDF.ln does."""
+        self.y += h
+
+    def cell(self, h: float) -> bool:
+        """Break the page if a cell of height h does not fit, as FPDF does."""
+        if self.y + h > self.trigger:
+            self.add_page()
+            return True
+        return False
+
+    def write(self, h: float, lines: int) -> None:
+        """Move as FPDF.write does for text of the given lines."""
+        for line in range(lines):
+            if line:
+                self.ln(h)
+            self.cell(h)
+
+    def multi_cell(self, h: float, lines: int, top: bool = False) -> None:
+        """Move as FPDF.multi_cell does for text of the given lines.
+
+        Args:
+            h (float):      Line height
+            lines (int):    Lines of the text
+            top (bool):     True for new_y="TOP", False for "NEXT"
+        """
+        start = self.y
+        for line in range(lines):
+            last = line == lines - 1
+            if self.cell(h) and last:
+                # FPDF keeps the top of the last line after a page break
+                start = self.y
+            if top and last:
+                break
+            self.ln(h)
+        if top:
+            self.y = start
+
+
+class TextMeasure:
+    """TextMeasure.
+
+    Measures text in the fonts of a report without drawing it. The
+    width of each character is measured once per font.
+
+    Args:
+        font_options (dict):    Selected fonts and settings, the custom
+                                fonts of which are registered
+        config (dict):          Config dict, loaded for the fonts if not given
+    """
+
+    def __init__(self, font_options: dict = None, config: dict = None) -> None:
+        """Init method for TextMeasure."""
+        self.pdf = FPDF()
+        self.pdf.add_page()
+        if font_options:
+            fonts.add_font_choices_to_pdf(self.pdf, font_options, config)
+        self.widths = {}
+
+    @property
+    def font_size(self) -> float:
+        """Get the size of the current font in mm."""
+        return self.pdf.font_size
+
+    def set_font(self, family: str, style: str = "", size: float = 0) -> None:
+        """Set the current font, see FPDF.set_font."""
+        self.pdf.set_font(family, style, size)
+
+    def count_lines(self, text: str, w: float) -> int:
+        """Count lines.
+
+        Counts the lines of text wrapped to a width in the current font,
+        as FPDF.multi_cell breaks plain text: after the last space that
+        fits, or within a word that does not fit a line.
+
+        Args:
+            text (str):     Text to wrap
+            w (float):      Width of the cell
+
+        Returns:
+            lines (int):    Lines of the wrapped text, at least 1
+        """
+        pdf = self.pdf
+        text = pdf.normalize_text(text)
+        widths = self.widths.setdefault(pdf.font_family + pdf.font_style, {})
+        for character in set(text).difference(widths):
+            widths[character] = pdf.get_normalized_string_width_with_style(
+                character, pdf.font_style
+            )
+        maximum = (w - 2 * pdf.c_margin) * 1000 / pdf.font_size
+        if "\n" not in text and sum(map(widths.__getitem__, text)) <= maximum:
+            return 1
+        lines = 0
+        position = 0
+        while position < len(text):
+            start = position
+            width = 0
+            space = None
+            while position < len(text):
+                character = text[position]
+                if character == "\n":
+                    position += 1
+                    break
+                if width + widths[character] > maximum:
+                    if character == " ":
+                        position += 1
+                    elif space is not None:
+                        position = space + 1
+                    elif position == start:
+                        position += 1
+                    break
+                if character == " ":
+                    space = position
+                width += widths[character]
+                position += 1
+            lines += 1
+        return max(lines, 1)
+
+
+class PagePlan:
+    """PagePlan.
+
+    Planned pages of a report.
+
+    Args:
+        toc_pages (int):    Pages of the table of contents
+        sections (list):    (name, level, page) of each contents entry, in
+                            outline order. Pages of the body sections are
+                            None if the body was not planned.
+        pages (int):        Pages of the report, None if the body was not
+                            planned
+        exact (bool):       False if the contents size depends on page
+                            numbers that were not planned
+    """
+
+    def __init__(
+        self, toc_pages: int, sections: list, pages: int = None, exact: bool = True
+    ) -> None:
+        """Init method for PagePlan."""
+        self.toc_pages = toc_pages
+        self.sections = sections
+        self.pages = pages
+        self.exact = exact
+
+
+def plan_report(
+    pdf: FPDF,
+    tree: TaxonomyTree,
+    font_options: dict = None,
+    amphibians: Callable = None,
+    introduction: bool = False,
+    config: dict = None,
+) -> PagePlan:
+    """Plan report.
+
+    Args:
+        pdf (FPDF):             Report with the contents section started on
+                                the first contents page
+        tree (TaxonomyTree):    Taxonomy tree of the report rows
+        font_options (dict):    Selected fonts and settings
+        amphibians (Callable):  Function returning the AmphibianData of the
+                                rows of a genus, in page order. The body is
+                                planned if given with the font options and
+                                the tree has the species rows.
+        introduction (bool):    True if an introduction section follows the
+                                contents, see create_report.create_chapter_space
+        config (dict):          Config dict, loaded for the fonts if not given
+
+    Returns:
+        plan (PagePlan):        Planned contents size and page numbers
+    """
+    toc_page = pdf.page
+    front = [
+        (section.name, section.level, section.page_number)
+        for section in pdf._outline
+        if section.level < HEADING_LEVELS
+    ]
+    if font_options and amphibians and "Species" in tree.data.columns:
+        measure = TextMeasure(font_options, config)
+        cursor = PageCursor(pdf)
+        body = plan_body(tree, pdf, measure, font_options, amphibians, cursor)
+        body_pages = cursor.page
+    else:
+        measure = TextMeasure()
+        body = [(node.name, node.level, None) for node in iter_headings(tree)]
+        body_pages = None
+
+    # More contents pages move the body back and may lengthen the page
+    # numbers, so the size is planned again until it no longer grows
+    toc_pages = 1
+    while True:
+        offset = toc_page + toc_pages
+        sections = front[:]
+        if introduction:
+            sections.append(("Introduction", 0, offset))
+        sections += [
+            (name, level, None if page is None else page + offset)
+            for name, level, page in body
+        ]
+        needed, exact = count_toc_pages(pdf, measure, sections, pdf.y)
+        if needed <= toc_pages:
+            break
+        toc_pages = needed
+    if not exact:
+        logger.warning("Contents size depends on page numbers that were not planned")
+
+    pages = None if body_pages is None else body_pages + offset
+    logger.debug(f"Planned {toc_pages} contents pages, {pages} pages")
+    return PagePlan(toc_pages, sections, pages, exact)
+
+
+def plan_body(
+    tree: TaxonomyTree,
+    pdf: FPDF,
+    measure: TextMeasure,
+    font_options: dict,
+    amphibians: Callable,
+    cursor: PageCursor,
+) -> list:
+    """Plan body.
+
+    Follows create_report_order_sections and its heading functions.
+
+    Args:
+        tree (TaxonomyTree):    Taxonomy tree of the report rows
+        pdf (FPDF):             Report, for its page width
+        measure (TextMeasure):  Measure of the report fonts
+        font_options (dict):    Selected fonts and settings
+        amphibians (Callable):  See plan_report
+        cursor (PageCursor):    Cursor on the page before the body
+
+    Returns:
+        sections (list):        (name, level, page) of each heading
+    """
+    header_font = font_options["header_font"]
+    header_size = font_options["header_size"]
+    sections = []
+    for order in tree.roots:
+        cursor.add_page()
+        sections.append((order.name, 0, cursor.page))
+        measure.set_font(header_font, "b", header_size)
+        cursor.ln(20)
+        cursor.write(30, measure.count_lines(f"Order {order.name}", pdf.epw))
+        cursor.ln(20)
+        for family in order.children:
+            sections.append((family.name, 1, cursor.page))
+            measure.set_font(header_font, "b", (header_size / 4) * 3)
+            cursor.ln(20)
+            cursor.write(10, measure.count_lines(f"Family {family.name}", pdf.epw))
+            cursor.add_page()
+            for genus in family.children:
+                measure.set_font(header_font, "bi", (header_size / 4) * 3)
+                cursor.write(10, measure.count_lines(f"Genus {genus.name}", pdf.epw))
+                sections.append((genus.name, 2, cursor.page))
+                cursor.ln(10)
+                plan_species_pages(
+                    amphibians(genus.rows()), pdf, measure, font_options, cursor
+                )
+    return sections
+
+
+def plan_species_pages(
+    amp_list: list,
+    pdf: FPDF,
+    measure: TextMeasure,
+    font_options: dict,
+    cursor: PageCursor,
+) -> None:
+    """Plan species pages.
+
+    Follows create_report_section_pages and create_report_page_compact.
+    Each page holds up to BLOCKS_PER_PAGE species blocks, and a block
+    whose table runs past the bottom margin continues on the next page.
+
+    Args:
+        amp_list (list):        AmphibianData of a genus, in page order
+        pdf (FPDF):             Report, for its page width
+        measure (TextMeasure):  Measure of the report fonts
+        font_options (dict):    Selected fonts and settings
+        cursor (PageCursor):    Cursor after the genus heading
+    """
+    header_font = font_options["header_font"]
+    header_size = font_options["header_size"]
+    paragraph_font = font_options["paragraph_font"]
+    paragraph_size = font_options["paragraph_size"]
+    measure.set_font(paragraph_font, "b", paragraph_size - 2)
+    label_lines = measure.count_lines("Geographic Region", COMPACT_LABEL_WIDTH)
+    for position, amp in enumerate(amp_list):
+        measure.set_font(header_font, "ib", (header_size / 4) + 4)
+        cursor.ln(5)
+        cursor.write(10, measure.count_lines(amp.get_short_name(), pdf.epw))
+        cursor.ln(10)
+        for key, value in amp.__dict__.items():
+            if key in COMPACT_HIDDEN_FIELDS:
+                continue
+            if key != "geographic_region":
+                cursor.cell(COMPACT_ROW_HEIGHT)
+                cursor.ln(COMPACT_ROW_HEIGHT)
+                continue
+            height = max(REGION_MIN_HEIGHT, 4 + (len(value) / 60) * 3)
+            size = (
+                paragraph_size - 2
+                if height <= REGION_MIN_HEIGHT
+                else paragraph_size - 3
+            )
+            cursor.multi_cell(REGION_LINE_HEIGHT, label_lines, top=True)
+            measure.set_font(paragraph_font, "", size)
+            lines = measure.count_lines(value, COMPACT_VALUE_WIDTH)
+            cursor.multi_cell(REGION_LINE_HEIGHT, lines, top=True)
+            cursor.ln(height)
+        page_full = position % BLOCKS_PER_PAGE == BLOCKS_PER_PAGE - 1
+        if page_full or position + 1 == len(amp_list):
+            cursor.add_page()
+
+
+def count_toc_pages(pdf: FPDF, measure: TextMeasure, sections: list, y: float) -> tuple:
+    """Count toc pages.
+
+    Follows create_report.render_toc.
+
+    Args:
+        pdf (FPDF):             Report, for its page size and margins
+        measure (TextMeasure):  Measure of the contents fonts
+        sections (list):        (name, level, page) of each contents entry
+        y (float):              Y position the contents start at
+
+    Returns:
+        pages (tuple):          Pages of the contents, and False if they
+                                depend on page numbers that are None
+    """
+    cursor = PageCursor(pdf, y=y)
+    cursor.ln(20)
+    measure.set_font(*TOC_TITLE_FONT)
+    cursor.write(5, measure.count_lines(TOC_TITLE, pdf.epw))
+    cursor.ln(20)
+    measure.set_font(*TOC_FONT)
+    exact = True
+    for name, level, page in sections:
+        if page is None:
+            counts = {
+                measure.count_lines(
+                    format_toc_entry(name, level, 10**digits), pdf.epw
+                )
+                for digits in range(MAX_PAGE_DIGITS)
+            }
+            exact = exact and len(counts) == 1
+            lines = max(counts)
+        else:
+            lines = measure.count_lines(format_toc_entry(name, level, page), pdf.epw)
+        cursor.multi_cell(measure.font_size, lines)
+    return cursor.page + 1, exact
+
+
+def needs_body_plan(tree: TaxonomyTree) -> bool:
+    """Needs body plan.
+
+    Checks if the contents of a tree have an entry that only wraps for
+    some page numbers, so the contents can not be sized without planning
+    the body pages.
+
+    Args:
+        tree (TaxonomyTree):    Taxonomy tree of the report rows
+
+    Returns:
+        bool                    True if the body has to be planned
+    """
+    pdf = FPDF()
+    measure = TextMeasure()
+    measure.set_font(*TOC_FONT)
+    for node in iter_headings(tree):
+        counts = {
+            measure.count_lines(
+                format_toc_entry(node.name, node.level, 10**digits), pdf.epw
+            )
+            for digits in range(MAX_PAGE_DIGITS)
+        }
+        if len(counts) > 1:
+            return True
+    return False
+
+
+def format_toc_entry(name: str, level: int, page: int) -> str:
+    """Format a table of contents entry, its name padded with dots."""
+    text = f'{" " * level * 2}{name}'
+    text += f' {"." * (TOC_ENTRY_WIDTH - level * 2 - len(name))} '
+    text += f"{page}"
+    return text
+
+
+def iter_headings(tree: TaxonomyTree):
+    """Iterate the order, family and genus nodes of a tree, in report order."""
+    return (node for node in tree.walk() if node.level < HEADING_LEVELS)
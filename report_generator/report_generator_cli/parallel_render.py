@@ -0,0 +1,325 @@
+"""# Parallel Render.
+
+Process-parallel rendering of the report sections.
+
+The species pages of a report are split into shards at Family
+boundaries, which include the Order boundaries, so each shard holds
+about the same number of species. Each shard is rendered to its own PDF
+in a process pool, with the fonts and styles of the report, and returns
+its pages and the outline sections it started.
+
+The title, contents and chapter pages are rendered in the main process.
+The outline sections of the shards are then replayed onto blank body
+pages at their page offsets, so FPDF writes the bookmarks, the table of
+contents, its links and page numbers as it does for a report rendered in
+one process. Finally the blank pages take the contents of the shard
+pages with PyMuPDF, keeping the page objects the bookmarks and links
+point to.
+
+A shard that starts part way through an order begins with the page the
+previous shard ended with: every genus section ends by adding a page,
+and the heading of the next family is written on it. That blank last
+page of the previous shard is replaced by the first page of the shard.
+
+Classes:
+    Shard:              Rows of consecutive families rendered together
+    ShardResult:        Rendered pages and outline of a shard
+    ShardPDF:           FPDF recording the outline sections it starts
+
+Functions:
+    plan_shards:        Splits a taxonomy tree into shards
+    render_shards:      Renders shards in a process pool
+    write_report:       Writes a report from its front pages and shards
+    add_shard_pages:    Adds blank body pages and the shard outline
+    merge_shard_pages:  Copies the shard pages onto the body pages
+    benchmark:          Times rendering with 1 to N workers
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+import fitz
+import pandas
+from fpdf import FPDF
+from loguru import logger
+
+from report_generator.report_generator_cli.taxonomy_tree import TaxonomyTree
+
+# Page keys copied from the shard pages to the report pages
+PAGE_KEYS = ["Contents", "Resources", "Annots"]
+
+
+class Shard:
+    """Shard.
+
+    Rows of consecutive families rendered together.
+
+    Args:
+        rows (pandas.DataFrame):    Rows of the families, in taxonomic order
+        continues_order (bool):     True if the first family is not the
+                                    first of its order, so the order
+                                    heading was written by an earlier shard
+    """
+
+    def __init__(self, rows: pandas.DataFrame, continues_order: bool) -> None:
+        """Init method for Shard."""
+        self.rows = rows
+        self.continues_order = continues_order
+
+    def __len__(self) -> int:
+        """Get the number of species of the shard."""
+        return len(self.rows.index)
+
+
+class ShardResult:
+    """ShardResult.
+
+    Rendered pages and outline of a shard.
+
+    Args:
+        pdf (bytes):                PDF document of the shard
+        pages (int):                Number of pages
+        outline (list):             (name, level, page, y) tuples of the
+                                    outline sections, pages counted from 1
+        continues_order (bool):     See Shard
+    """
+
+    def __init__(
+        self, pdf: bytes, pages: int, outline: list, continues_order: bool
+    ) -> None:
+        """Init method for ShardResult."""
+        self.pdf = pdf
+        self.pages = pages
+        self.outline = outline
+        self.continues_order = continues_order
+
+
+class ShardPDF(FPDF):
+    """ShardPDF.
+
+    FPDF recording the outline sections it starts, so the outline of a
+    shard is read without FPDF's private outline.
+
+    Attributes:
+        sections (list):    (name, level, page, y) tuples of the outline
+                            sections, as ShardResult takes them
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Init method for ShardPDF."""
+        super().__init__(*args, **kwargs)
+        self.sections = []
+
+    def start_section(self, name: str, level: int = 0) -> None:
+        """Start a section in the outline and record it."""
+        self.sections.append((name, level, self.page, self.y))
+        super().start_section(name, level)
+
+
+def plan_shards(tree: TaxonomyTree, workers: int) -> list:
+    """Plan shards.
+
+    Families are assigned in order to the shard their first species
+    falls in when the species are divided evenly between the workers.
+    A family is never split, so there may be fewer shards than workers.
+
+    Args:
+        tree (TaxonomyTree):    Taxonomy tree of the report rows
+        workers (int):          Number of worker processes
+
+    Returns:
+        shards (list):          Shards in report order
+    """
+    total = len(tree.data.index)
+    groups = []
+    before = 0
+    for order in tree.roots:
+        for position, family in enumerate(order.children):
+            shard = min(workers - 1, before * workers // total)
+            if not groups or groups[-1][0] != shard:
+                groups.append([shard, family.start, family.stop, position > 0])
+            groups[-1][2] = family.stop
+            before += len(family)
+    return [
+        Shard(tree.data.iloc[start:stop], continues_order)
+        for _, start, stop, continues_order in groups
+    ]
+
+
+def render_shards(
+    shards: list, render: Callable, args: tuple = (), workers: int = 1
+) -> list:
+    """Render shards.
+
+    Args:
+        shards (list):      Shards from plan_shards
+        render (Callable):  Module level function taking a shard and args
+                            and returning its ShardResult
+        args (tuple):       Further arguments of render
+        workers (int):      Number of worker processes, shards are
+                            rendered in this process if 1
+
+    Returns:
+        results (list):     ShardResult of each shard, in report order
+    """
+    if workers <= 1 or len(shards) <= 1:
+        return [render(shard, *args) for shard in shards]
+    workers = min(workers, len(shards))
+    logger.info(f"Rendering {len(shards)} shards in {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render, shard, *args) for shard in shards]
+        return [future.result() for future in futures]
+
+
+def write_report(pdf: object, results: list, pdf_path: str) -> None:
+    """Write report.
+
+    Args:
+        pdf (FPDF):         Report with the front pages rendered
+        results (list):     ShardResult of each shard, in report order
+        pdf_path (str):     Path of the report
+    """
+    offsets = add_shard_pages(pdf, results)
+    pdf.output(pdf_path)
+    merge_shard_pages(pdf_path, results, offsets)
+
+
+def add_shard_pages(pdf: object, results: list) -> list:
+    """Add shard pages.
+
+    Adds a blank page for each page of the shards and starts their
+    outline sections on it.
+
+    Args:
+        pdf (FPDF):         Report with the front pages rendered
+        results (list):     ShardResult of each shard, in report order
+
+    Returns:
+        offsets (list):     Pages of the report before the first page of
+                            each shard
+    """
+    offsets = []
+    offset = pdf.page
+    for result in results:
+        if result.continues_order and offsets:
+            offset -= 1
+        offsets.append(offset)
+        for name, level, page, y in result.outline:
+            while pdf.page < offset + page:
+                pdf.add_page()
+            pdf.set_y(y)
+            pdf.start_section(name=name, level=level)
+        offset += result.pages
+    while pdf.page < offset:
+        pdf.add_page()
+    return offsets
+
+
+def merge_shard_pages(pdf_path: str, results: list, offsets: list) -> None:
+    """Merge shard pages.
+
+    The shard pages are appended to the report, then each blank body
+    page takes the contents, resources and links of its shard page and
+    the appended pages are removed. The body pages keep their page
+    objects, so the outline and the contents links pointing to them are
+    left as FPDF wrote them.
+
+    Args:
+        pdf_path (str):     Path of the report written with add_shard_pages
+        results (list):     ShardResult of each shard, in report order
+        offsets (list):     Offsets from add_shard_pages
+    """
+    if not results:
+        return
+    doc = fitz.open(pdf_path)
+    first_page = offsets[0]
+    body_pages = len(doc) - first_page
+    for position, result in enumerate(results):
+        last_page = result.pages - 1
+        if position + 1 < len(results) and results[position + 1].continues_order:
+            # Replaced by the first page of the next shard
+            last_page -= 1
+        with fitz.open(stream=result.pdf, filetype="pdf") as source:
+            doc.insert_pdf(source, to_page=last_page)
+
+    for number in range(first_page, first_page + body_pages):
+        target = doc.page_xref(number)
+        source = doc.page_xref(number + body_pages)
+        for key in PAGE_KEYS:
+            kind, value = doc.xref_get_key(source, key)
+            if kind != "null":
+                doc.xref_set_key(target, key, value)
+        for annot in re.findall(r"(\d+) 0 R", doc.xref_get_key(source, "Annots")[1]):
+            doc.xref_set_key(int(annot), "P", f"{target} 0 R")
+    doc.delete_pages(from_page=first_page + body_pages, to_page=len(doc) - 1)
+
+    temp_path = f"{pdf_path}.{os.getpid()}.tmp"
+    doc.save(temp_path, garbage=4, deflate=True)
+    doc.close()
+    os.replace(temp_path, pdf_path)
+
+
+def benchmark(
+    tree: TaxonomyTree,
+    render: Callable,
+    args: tuple,
+    front: Callable,
+    max_workers: int,
+) -> dict:
+    """Benchmark.
+
+    Renders and writes the report with 1 to max_workers workers.
+
+    Args:
+        tree (TaxonomyTree):    Taxonomy tree of the report rows
+        render (Callable):      Shard render function, see render_shards
+        args (tuple):           Further arguments of render
+        front (Callable):       Function returning a new FPDF with the
+                                front pages rendered
+        max_workers (int):      Largest number of workers
+
+    Returns:
+        timings (dict):         Seconds taken by each number of workers
+    """
+    timings = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for workers in range(1, max_workers + 1):
+            start = time.perf_counter()
+            results = render_shards(plan_shards(tree, workers), render, args, workers)
+            write_report(front(), results, os.path.join(temp_dir, f"{workers}.pdf"))
+            timings[workers] = time.perf_counter() - start
+            logger.info(
+                f"{workers} workers: {timings[workers]:.2f}s, "
+                f"speedup {timings[1] / timings[workers]:.2f}"
+            )
+    return timings
+
+
+if __name__ == "__main__":
+    # Benchmark rendering the whole species database with 1 to N workers
+    from fpdf import FPDF
+
+    import report_generator.report_generator_cli.create_report as create_report
+    from report_generator.config import load_config
+
+    config = load_config()
+    font_options = config["fonts"]
+    tree = TaxonomyTree(create_report.read_data_source(config["data_set"], {}))
+
+    def front():
+        """Render the contents pages of the benchmark report."""
+        return create_report.create_contents_page(
+            FPDF(), tree, font_options, config=config
+        )
+
+    benchmark(
+        tree,
+        create_report.render_shard,
+        (config, font_options),
+        front,
+        int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count(),
+    )
@@ -0,0 +1,131 @@
+"""# Taxonomy Tree.
+
+Order, Family, Genus and Species index of the report rows.
+
+The rows are sorted once by Order, Family, Genus and Species and grouped
+into a tree of row ranges over the sorted frame. Each node holds the
+start and stop row of its taxon, so the report renderer walks the tree
+and takes each genus section as a slice, instead of filtering the frame
+again at every level. Rows without an order, family or genus are left
+out, as they have no section in the report.
+
+Classes:
+    TaxonNode:      Taxon with the row range of its species
+    TaxonomyTree:   Tree of the taxa of a report
+"""
+from typing import Iterator
+
+import numpy
+import pandas
+
+# Taxon columns, from the top of the tree down
+TAXON_COLUMNS = ["Order", "Family", "Genus", "Species"]
+
+# Levels with a heading and a contents entry in the report
+HEADING_LEVELS = 3
+
+
+class TaxonNode:
+    """TaxonNode.
+
+    Taxon with the row range of its species.
+
+    Args:
+        name (str):                 Taxon name
+        level (int):                Index of the taxon column
+        start (int):                First row in the sorted frame
+        stop (int):                 Row after the last row
+        data (pandas.DataFrame):    Sorted frame of the tree
+    """
+
+    def __init__(
+        self, name: str, level: int, start: int, stop: int, data: pandas.DataFrame
+    ) -> None:
+        """Init method for TaxonNode."""
+        self.name = name
+        self.level = level
+        self.start = start
+        self.stop = stop
+        self.data = data
+        self.children = []
+
+    def __len__(self) -> int:
+        """Get the number of rows of the taxon."""
+        return self.stop - self.start
+
+    def rows(self) -> pandas.DataFrame:
+        """Get the rows of the taxon, a slice of the sorted frame."""
+        start, stop = self.start, self.stop
+        return self.data.iloc[start:stop]
+
+
+class TaxonomyTree:
+    """TaxonomyTree.
+
+    Tree of the taxa of a report.
+
+    Args:
+        data_frame (pandas.DataFrame):  Report rows with the taxon columns.
+                                        Species is optional, for example
+                                        for the distinct taxa of read_taxa.
+    """
+
+    def __init__(self, data_frame: pandas.DataFrame) -> None:
+        """Init method for TaxonomyTree, sorts and groups the rows."""
+        columns = [column for column in TAXON_COLUMNS if column in data_frame.columns]
+        data = data_frame.dropna(subset=columns[:HEADING_LEVELS])
+        data = data.sort_values(columns, na_position="last")
+        self.data = data
+        self.levels = []
+
+        size = len(data.index)
+        changed = numpy.zeros(size, dtype=bool)
+        changed[:1] = True
+        for level, column in enumerate(columns):
+            codes = pandas.factorize(data[column])[0]
+            changed[1:] |= codes[1:] != codes[:-1]
+            starts = numpy.flatnonzero(changed)
+            stops = numpy.append(starts[1:], size)
+            values = data[column].to_numpy()
+            nodes = [
+                TaxonNode(values[start], level, int(start), int(stop), data)
+                for start, stop in zip(starts, stops)
+            ]
+            if level > 0:
+                parents = self.levels[-1]
+                parent_starts = [parent.start for parent in parents]
+                for node, parent in zip(
+                    nodes,
+                    numpy.searchsorted(parent_starts, starts, side="right") - 1,
+                ):
+                    parents[parent].children.append(node)
+            self.levels.append(nodes)
+
+    @property
+    def roots(self) -> list:
+        """Get the order nodes."""
+        return self.levels[0] if self.levels else []
+
+    def walk(self) -> Iterator[TaxonNode]:
+        """Walk the tree depth first, in report order."""
+        stack = list(reversed(self.roots))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def sections(self) -> Iterator[tuple]:
+        """Iterate genus sections.
+
+        Yields:
+            section - ((order, family, genus), dataframe) tuple, as
+                      yielded by create_report.iter_genus_sections
+        """
+        for order in self.roots:
+            for family in order.children:
+                for genus in family.children:
+                    yield (order.name, family.name, genus.name), genus.rows()
+
+    def count_headings(self) -> int:
+        """Count the order, family and genus headings of the report."""
+        return sum(len(nodes) for nodes in self.levels[:HEADING_LEVELS])
@@ -8,12 +8,15 @@
 # run again.  Do not edit this file unless you know what you are doing.
 
 import os
+import sqlite3
 import sys
 
+from loguru import logger
 from PyQt5 import QtCore, QtWidgets
 
 from report_generator.config import dump_config, load_config
 from report_generator.fonts import font_dict_loader
+from report_generator.read_from_db.facets import count_matches
 from report_generator.report_generator_cli.create_report import create_report
 from report_generator.report_generator_gui.ui.report_setup import Ui_Dialog
 
@@ -478,7 +481,7 @@ class Ui_MainWindow(object):
         self.LongevityMax.setObjectName("LongevityMax")
         self.horizontalLayout_8.addWidget(self.LongevityMax)
         self.formLayoutWidget_11 = QtWidgets.QWidget(self.tab_2)
-        self.formLayoutWidget_11.setGeometry(QtCore.QRect(0, 380, 541, 170))
+        self.formLayoutWidget_11.setGeometry(QtCore.QRect(0, 380, 541, 200))
         self.formLayoutWidget_11.setObjectName("formLayoutWidget_11")
         self.formLayout_3 = QtWidgets.QFormLayout(self.formLayoutWidget_11)
         self.formLayout_3.setContentsMargins(0, 0, 0, 0)
@@ -535,6 +538,14 @@ class Ui_MainWindow(object):
         self.PopTrend = QtWidgets.QLineEdit(self.formLayoutWidget_11)
         self.PopTrend.setObjectName("PopTrend")
         self.formLayout_3.setWidget(5, QtWidgets.QFormLayout.FieldRole, self.PopTrend)
+        self.searchLabel = QtWidgets.QLabel(self.formLayoutWidget_11)
+        self.searchLabel.setObjectName("searchLabel")
+        self.formLayout_3.setWidget(
+            6, QtWidgets.QFormLayout.LabelRole, self.searchLabel
+        )
+        self.search = QtWidgets.QLineEdit(self.formLayoutWidget_11)
+        self.search.setObjectName("search")
+        self.formLayout_3.setWidget(6, QtWidgets.QFormLayout.FieldRole, self.search)
         self.tabWidget.addTab(self.tab_2, "")
         self.tab_3 = QtWidgets.QWidget()
         self.tab_3.setObjectName("tab_3")
@@ -697,6 +708,7 @@ class Ui_MainWindow(object):
         self.pushButton_6.clicked.connect(self.create_report_button)
         self.set_config_values()
         self.load_font_selection_combo()
+        self.connect_filter_count()
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -744,6 +756,10 @@ class Ui_MainWindow(object):
         self.orderLabel_2.setText(_translate("MainWindow", "Nesting Site"))
         self.iUCNLabel.setText(_translate("MainWindow", "IUCN"))
         self.popTrendLabel.setText(_translate("MainWindow", "Pop Trend"))
+        self.searchLabel.setText(_translate("MainWindow", "Search"))
+        self.search.setPlaceholderText(
+            _translate("MainWindow", "Names, nesting sites, habitats or regions")
+        )
         self.tabWidget.setTabText(
             self.tabWidget.indexOf(self.tab_2),
             _translate("MainWindow", "Filter Report Criteria"),
@@ -870,18 +886,9 @@ class Ui_MainWindow(object):
                 self.headingFontColourComboBox.addItem(font_colour)
                 self.paragraphFontColourComboBox.addItem(font_colour)
 
-    def create_report_button(self, MainWindow):
-        """Create report button."""
-        config = load_config()
-        title = self.reportNameLineEdit.text()
-        author = self.reportAuthorLineEdit.text()
-        university = self.universityNameLineEdit.text()
-        school = self.universitySchoolLineEdit.text()
-
-        args = [title, author, university, school]
-        source = os.path.join(config["dir_path"], "data", "database", "species.db")
-        # create_report(source, title, author,university, school)
-        options = {
+    def get_filter_options(self):
+        """Get the query options entered in the filter fields."""
+        return {
             "--Activity": self.Activity.text(),
             "--Clutch": [
                 self.clutchRangeMinLineEdit.text(),
@@ -909,6 +916,7 @@ class Ui_MainWindow(object):
             "--SVLMMx": [self.SVLMMxMinLineEdit.text(), self.SVLMMxMaxLineEdit.text()],
             "--SVLMx": [self.SVLMxMinLineEdit.text(), self.SVLMxMaxLineEdit_2.text()],
             "--Species": self.speciesLineEdit.text(),
+            "--search": self.search.text(),
             "--cli": False,
             "--gui": False,
             "--new": False,
@@ -916,6 +924,52 @@ class Ui_MainWindow(object):
             "--order_taxon_name": self.orderLineEdit.text(),
         }
 
+    def connect_filter_count(self):
+        """Update the match count shortly after a filter field changes."""
+        self.countTimer = QtCore.QTimer(self.mainwin)
+        self.countTimer.setSingleShot(True)
+        self.countTimer.setInterval(150)
+        self.countTimer.timeout.connect(self.update_match_count)
+        for line_edit in self.tab_2.findChildren(QtWidgets.QLineEdit):
+            line_edit.textChanged.connect(lambda _: self.countTimer.start())
+        if load_config() is not None:
+            # Before the first project is set up the count waits for an edit
+            self.update_match_count()
+
+    def update_match_count(self):
+        """Show the number of species matching the filters.
+
+        Nothing is counted until the project and its species database
+        exist.
+        """
+        config = load_config()
+        db_path = None
+        if config is not None:
+            db_path = os.path.join(config["dir_path"], "data", "database", "species.db")
+        if db_path is None or not os.path.isfile(db_path):
+            self.statusbar.clearMessage()
+            return
+        try:
+            count = count_matches(self.get_filter_options())
+        except (OSError, KeyError, ValueError, sqlite3.Error) as e:
+            logger.debug(f"Match count unavailable: {e}")
+            self.statusbar.clearMessage()
+            return
+        self.statusbar.showMessage(f"{count} species match the filters")
+
+    def create_report_button(self, MainWindow):
+        """Create report button."""
+        config = load_config()
+        title = self.reportNameLineEdit.text()
+        author = self.reportAuthorLineEdit.text()
+        university = self.universityNameLineEdit.text()
+        school = self.universitySchoolLineEdit.text()
+
+        args = [title, author, university, school]
+        source = os.path.join(config["dir_path"], "data", "database", "species.db")
+        # create_report(source, title, author,university, school)
+        options = self.get_filter_options()
+
         font_options = {
             "title_font": self.titleFontComboBox.currentText(),
             "title_size": self.titleFontSizeSpinBox.value(),
@@ -0,0 +1,156 @@
+import os
+import sqlite3
+
+import pytest
+
+import report_generator.excel_extraction.tables as tables
+
+ORDERS = ["Anura", "Caudata"]
+FAMILIES = [("Bufonidae", 1), ("Hylidae", 1), ("Salamandridae", 2)]
+GENERA = [("Atelopus", 1), ("Bufo", 1), ("Hyla", 2), ("Salamandra", 3)]
+IUCN = ["LC", "EN", "CR"]
+POP_TREND = ["Stable", "Decreasing"]
+PARITY_MODE = ["Oviparous", "Viviparous"]
+ACTIVITY = ["Nocturnal", "Diurnal"]
+MICRO_HABITAT = ["Arboreal", "Terrestrial", "Aquatic"]
+NESTING_SITE = ["Water", "Land"]
+CONTINENTS = ["Africa", "Europe", "South America", "Nocontinent"]
+COUNTRIES = [("Ecuador", 3), ("Spain", 2), ("France", 2), ("Nocountry", 4)]
+GEO_LOCATIONS = [
+    ("Noregion", 1),
+    ("Noregion", 2),
+    ("Noregion", 3),
+    ("Andalusia", 2),
+]
+
+# name, svl male, svl female, svl max, longevity, clutch min, clutch max,
+# clutch avg, egg diameter, range size, elev min, elev max, elev avg,
+# parity mode, pop trend, iucn, genus
+SPECIES = [
+    ("varius", 30, 35, 39, 5, 100, 300, 200, 2, 1000, 500, 2000, 1250, 1, 2, 3, 1),
+    ("zeteki", 40, 50, 55, 8, 200, 600, 400, 2.5, 20, 300, 1000, 650, 1, 2, 3, 1),
+    ("bufo", 90, 120, 150, 12, 2000, 8000, 5000, 1.5, 9e6, 0, 2500, 1250, 1, 1, 1, 2),
+    (
+        "spinosus",
+        100,
+        140,
+        180,
+        15,
+        3000,
+        9000,
+        6000,
+        1.7,
+        5e6,
+        0,
+        2000,
+        1000,
+        1,
+        1,
+        1,
+        2,
+    ),
+    ("arborea", 35, 45, 50, 6, 200, 1000, 600, 1.2, 3e6, 0, 1500, 750, 1, 2, 1, 3),
+    ("meridionalis", 40, 50, 60, 7, 300, 1000, 650, 1.3, 2e6, 0, 1200, 600, 1, 1, 1, 3),
+    ("salamandra", 150, 180, 200, 20, 20, 70, 45, 5, 4e6, 100, 2000, 1050, 2, 2, 1, 4),
+    ("algira", 140, 170, 190, 18, 15, 50, 32, 5, 1e5, 200, 2500, 1350, 2, 2, 2, 4),
+]
+ACTIVITY_SPECIES = [(1, 1), (2, 2), (3, 1), (4, 1), (5, 1), (6, 1), (7, 1), (8, 1)]
+MICRO_HABITAT_SPECIES = [
+    (1, 2),
+    (1, 3),
+    (2, 2),
+    (3, 2),
+    (4, 2),
+    (5, 1),
+    (6, 1),
+    (7, 2),
+    (8, 2),
+]
+NESTING_SITE_SPECIES = [(1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (6, 1), (7, 2), (8, 2)]
+GEO_LOCATION_SPECIES = [
+    (1, 3),
+    (2, 3),
+    (3, 2),
+    (3, 3),
+    (4, 4),
+    (5, 2),
+    (6, 2),
+    (6, 1),
+    (7, 2),
+    (8, 1),
+]
+
+
+def populate_species_db(conn: sqlite3.Connection) -> None:
+    cursor = conn.cursor()
+    for table in tables.get_tables_sql():
+        cursor.execute(table)
+
+    def insert(table, columns, rows):
+        rows = [row if isinstance(row, tuple) else (row,) for row in rows]
+        marks = ", ".join("?" * len(columns))
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({marks})", rows
+        )
+
+    insert("order_taxon", ["order_taxon_name"], ORDERS)
+    insert("family", ["family_name", "order_id"], FAMILIES)
+    insert("genus", ["genus_name", "family_id"], GENERA)
+    insert("iucn", ["iucn_status"], IUCN)
+    insert("pop_trend", ["pop_trend_status"], POP_TREND)
+    insert("parity_mode", ["parity_mode_desc"], PARITY_MODE)
+    insert("activity", ["activity_kind"], ACTIVITY)
+    insert("micro_habitat", ["micro_habitat_name"], MICRO_HABITAT)
+    insert("nesting_site", ["nesting_site_desc"], NESTING_SITE)
+    insert("continent", ["continent_name"], CONTINENTS)
+    insert("country", ["country_name", "continent_id"], COUNTRIES)
+    insert("geo_location", ["region_name", "country_id"], GEO_LOCATIONS)
+    insert(
+        "species",
+        [
+            "species_name_latin",
+            "size_max_male",
+            "size_max_female",
+            "size_max_record",
+            "longevity",
+            "clutch_min",
+            "clutch_max",
+            "clutch_avg",
+            "egg_diameter",
+            "range_size",
+            "elevation_min",
+            "elevation_max",
+            "elevation_avg",
+            "parity_mode_id",
+            "pop_trend_id",
+            "iucn_id",
+            "genus_id",
+        ],
+        SPECIES,
+    )
+    insert("activity_species", ["species_id", "activity_id"], ACTIVITY_SPECIES)
+    insert(
+        "micro_habitat_species",
+        ["species_id", "micro_habitat_id"],
+        MICRO_HABITAT_SPECIES,
+    )
+    insert(
+        "nesting_site_species", ["species_id", "nesting_site_id"], NESTING_SITE_SPECIES
+    )
+    insert(
+        "geo_location_species",
+        ["species_id", "geo_location_id"],
+        GEO_LOCATION_SPECIES,
+    )
+    conn.commit()
+    cursor.close()
+
+
+@pytest.fixture
+def species_db(tmp_path):
+    """Path to a small populated species database."""
+    db_path = os.path.join(tmp_path, "species.db")
+    conn = sqlite3.connect(db_path)
+    populate_species_db(conn)
+    conn.close()
+    return db_path
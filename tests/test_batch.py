@@ -0,0 +1,180 @@
+import fitz
+import pandas
+import pytest
+import yaml
+from PIL import Image
+
+import report_generator.fonts as fonts
+import report_generator.read_from_db.query_db as qd
+import report_generator.read_from_db.result_cache as rc
+import report_generator.report_generator_cli.batch as batch
+import report_generator.report_generator_cli.create_report as cr
+
+IMAGES = [
+    "back.png",
+    "school_banner.png",
+    "f1.jpg",
+    "f2.jpg",
+    "frogsil1.png",
+    "frogsil2.png",
+    "maletext.png",
+    "femaleimage.png",
+]
+
+FONT_OPTIONS = {
+    "title_font": "Helvetica",
+    "title_size": 32,
+    "header_font": "Helvetica",
+    "header_size": 24,
+    "paragraph_font": "Times",
+    "paragraph_size": 12,
+}
+
+MANIFEST = {
+    "defaults": {"author": "Herpetology Group", "fonts": {"header_size": 20}},
+    "reports": [
+        {"name": "Anura", "filters": {"order_taxon_name": "Anura"}},
+        {
+            "name": "Critically Endangered",
+            "title": "Endangered frogs",
+            "filters": {"IUCN": "CR"},
+            "fonts": {"paragraph_font": "Courier"},
+        },
+        {"name": "Nothing", "filters": {"Genus": "Nogenus"}},
+    ],
+}
+
+
+@pytest.fixture
+def config(species_db, tmp_path, monkeypatch):
+    images_path = tmp_path / "data" / "images"
+    images_path.mkdir(parents=True)
+    for name in IMAGES:
+        Image.new("RGB", (4, 4), (0, 128, 0)).save(images_path / name)
+    fonts_path = tmp_path / "data" / "fonts"
+    fonts_path.mkdir()
+    (fonts_path / "fonts.yaml").write_text("custom_font_types: {}\n")
+    config = {
+        "dir_path": str(tmp_path),
+        "fonts": FONT_OPTIONS,
+        "author_name": "Author",
+        "uni_name": "University",
+        "school_name": "School",
+    }
+    monkeypatch.setenv("REPORT_GENERATOR_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(fonts, "load_config", lambda: config)
+    monkeypatch.setattr(cr, "load_config", lambda: config)
+    monkeypatch.setattr(qd, "get_db_path", lambda: species_db)
+    monkeypatch.setattr(qd, "load_config", lambda: {})
+    monkeypatch.setattr(rc, "CACHE", rc.ResultCache(tmp_path / "results"))
+    return config
+
+
+def write_manifest(tmp_path, manifest):
+    path = tmp_path / "batch.yaml"
+    with open(path, "w") as file:
+        yaml.dump(manifest, file)
+    return str(path)
+
+
+def read_report(path):
+    with fitz.open(path) as doc:
+        return [page.get_text() for page in doc], doc.get_toc()
+
+
+def test_load_manifest(config, tmp_path):
+    manifest = {
+        "defaults": {"filters": {"IUCN": "CR"}, "fonts": {"header_size": 20}},
+        "reports": [
+            {"name": "Clutch", "filters": {"--Clutch": [100, 500]}},
+            {"title": "No name"},
+            {"name": "Clutch"},
+            {"name": "Typo", "filter": {"IUCN": "EN"}},
+            {"name": "Bufo", "filters": {"Genus": "Bufo", "IUCN": None}},
+        ],
+    }
+    specs = batch.load_manifest(
+        write_manifest(tmp_path, manifest), config, {"--no-db": True}
+    )
+    assert [spec.name for spec in specs] == ["Clutch", "Bufo"]
+    assert specs[0].options == {
+        "--IUCN": "CR",
+        "--Clutch": ["100", "500"],
+        "--no-db": True,
+    }
+    assert qd.get_query_options(specs[1].options) == {"Genus": "Bufo"}
+    assert specs[0].title == "CLUTCH" and specs[0].author == "AUTHOR"
+    assert specs[0].font_options == {**FONT_OPTIONS, "header_size": 20}
+    assert specs[0].chapters is None
+
+
+def test_read_reports(config, tmp_path):
+    specs = batch.load_manifest(write_manifest(tmp_path, MANIFEST), config)
+    frames = batch.read_reports(specs, config)
+    for spec, frame in zip(specs, frames):
+        expected = cr.read_data_source(None, spec.options)
+        pandas.testing.assert_frame_equal(frame, expected)
+    assert [len(frame.index) for frame in frames] == [6, 2, 0]
+
+
+def test_run_batch(config, tmp_path):
+    manifest_path = write_manifest(tmp_path, MANIFEST)
+    results = batch.run_batch(manifest_path, {"--workers": "1"}, config)
+    assert [result["name"] for result in results] == [
+        "Anura",
+        "Critically Endangered",
+        "Nothing",
+    ]
+    assert [result["species"] for result in results] == [6, 2, 0]
+    assert results[2]["error"] and not results[2]["pages"]
+    for result in results[:2]:
+        assert not result["error"]
+        pages, toc = read_report(result["path"])
+        assert len(pages) == result["pages"]
+        assert result["size_mb"] >= 0
+    assert results[1]["path"].endswith("Critically_Endangered.pdf")
+
+    pages, toc = read_report(results[1]["path"])
+    assert "ENDANGERED FROGS" in pages[0]
+    assert "HERPETOLOGY GROUP" in pages[0]
+    assert [name for _, name, _ in toc if name not in ["Title Page"]][:2] == [
+        "Table Of Contents",
+        "Introduction",
+    ]
+
+    summary = pandas.read_csv(tmp_path / "report" / batch.SUMMARY_FILE)
+    assert list(summary["name"]) == [result["name"] for result in results]
+    assert list(summary["pages"]) == [result["pages"] for result in results]
+
+
+def test_run_batch_matches_create_report(config, tmp_path):
+    manifest = {"reports": [{"name": "Hyla", "filters": {"Genus": "Hyla"}}]}
+    results = batch.run_batch(write_manifest(tmp_path, manifest), {}, config)
+    batched = read_report(results[0]["path"])
+    cr.create_report(
+        None,
+        {"--Genus": "Hyla", "--workers": "1"},
+        "HYLA",
+        "AUTHOR",
+        "UNIVERSITY",
+        "SCHOOL",
+    )
+    assert read_report(tmp_path / "report" / "HYLA.pdf") == batched
+
+
+def test_run_batch_workers(config, tmp_path):
+    manifest_path = write_manifest(tmp_path, MANIFEST)
+    single = batch.run_batch(manifest_path, {"--workers": "1"}, config)
+    reports = [read_report(result["path"]) for result in single[:2]]
+    pooled = batch.run_batch(manifest_path, {"--workers": "3"}, config)
+    assert [result["pages"] for result in pooled] == [
+        result["pages"] for result in single
+    ]
+    assert [read_report(result["path"]) for result in pooled[:2]] == reports
+
+
+def test_batch_workers():
+    assert batch.get_batch_workers({"--workers": "3"}, {"batch_workers": 2}) == 3
+    assert batch.get_batch_workers({"--workers": None}, {"batch_workers": 2}) == 2
+    assert batch.get_batch_workers({}, {"batch_workers": "many"}) == 1
+    assert batch.get_batch_workers({}, {}) >= 1
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pandas
+import pytest
+
+import report_generator.read_from_db.bitmap_index as bi
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.query_db as qd
+import report_generator.read_from_db.species_report as sr
+
+
+@pytest.fixture
+def conn(species_db):
+    conn = sqlite3.connect(species_db)
+    sr.build_species_report(conn)
+    yield conn
+    conn.close()
+
+
+OPTIONS = [
+    {"Genus": "bufo"},
+    {"order_taxon_name": "Caudata"},
+    {"Family": ["Hylidae", "bufonidae"]},
+    {"SVLMx": ["40", "160"]},
+    {"SVLMx": ["", "60"], "IUCN": ["LC", "EN"]},
+    {"Longevity": "12"},
+    {"Clutch": ["600", ""]},
+    {"GeographicRegion": "spain"},
+    {"GeographicRegion": "Europe", "ParityMode": "Vivi"},
+    {"Activity": "Diurnal"},
+    {"MicroHabitat": "Aquatic", "Genus": "Hyla"},
+    {"PopTrend": "Stable", "SVLMx": ["1000", "2000"]},
+]
+
+
+def read(conn, sql, params):
+    return pandas.read_sql_query(sql, conn, params=params)
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+def test_index_matches_sql(conn, species_db, options):
+    expected = read(conn, *qc.compile_query(options, qc.SOURCE_TABLES))
+    index = bi.BitmapIndex(conn)
+    species_ids = index.filter(options)
+    assert species_ids is not None
+    assert len(species_ids) == len(expected.index)
+    result = read(conn, *qd.compile_read_query(conn, species_db, options))
+    pandas.testing.assert_frame_equal(result, expected)
+
+
+def test_unsupported_options(conn):
+    index = bi.BitmapIndex(conn)
+    assert index.filter({"Genus": "B_fo"}) is None
+    assert index.filter({"IUCN": "3"}) is None
+    assert index.filter({"SVLMx": "big"}) is None
+    assert index.filter({}) == list(range(1, 9))
+
+
+def test_text_in_numeric_column(conn):
+    conn.execute("UPDATE species SET longevity = 'ND' WHERE species_id = 1")
+    conn.commit()
+    index = bi.BitmapIndex(conn)
+    for options in [{"Longevity": ["10", ""]}, {"Longevity": ["", "10"]}]:
+        sql, params = qc.compile_query(options, qc.SOURCE_TABLES)
+        expected = [
+            row[0] for row in conn.execute(f"SELECT Species FROM ({sql})", params)
+        ]
+        species_ids = index.filter(options)
+        sql, params = qc.compile_id_query(species_ids)
+        found = [row[0] for row in conn.execute(f"SELECT Species FROM ({sql})", params)]
+        assert found == expected
+
+
+def test_rebuilt_for_new_version(conn, species_db):
+    index = bi.get_bitmap_index(species_db, conn)
+    assert bi.get_bitmap_index(species_db, conn) is index
+    conn.execute("DELETE FROM species WHERE species_id = 1")
+    conn.commit()
+    rebuilt = bi.get_bitmap_index(species_db, conn)
+    assert rebuilt is not index
+    assert 1 not in rebuilt.filter({})
@@ -0,0 +1,93 @@
+import os
+import shutil
+import sqlite3
+import threading
+
+import pytest
+
+import report_generator.read_from_db.connection_pool as cp
+
+
+def test_connection_reused(species_db):
+    pool = cp.ConnectionPool(species_db)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert pool.open_count == 1
+    pool.close()
+
+
+def test_read_only_with_pragmas(species_db):
+    pool = cp.ConnectionPool(species_db)
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -64 * 1024
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM species")
+    pool.close()
+
+
+def test_missing_database(tmp_path):
+    pool = cp.ConnectionPool(tmp_path / "missing.db")
+    with pytest.raises(OSError):
+        pool.acquire()
+    assert not os.path.exists(tmp_path / "missing.db")
+
+
+def test_shared_between_threads(species_db):
+    pool = cp.ConnectionPool(species_db, max_size=2)
+    in_use = []
+    peak = []
+    lock = threading.Lock()
+    counts = []
+
+    def worker():
+        for _ in range(20):
+            with pool.connection() as conn:
+                with lock:
+                    in_use.append(conn)
+                    peak.append(len(in_use))
+                counts.append(
+                    conn.execute("SELECT count(*) FROM species").fetchone()[0]
+                )
+                with lock:
+                    in_use.remove(conn)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counts == [8] * 120
+    assert max(peak) <= 2
+    assert pool.open_count <= 2
+    pool.close()
+
+
+def test_replaced_database_reopened(species_db, tmp_path):
+    pool = cp.ConnectionPool(species_db)
+    with pool.connection() as conn:
+        old = conn
+
+    replacement = tmp_path / "new.db"
+    shutil.copyfile(species_db, replacement)
+    new_conn = sqlite3.connect(replacement)
+    new_conn.execute("DELETE FROM species WHERE species_id > 2")
+    new_conn.commit()
+    new_conn.close()
+    os.replace(replacement, species_db)
+
+    with pool.connection() as conn:
+        assert conn is not old
+        assert conn.execute("SELECT count(*) FROM species").fetchone()[0] == 2
+    pool.close()
+
+
+def test_get_pool_shared(species_db):
+    pool = cp.get_pool(species_db)
+    assert cp.get_pool(species_db) is pool
+    cp.close_all()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    assert cp.get_pool(species_db) is not pool
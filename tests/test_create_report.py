@@ -0,0 +1,106 @@
+import sqlite3
+
+import pandas
+
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.query_db as qd
+import report_generator.report_generator_cli.create_report as cr
+
+FONT_OPTIONS = {"header_font": "Helvetica", "header_size": 24}
+
+
+class RecordingPDF:
+    """Records the calls made on it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args))
+
+
+def read_all(species_db, order):
+    conn = sqlite3.connect(species_db)
+    sql, params = qc.compile_query({}, qc.SOURCE_TABLES, order)
+    chunks = list(qd.stream_query(conn, sql, params, chunk_size=3))
+    conn.close()
+    return chunks
+
+
+def test_stream_query_chunks(species_db):
+    chunks = read_all(species_db, qc.ORDER_SPECIES)
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2]
+    assert list(pandas.concat(chunks).index) == list(range(8))
+    conn = sqlite3.connect(species_db)
+    sql, params = qc.compile_query({}, qc.SOURCE_TABLES)
+    expected = qd.query_db(conn, sql, params)
+    conn.close()
+    pandas.testing.assert_frame_equal(pandas.concat(chunks), expected)
+
+
+def test_taxonomic_order(species_db):
+    data_frame = pandas.concat(read_all(species_db, qc.ORDER_TAXONOMIC))
+    keys = list(zip(data_frame["Order"], data_frame["Genus"], data_frame["Species"]))
+    assert keys == sorted(keys)
+
+
+def test_genus_sections_span_chunks(species_db):
+    chunks = read_all(species_db, qc.ORDER_TAXONOMIC)
+    sections = list(cr.iter_genus_sections(chunks))
+    assert [key for key, _ in sections] == [
+        ("Anura", "Bufonidae", "Atelopus"),
+        ("Anura", "Bufonidae", "Bufo"),
+        ("Anura", "Hylidae", "Hyla"),
+        ("Caudata", "Salamandridae", "Salamandra"),
+    ]
+    assert [len(section) for _, section in sections] == [2, 2, 2, 2]
+
+
+def test_stream_sections_match_order_sections(species_db, monkeypatch):
+    pages = []
+
+    def record_pages(section, pdf, config, font_options):
+        pages.append(sorted(section["Species"]))
+        return pdf
+
+    monkeypatch.setattr(cr, "create_report_section_pages", record_pages)
+    data_frame = pandas.concat(read_all(species_db, qc.ORDER_SPECIES))
+    nested = cr.create_report_order_sections(
+        data_frame, RecordingPDF(), {}, FONT_OPTIONS
+    )
+    nested_pages = pages[:]
+    pages.clear()
+
+    sections = cr.iter_genus_sections(read_all(species_db, qc.ORDER_TAXONOMIC))
+    streamed = cr.create_report_stream_sections(
+        sections, RecordingPDF(), {}, FONT_OPTIONS
+    )
+    assert streamed.calls == nested.calls
+    assert pages == nested_pages
+
+
+def test_amphibian_regions(species_db):
+    chunks = read_all(species_db, qc.ORDER_SPECIES)
+    amphibians = cr.create_amphibian_list(pandas.concat(chunks))
+    assert amphibians[0].geographic_region == "Europe France"
+    assert amphibians[3].geographic_region == "Europe Spain Andalusia"
+
+
+def test_amphibian_legacy_regions():
+    values = ["Unknown"] * 24
+    values[17] = "Europe Spain Andalusia,Europe Spain Andalusia"
+    amphibian = cr.AmphibianData(values)
+    assert amphibian.geographic_region == "Europe Spain Andalusia"
+
+
+def test_chapter_space_uses_report_fonts(monkeypatch):
+    config = {"fonts": {"header_font": "Lato", "header_size": 30}}
+    monkeypatch.setattr(cr, "load_config", lambda: config)
+    pdf = RecordingPDF()
+    cr.create_chapter_space(pdf, None, FONT_OPTIONS)
+    assert ("set_font", ("Helvetica", "", 24)) in pdf.calls
+
+    pdf = RecordingPDF()
+    cr.create_chapter_space(pdf, None)
+    assert ("set_font", ("Lato", "", 30)) in pdf.calls
+    assert cr.create_chapter_space(RecordingPDF(), "").calls == []
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import report_generator.project_setup.download_manager as dm
+
+CONTENT = bytes(range(256)) * 4096
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves CONTENT with range support, optionally dropping a response."""
+
+    def log_message(self, *args):
+        pass
+
+    def send_content_headers(self, start, end):
+        if self.headers.get("Range"):
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if self.server.etag:
+            self.send_header("ETag", self.server.etag)
+        self.end_headers()
+
+    def parse_range(self):
+        header = self.headers.get("Range")
+        if not header:
+            return 0, len(CONTENT) - 1
+        start, end = header.split("=")[1].split("-")
+        return int(start), int(end) if end else len(CONTENT) - 1
+
+    def do_HEAD(self):
+        self.server.requests.append(("HEAD", None))
+        self.send_content_headers(0, len(CONTENT) - 1)
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.headers.get("Range")))
+        start, end = self.parse_range()
+        self.send_content_headers(start, end)
+        body = CONTENT[start : end + 1]
+        if self.server.drop_after:
+            body = body[: self.server.drop_after]
+            self.server.drop_after = None
+            self.wfile.write(body)
+            self.wfile.flush()
+            self.connection.close()
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.requests = []
+    httpd.drop_after = None
+    httpd.etag = '"v1"'
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/data.zip"
+
+
+def gets(server):
+    return [r for method, r in server.requests if method == "GET"]
+
+
+def test_download(server, tmp_path):
+    path = dm.download_file(
+        url(server), tmp_path / "a" / "data.zip", cache_dir=tmp_path / "c"
+    )
+    assert open(path, "rb").read() == CONTENT
+
+
+def test_resume_after_dropped_connection(server, tmp_path):
+    server.drop_after = 100000
+    path = dm.download_file(
+        url(server), tmp_path / "data.zip", cache_dir=tmp_path / "c"
+    )
+    assert open(path, "rb").read() == CONTENT
+    resumed_from = int(gets(server)[-1].split("=")[1].split("-")[0])
+    assert 0 < resumed_from <= 100000
+
+
+def test_parallel_segments(server, tmp_path):
+    path = dm.download_file(
+        url(server), tmp_path / "data.zip", segments=4, cache_dir=tmp_path / "c"
+    )
+    assert open(path, "rb").read() == CONTENT
+    assert len(gets(server)) == 4
+
+
+def test_cache_shared_between_projects(server, tmp_path):
+    cache_dir = tmp_path / "c"
+    dm.download_file(url(server), tmp_path / "one" / "data.zip", cache_dir=cache_dir)
+    dm.download_file(url(server), tmp_path / "two" / "data.zip", cache_dir=cache_dir)
+    assert len(gets(server)) == 1
+    assert os.path.samefile(
+        tmp_path / "one" / "data.zip", tmp_path / "two" / "data.zip"
+    )
+
+
+def test_known_checksum_skips_network(server, tmp_path):
+    cache_dir = tmp_path / "c"
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+    dm.download_file(
+        url(server), tmp_path / "one.zip", sha256=sha256, cache_dir=cache_dir
+    )
+    server.requests.clear()
+    dm.download_file(
+        url(server), tmp_path / "two.zip", sha256=sha256, cache_dir=cache_dir
+    )
+    assert server.requests == []
+
+
+def test_checksum_mismatch(server, tmp_path):
+    with pytest.raises(dm.DownloadError):
+        dm.download_file(
+            url(server),
+            tmp_path / "data.zip",
+            sha256="0" * 64,
+            cache_dir=tmp_path / "c",
+        )
+    assert not os.path.exists(tmp_path / "data.zip")
+    assert os.listdir(tmp_path / "c" / "partial") == []
+
+
+def test_cache_needs_validator(server, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "c"
+    server.etag = None
+    dm.download_file(url(server), tmp_path / "one" / "data.zip", cache_dir=cache_dir)
+    dm.download_file(url(server), tmp_path / "two" / "data.zip", cache_dir=cache_dir)
+    assert len(gets(server)) == 2
+
+    # A failed HEAD request gives no validator either
+    monkeypatch.setattr(dm, "get_remote_headers", lambda url: {})
+    dm.download_file(url(server), tmp_path / "three" / "data.zip", cache_dir=cache_dir)
+    dm.download_file(url(server), tmp_path / "four" / "data.zip", cache_dir=cache_dir)
+    assert len(gets(server)) == 4
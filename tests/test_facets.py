@@ -0,0 +1,60 @@
+import sqlite3
+
+import pandas
+import pytest
+
+import report_generator.read_from_db.facets as fc
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.species_report as sr
+
+
+@pytest.fixture
+def conn(species_db):
+    conn = sqlite3.connect(species_db)
+    sr.build_species_report(conn)
+    yield conn
+    conn.close()
+
+
+def expected_counts(conn, options, facets):
+    sql, params = qc.compile_query(options, qc.SOURCE_TABLES)
+    data_frame = pandas.read_sql_query(sql, conn, params=params)
+    return {
+        "count": len(data_frame.index),
+        "facets": {
+            facet: data_frame[facet].value_counts().to_dict() for facet in facets
+        },
+    }
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"Genus": "Bufo"},
+        {"SVLMx": ["40", "160"], "IUCN": ["LC", "EN"]},
+        {"GeographicRegion": "Spain"},
+        {"Activity": "Nocturnal"},
+    ],
+)
+def test_facet_counts_match_results(conn, options):
+    facets = ["Order", "IUCN", "ParityMode"]
+    counts = fc.query_facet_counts(conn, options, facets)
+    assert counts == expected_counts(conn, options, facets)
+
+
+def test_facets_sorted_by_count(conn):
+    counts = fc.query_facet_counts(conn, {}, ["Family"])["facets"]["Family"]
+    assert list(counts.values()) == sorted(counts.values(), reverse=True)
+
+
+def test_facet_counts_use_indexes(conn):
+    for facet in fc.DEFAULT_FACETS:
+        sql, params = qc.compile_count_query({}, qc.SOURCE_REPORT, facet)
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        assert any("COVERING INDEX" in row[-1] for row in plan), facet
+
+
+def test_unknown_facet(conn):
+    with pytest.raises(ValueError):
+        fc.query_facet_counts(conn, {}, ["species_id"])
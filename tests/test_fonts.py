@@ -0,0 +1,170 @@
+import datetime
+import glob
+import os
+
+import pytest
+import yaml
+from fpdf import FPDF
+
+import report_generator.fonts as fonts
+
+# Font used to compare register_font with FPDF.add_font, if one is found
+FONT_GLOBS = [
+    "/usr/share/fonts/**/*.ttf",
+    "/usr/local/share/fonts/**/*.ttf",
+    "/Library/Fonts/*.ttf",
+    "C:/Windows/Fonts/*.ttf",
+]
+
+
+def make_metrics(name):
+    widths = [500] * 256
+    widths[ord("i")] = 250
+    widths[ord("m")] = 800
+    return {
+        "name": name,
+        "desc": {"Ascent": 900, "Descent": -200, "MissingWidth": 500},
+        "up": -100,
+        "ut": 50,
+        "cw": widths,
+        "originalsize": 1000,
+    }
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPORT_GENERATOR_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(fonts, "FONT_METRICS", {})
+    monkeypatch.setattr(fonts, "FONT_FILES", {})
+    return tmp_path / "cache" / "fonts"
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    calls = []
+
+    def parse_font_metrics(font_file):
+        calls.append(font_file)
+        return make_metrics(os.path.basename(font_file))
+
+    monkeypatch.setattr(fonts, "parse_font_metrics", parse_font_metrics)
+    return calls
+
+
+@pytest.fixture
+def font_dir(tmp_path, monkeypatch):
+    font_path = tmp_path / "data" / "fonts"
+    font_path.mkdir(parents=True)
+    custom_fonts = {
+        "Lato": {"Normal": "Lato-Regular.ttf", "B": "Lato-Bold.ttf"},
+        "Roboto": {"Normal": "Roboto-Regular.ttf"},
+    }
+    for font_types in custom_fonts.values():
+        for file_name in font_types.values():
+            (font_path / file_name).write_bytes(file_name.encode("utf-8"))
+    with open(font_path / "fonts.yaml", "w") as file:
+        yaml.dump({"custom_font_types": custom_fonts}, file)
+    config = {"dir_path": str(tmp_path), "fonts": {"title_font": "Roboto"}}
+    monkeypatch.setattr(fonts, "load_config", lambda: config)
+    return font_path
+
+
+@pytest.fixture
+def font_file():
+    paths = [
+        path for pattern in FONT_GLOBS for path in glob.glob(pattern, recursive=True)
+    ]
+    if not paths:
+        pytest.skip("No TrueType font found")
+    return sorted(paths)[0]
+
+
+def test_font_parsed_once(parsed, font_dir):
+    path = str(font_dir / "Lato-Regular.ttf")
+    first = fonts.get_font_metrics(path)
+    second = fonts.get_font_metrics(path)
+    assert first is second
+    assert parsed == [path]
+
+
+def test_font_metrics_read_from_cache(parsed, font_dir, cache_dir):
+    path = str(font_dir / "Lato-Regular.ttf")
+    metrics = fonts.get_font_metrics(path)
+    assert len(list(cache_dir.iterdir())) == 1
+
+    fonts.FONT_METRICS.clear()
+    assert fonts.get_font_metrics(path) == metrics
+    assert parsed == [path]
+
+
+def test_outdated_font_metrics_parsed(parsed, font_dir, monkeypatch):
+    path = str(font_dir / "Lato-Regular.ttf")
+    fonts.get_font_metrics(path)
+    fonts.FONT_METRICS.clear()
+    monkeypatch.setattr(fonts, "FONT_CACHE_FORMAT", fonts.FONT_CACHE_FORMAT + 1)
+    fonts.get_font_metrics(path)
+    assert parsed == [path, path]
+
+
+def test_pack_widths():
+    widths = make_metrics("Lato")["cw"]
+    packed = fonts.pack_widths(widths)
+    assert packed["default"] == 500
+    assert len(packed["widths"]) == 2
+    assert fonts.unpack_widths(packed) == widths
+    assert fonts.unpack_widths(fonts.pack_widths([])) == []
+
+
+def test_only_selected_fonts_registered(parsed, font_dir):
+    pdf = FPDF()
+    fonts.add_font_choices_to_pdf(pdf, {"title_font": "Lato", "para_font": "Arial"})
+    assert sorted(pdf.fonts) == ["lato", "latoB"]
+    assert sorted(os.path.basename(path) for path in parsed) == [
+        "Lato-Bold.ttf",
+        "Lato-Regular.ttf",
+    ]
+
+    pdf = FPDF()
+    fonts.add_font_choices_to_pdf(pdf, None)
+    assert list(pdf.fonts) == ["roboto"]
+
+
+def test_given_config_not_reloaded(parsed, font_dir, monkeypatch):
+    config = fonts.load_config()
+    monkeypatch.setattr(fonts, "load_config", lambda: pytest.fail("config reloaded"))
+    pdf = FPDF()
+    fonts.add_font_choices_to_pdf(pdf, None, config)
+    assert list(pdf.fonts) == ["roboto"]
+
+
+def test_fonts_registered_once_per_process(parsed, font_dir):
+    for _ in range(3):
+        pdf = FPDF()
+        fonts.add_font_choices_to_pdf(pdf, {"title_font": "Lato"})
+        fonts.add_font_choices_to_pdf(pdf, {"title_font": "Lato"})
+        assert [font["i"] for font in pdf.fonts.values()] == [1, 2]
+    assert len(parsed) == 2
+
+
+def test_register_font_matches_add_font(font_file):
+    def write(pdf):
+        pdf.set_creation_date(
+            datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+        )
+        pdf.alias_nb_pages()
+        pdf.add_page()
+        pdf.set_font("Custom", "", 12)
+        pdf.write(10, "Salamandra salamandra, page {nb}")
+        return bytes(pdf.output())
+
+    added = FPDF()
+    added.add_font("Custom", "", font_file)
+    expected = write(added)
+    registered = FPDF()
+    fonts.register_font(registered, "Custom", "", font_file)
+    assert write(registered) == expected
+
+    fonts.FONT_METRICS.clear()
+    cached = FPDF()
+    fonts.register_font(cached, "Custom", "", font_file)
+    assert write(cached) == expected
@@ -0,0 +1,87 @@
+import os
+import shutil
+
+import numpy
+import pytest
+from fpdf import FPDF
+from PIL import Image
+
+import report_generator.report_generator_cli.images as images
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPORT_GENERATOR_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(images, "SOURCES", {})
+    monkeypatch.setattr(images, "RENDITIONS", {})
+    return tmp_path / "cache" / "renditions"
+
+
+@pytest.fixture
+def photo(tmp_path):
+    pixels = numpy.random.default_rng(1).integers(0, 255, (1500, 2000, 3))
+    path = tmp_path / "photo.png"
+    Image.fromarray(pixels.astype(numpy.uint8)).save(path)
+    return str(path)
+
+
+@pytest.fixture
+def silhouette(tmp_path):
+    image = Image.new("RGBA", (1200, 800), (0, 0, 0, 0))
+    image.paste((0, 0, 0, 255), (300, 200, 900, 600))
+    path = tmp_path / "silhouette.png"
+    image.save(path)
+    return str(path)
+
+
+def test_photo_rendition(photo, cache_dir):
+    rendition = images.get_rendition(photo, 45, 30, dpi=150)
+    assert os.path.dirname(rendition) == str(cache_dir)
+    assert rendition.endswith(".jpg")
+    with Image.open(rendition) as image:
+        assert image.size == (266, 178)
+    assert images.get_rendition(photo, 45, 30, dpi=150) == rendition
+
+    # Same content, same rendition
+    copy = os.path.join(os.path.dirname(photo), "copy.png")
+    shutil.copy(photo, copy)
+    assert images.get_rendition(copy, 45, 30, dpi=150) == rendition
+
+
+def test_transparent_rendition(silhouette):
+    rendition = images.get_rendition(silhouette, 45, 30, dpi=150)
+    assert rendition.endswith(".png")
+    with Image.open(rendition) as image:
+        assert image.mode == "RGBA"
+        assert image.getpixel((0, 0))[3] == 0
+
+
+def test_rendition_not_upscaled(silhouette):
+    rendition = images.get_rendition(silhouette, 400, 300, dpi=300)
+    with Image.open(rendition) as image:
+        assert image.size == (1200, 800)
+
+
+def test_slot_size():
+    assert images.get_slot_size((2000, 1000), 0, 50) == (100, 50)
+    assert images.get_slot_size((2000, 1000), 60, 0) == (60, 30)
+    assert images.get_slot_size((2000, 1000), 60, 50) == (60, 50)
+
+
+def test_place_image_embeds_once(photo, silhouette, tmp_path):
+    copy = str(tmp_path / "copy.png")
+    shutil.copy(photo, copy)
+
+    pdf = FPDF()
+    for _ in range(3):
+        pdf.add_page()
+        images.place_image(pdf, photo, x=10, y=10, w=45, h=30)
+        images.place_image(pdf, copy, x=10, y=50, w=45, h=30)
+        images.place_image(pdf, silhouette, x=10, y=90, h=30)
+    assert len(pdf.images) == 2
+    size = len(pdf.output())
+
+    source_pdf = FPDF()
+    source_pdf.add_page()
+    source_pdf.image(photo, x=10, y=10, w=45, h=30)
+    assert size < len(source_pdf.output()) / 10
@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+import report_generator.app as app
+import report_generator.indexes as ix
+import report_generator.project_setup.locations_db_setup as ldb
+import report_generator.read_from_db.query_db as qd
+
+
+def query_plan(conn, sql):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_index_sql():
+    sql = ix.index_sql("idx_a", "table_a", ["col_a", "col_b"])
+    assert sql == "CREATE INDEX IF NOT EXISTS idx_a ON table_a (col_a, col_b)"
+
+
+def test_create_and_verify_indexes(species_db):
+    conn = sqlite3.connect(species_db)
+    tables = ix.get_table_names(conn)
+    catalog = [index for index in ix.SPECIES_INDEXES if index[1] in tables]
+    assert len(ix.verify_indexes(conn, ix.SPECIES_INDEXES)) == len(catalog)
+    ix.create_indexes(conn, ix.SPECIES_INDEXES)
+    assert ix.verify_indexes(conn, ix.SPECIES_INDEXES) == []
+    stats = conn.execute("SELECT count(*) FROM sqlite_stat1").fetchone()[0]
+    assert stats > 0
+
+
+def test_rebuild_indexes(species_db):
+    conn = sqlite3.connect(species_db)
+    ix.create_indexes(conn, ix.SPECIES_INDEXES)
+    conn.execute("DROP INDEX idx_genus_family_id")
+    assert ix.verify_indexes(conn, ix.SPECIES_INDEXES) == ["idx_genus_family_id"]
+    ix.rebuild_indexes(conn, ix.SPECIES_INDEXES)
+    assert ix.verify_indexes(conn, ix.SPECIES_INDEXES) == []
+
+
+def test_species_query_uses_indexes(species_db):
+    conn = sqlite3.connect(species_db)
+    ix.create_indexes(conn, ix.SPECIES_INDEXES)
+    plan = query_plan(conn, qd.build_query({}))
+    for index in [
+        "idx_activity_species_species_id",
+        "idx_micro_habitat_species_species_id",
+        "idx_nesting_site_species_species_id",
+    ]:
+        assert index in plan
+
+
+def test_location_lookups_use_indexes(tmp_path):
+    conn = sqlite3.connect(tmp_path / "location.db")
+    ldb.create_tables(conn)
+    conn.executemany(
+        "INSERT INTO geocode (geoname_id, place_name, country_code) VALUES (?, ?, ?)",
+        [(i, f"Place {i}", f"C{i % 50}") for i in range(2000)],
+    )
+    ix.create_indexes(conn, ix.LOCATION_INDEXES)
+
+    plan = query_plan(
+        conn, "SELECT latitude FROM geocode WHERE country_code = 'C1' LIMIT 1"
+    )
+    assert "idx_geocode_country_code" in plan
+
+    plan = query_plan(
+        conn,
+        "SELECT latitude FROM geocode "
+        "WHERE place_name = 'Africa' AND country_code IS NULL LIMIT 1",
+    )
+    assert "idx_geocode_place_name" in plan
+
+    plan = query_plan(
+        conn, "SELECT latitude FROM geocode WHERE place_name LIKE 'Place 1' LIMIT 1"
+    )
+    assert "idx_geocode_place_name_nocase" in plan
+
+
+@pytest.mark.parametrize("ok, code", [(True, 0), (False, 1)])
+def test_verify_indexes_exit_code(monkeypatch, ok, code):
+    monkeypatch.setattr(ix, "main", lambda arguments: ok)
+    monkeypatch.setattr("sys.argv", ["report-generator", "--verify-indexes"])
+    with pytest.raises(SystemExit) as exit_info:
+        app.main()
+    assert exit_info.value.code == code
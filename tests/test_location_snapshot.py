@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import tarfile
+
+import pytest
+
+import report_generator.project_setup.location_snapshot as ls
+import report_generator.project_setup.new_report_project as nrp
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    locations_path = tmp_path / "source" / "locations"
+    os.makedirs(locations_path / "location_database")
+    os.makedirs(locations_path / "location_json")
+    conn = sqlite3.connect(locations_path / "location_database" / "location.db")
+    conn.execute("CREATE TABLE geocode (place_name TEXT)")
+    conn.execute("INSERT INTO geocode VALUES ('Quito')")
+    conn.commit()
+    conn.close()
+    (locations_path / "location_json" / "location.json").write_text('{"Quito": 1}')
+
+    bundle_path = tmp_path / "locations.tar.gz"
+    ls.export_snapshot(locations_path, bundle_path, label="2022-08-01")
+    return bundle_path
+
+
+def read_place(locations_path):
+    conn = sqlite3.connect(locations_path / "location_database" / "location.db")
+    return conn.execute("SELECT place_name FROM geocode").fetchone()[0]
+
+
+def test_export_manifest(bundle):
+    manifest = ls.read_manifest(bundle)
+    assert manifest["format"] == ls.SNAPSHOT_FORMAT
+    assert manifest["label"] == "2022-08-01"
+    assert sorted(manifest["files"]) == ["location.db", "location.json"]
+
+
+@pytest.mark.parametrize("mode", ls.ATTACH_MODES)
+def test_attach_modes(bundle, tmp_path, mode):
+    store = tmp_path / "store"
+    locations_path = tmp_path / "project" / "locations"
+    ls.attach_snapshot(bundle, locations_path, mode, store)
+    assert read_place(locations_path) == "Quito"
+
+    json_path = locations_path / "location_json" / "location.json"
+    assert not os.path.islink(json_path)
+    assert os.access(json_path, os.W_OK)
+    db_path = locations_path / "location_database" / "location.db"
+    assert os.path.islink(db_path) == (mode == "symlink")
+
+
+def test_unpack_reused(bundle, tmp_path):
+    store = tmp_path / "store"
+    first = ls.unpack_snapshot(bundle, store)
+    assert ls.unpack_snapshot(bundle, store) == first
+    assert len(os.listdir(store)) == 1
+
+
+def read_bundle_manifest(bundle):
+    with tarfile.open(bundle, "r:gz") as source:
+        return json.load(source.extractfile("manifest.json"))
+
+
+def rewrite_bundle(bundle, tmp_path, manifest, directory=None):
+    """Copy the bundle with a new manifest, and a directory member if given."""
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps(manifest))
+
+    tampered = tmp_path / "tampered.tar.gz"
+    with tarfile.open(bundle, "r:gz") as source, tarfile.open(tampered, "w:gz") as out:
+        out.add(manifest_path, arcname="manifest.json")
+        for member in source.getmembers():
+            if member.name not in ["manifest.json", directory]:
+                out.addfile(member, source.extractfile(member))
+        if directory is not None:
+            out.add(tmp_path, arcname=directory, recursive=False)
+    return tampered
+
+
+def test_tampered_bundle(bundle, tmp_path):
+    manifest = read_bundle_manifest(bundle)
+    manifest["files"]["location.json"]["sha256"] = "0" * 64
+    tampered = rewrite_bundle(bundle, tmp_path, manifest)
+
+    with pytest.raises(ValueError):
+        ls.attach_snapshot(tampered, tmp_path / "project", store_dir=tmp_path / "s")
+    assert os.listdir(tmp_path / "s") == []
+
+
+@pytest.mark.parametrize("name", ["../../escaped.db", "absolute", "manifest.json"])
+def test_bundle_unexpected_file(bundle, tmp_path, name):
+    if name == "absolute":
+        name = str(tmp_path / "escaped.db")
+    manifest = read_bundle_manifest(bundle)
+    manifest["files"][name] = manifest["files"]["location.json"]
+    tampered = rewrite_bundle(bundle, tmp_path, manifest)
+
+    with pytest.raises(ValueError):
+        ls.unpack_snapshot(tampered, tmp_path / "store" / "snapshots")
+    assert not os.path.exists(tmp_path / "escaped.db")
+    assert not os.path.exists(tmp_path / "store")
+
+
+def test_bundle_missing_file(bundle, tmp_path):
+    manifest = read_bundle_manifest(bundle)
+    del manifest["files"]["location.json"]
+    tampered = rewrite_bundle(bundle, tmp_path, manifest)
+
+    with pytest.raises(ValueError, match="location.json"):
+        ls.attach_snapshot(tampered, tmp_path / "project", store_dir=tmp_path / "s")
+    assert not os.path.exists(tmp_path / "project")
+
+
+def test_bundle_directory_member(bundle, tmp_path):
+    manifest = read_bundle_manifest(bundle)
+    tampered = rewrite_bundle(bundle, tmp_path, manifest, directory="location.json")
+
+    with pytest.raises(ValueError):
+        ls.unpack_snapshot(tampered, tmp_path / "s")
+    assert os.listdir(tmp_path / "s") == []
+
+
+def test_unknown_mode(bundle, tmp_path):
+    with pytest.raises(ValueError):
+        ls.attach_snapshot(bundle, tmp_path / "project", "mount")
+
+
+def test_snapshot_setup_steps(tmp_path):
+    settings = {"data_set": "data.xlsx"}
+    names = [s.name for s in nrp.get_setup_steps(settings, tmp_path, "a.tar.gz")]
+    assert "location_snapshot" in names
+    assert "location_download" not in names
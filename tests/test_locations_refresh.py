@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+import report_generator.project_setup.locations_db_setup as ldb
+
+
+def geocode_row(geoname_id, name, lat, lon, country_code="EC"):
+    row = [str(geoname_id), name, name, "", str(lat), str(lon), "P", "PPL"]
+    row += [country_code, "", "", "", "", "", "0", "", "10", "America/Guayaquil"]
+    row += ["2022-08-01"]
+    return "\t".join(row) + "\n"
+
+
+@pytest.fixture
+def location_path(tmp_path):
+    path = tmp_path / "locations"
+    os.makedirs(path / "location_database")
+    os.makedirs(path / "location_json")
+    conn = ldb.create_connection(path / "location_database")
+    ldb.create_tables(conn)
+    rows = [(1, "Quito", -0.2, -78.5), (2, "Cuenca", -2.9, -79.0), (3, "Loja", -4, -79)]
+    conn.executemany(
+        "INSERT INTO geocode (geoname_id, place_name, latitude, longitude) "
+        "VALUES (?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+    location_data = {
+        "continent": {},
+        "country": {},
+        "region": {
+            "quito": {"region": "quito", "latitude": -0.2, "longitude": -78.5},
+            "cuenca": {"region": "cuenca", "latitude": -2.9, "longitude": -79.0},
+            "loja": {"region": "loja", "latitude": 1.0, "longitude": 1.0},
+        },
+    }
+    with open(path / "location_json" / "location.json", "w") as file:
+        json.dump(location_data, file)
+    return path
+
+
+@pytest.fixture
+def delta_dir(tmp_path):
+    path = tmp_path / "deltas"
+    os.makedirs(path)
+    (path / "modifications-2022-08-02.txt").write_text(
+        geocode_row(1, "Quito", -0.22, -78.51) + geocode_row(4, "Ambato", -1.2, -78.6)
+    )
+    (path / "deletes-2022-08-02.txt").write_text("2\tCuenca\tduplicate\n")
+    return path
+
+
+def test_refresh_location_data(location_path, delta_dir):
+    summary = ldb.refresh_location_data(location_path, delta_dir)
+    assert summary["dates"] == ["2022-08-02"]
+    assert (summary["modified"], summary["deleted"]) == (2, 1)
+
+    conn = sqlite3.connect(location_path / "location_database" / "location.db")
+    rows = conn.execute(
+        "SELECT geoname_id, place_name, latitude, alternate_names FROM geocode "
+        "ORDER BY geoname_id"
+    ).fetchall()
+    assert rows == [
+        (1, "Quito", -0.22, None),
+        (3, "Loja", -4.0, None),
+        (4, "Ambato", -1.2, None),
+    ]
+
+
+def test_refresh_invalidates_lexicon(location_path, delta_dir):
+    summary = ldb.refresh_location_data(location_path, delta_dir)
+    with open(location_path / "location_json" / "location.json") as file:
+        regions = json.load(file)["region"]
+    # Quito and Cuenca were resolved from changed rows, Loja was not
+    assert sorted(regions) == ["loja"]
+    assert summary["invalidated"] == 2
+
+
+def test_refresh_skips_applied_dates(location_path, delta_dir):
+    ldb.refresh_location_data(location_path, delta_dir)
+    summary = ldb.refresh_location_data(location_path, delta_dir)
+    assert summary["dates"] == []
+
+
+def test_refresh_detaches_linked_database(location_path, delta_dir, tmp_path):
+    db_file = location_path / "location_database" / "location.db"
+    shared = tmp_path / "shared.db"
+    os.replace(db_file, shared)
+    os.link(shared, db_file)
+    ldb.refresh_location_data(location_path, delta_dir)
+    assert os.stat(shared).st_nlink == 1
+    conn = sqlite3.connect(shared)
+    assert conn.execute("SELECT count(*) FROM geocode").fetchone()[0] == 3
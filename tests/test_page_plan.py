@@ -0,0 +1,166 @@
+import json
+import sqlite3
+
+import pandas
+import pytest
+from fpdf import FPDF
+from PIL import Image
+
+import report_generator.fonts as fonts
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.report_generator_cli.create_report as cr
+import report_generator.report_generator_cli.page_plan as pp
+from report_generator.report_generator_cli.taxonomy_tree import TaxonomyTree
+
+IMAGES = ["frogsil1.png", "frogsil2.png", "maletext.png", "femaleimage.png"]
+
+FONT_OPTIONS = {
+    "header_font": "Helvetica",
+    "header_size": 24,
+    "paragraph_font": "Times",
+    "paragraph_size": 12,
+}
+
+
+@pytest.fixture
+def data_frame(species_db):
+    conn = sqlite3.connect(species_db)
+    sql, params = qc.compile_query({})
+    data_frame = pandas.read_sql_query(sql, conn, params=params)
+    conn.close()
+    return data_frame
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    images_path = tmp_path / "data" / "images"
+    images_path.mkdir(parents=True)
+    for name in IMAGES + ["f1.jpg", "f2.jpg"]:
+        Image.new("RGB", (4, 4), (0, 128, 0)).save(images_path / name)
+    fonts_path = tmp_path / "data" / "fonts"
+    fonts_path.mkdir()
+    (fonts_path / "fonts.yaml").write_text("custom_font_types: {}\n")
+    config = {"dir_path": str(tmp_path), "fonts": FONT_OPTIONS}
+    monkeypatch.setenv("REPORT_GENERATOR_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(fonts, "load_config", lambda: config)
+    return config
+
+
+def make_tree(data_frame, genera, species, regions=0, per_family=4, per_order=20):
+    """Tree of genera in families and orders, with up to regions regions."""
+    rows = []
+    for genus in range(genera):
+        for position in range(species(genus)):
+            row = data_frame.iloc[position % len(data_frame.index)].copy()
+            row["Order"] = f"Order{genus // per_order}"
+            row["Family"] = f"Family{genus // per_family}"
+            row["Genus"] = f"Genus{genus}"
+            row["Species"] = f"species{position}"
+            count = (genus * 7 + position * 13) % (regions or 1)
+            row["GeographicRegion"] = json.dumps(
+                [f"Region {number} of a country" for number in range(count)]
+            )
+            rows.append(row)
+    return TaxonomyTree(pandas.DataFrame(rows))
+
+
+def render(tree, config, introduction=True):
+    """Plan and render a report, returning the plan and its outline."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.start_section(name="Title Page", level=0)
+    pdf.add_page()
+    pdf.start_section(name="Table Of Contents", level=0)
+    plan = pp.plan_report(
+        pdf, tree, FONT_OPTIONS, cr.get_section_amphibians, introduction
+    )
+    pdf.insert_toc_placeholder(cr.render_toc, plan.toc_pages)
+    if introduction:
+        pdf.start_section(name="Introduction", level=0)
+    pdf = cr.create_report_order_sections(tree, pdf, config, FONT_OPTIONS)
+    pdf.output()
+    outline = [
+        (section.name, section.level, section.page_number)
+        for section in pdf._outline
+        if section.level < 3
+    ]
+    return plan, outline, len(pdf.pages)
+
+
+def test_plan_matches_report(data_frame, config):
+    plan, outline, pages = render(TaxonomyTree(data_frame), config)
+    assert plan.sections == outline
+    assert plan.pages == pages
+    assert plan.toc_pages == 1
+    assert plan.exact
+
+
+def test_plan_follows_page_breaks(data_frame, config):
+    short = make_tree(data_frame, 24, lambda genus: genus % 7 + 1)
+    plan, outline, pages = render(short, config)
+    assert (plan.sections, plan.pages) == (outline, pages)
+
+    # Long region cells push species blocks onto extra pages
+    long = make_tree(data_frame, 24, lambda genus: genus % 7 + 1, regions=40)
+    long_plan, outline, pages = render(long, config)
+    assert (long_plan.sections, long_plan.pages) == (outline, pages)
+    assert long_plan.pages > plan.pages
+
+
+def test_contents_pages_count_front_entries(data_frame, config):
+    # 52 headings fit the first contents page, with the title page,
+    # contents and introduction entries they do not
+    tree = make_tree(data_frame, 50, lambda genus: 1, per_family=50, per_order=50)
+    assert tree.count_headings() == 52
+    plan, outline, pages = render(tree, config)
+    assert plan.toc_pages == 2
+    assert (plan.sections, plan.pages) == (outline, pages)
+
+
+def test_contents_pages_without_species(data_frame):
+    taxa = data_frame[["Order", "Family", "Genus"]].drop_duplicates()
+    assert cr.calc_number_of_contents_pages(taxa) == 1
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.start_section(name="Table Of Contents", level=0)
+    plan = pp.plan_report(pdf, TaxonomyTree(taxa), FONT_OPTIONS)
+    assert plan.pages is None
+    assert plan.sections[1] == ("Anura", 0, None)
+
+
+def test_needs_body_plan(data_frame):
+    assert not pp.needs_body_plan(TaxonomyTree(data_frame))
+    # An entry of 74 characters fits a line with a one digit page number
+    data_frame = data_frame.assign(Order="A" * 71)
+    assert pp.needs_body_plan(TaxonomyTree(data_frame))
+
+
+def test_toc_entry():
+    entry = pp.format_toc_entry("Bufonidae", 1, 12)
+    assert entry.startswith("  Bufonidae .") and entry.endswith(". 12")
+    assert len(entry) == pp.TOC_ENTRY_WIDTH + 4
+
+
+@pytest.mark.parametrize("w", [20, 35, 95, 190])
+def test_count_lines(w):
+    measure = pp.TextMeasure()
+    pdf = FPDF()
+    pdf.add_page()
+    words = ["Europe", "Spain", "Andalusia/Europe", "x" * 40, "of", "a", "Région"]
+    for count in range(0, 60, 7):
+        for separator in ["", " ", "  "]:
+            text = separator.join(words[n % len(words)] for n in range(count))
+            for font in [("Times", "", 10), ("Helvetica", "B", 12), pp.TOC_FONT]:
+                measure.set_font(*font)
+                pdf.set_font(*font)
+                expected = len(pdf.multi_cell(w, txt=text, split_only=True))
+                assert measure.count_lines(text, w) == expected
+
+
+def test_cursor_page_breaks():
+    pdf = FPDF()
+    cursor = pp.PageCursor(pdf, y=pdf.page_break_trigger - 5)
+    cursor.multi_cell(4, 3, top=True)
+    assert (cursor.page, cursor.y) == (1, pdf.page_break_trigger - 5)
+    cursor.multi_cell(4, 2, top=False)
+    assert (cursor.page, cursor.y) == (2, pdf.t_margin + 4)
@@ -0,0 +1,139 @@
+import sqlite3
+
+import fitz
+import pandas
+import pytest
+from fpdf import FPDF
+from PIL import Image
+
+import report_generator.fonts as fonts
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.report_generator_cli.create_report as cr
+import report_generator.report_generator_cli.parallel_render as pr
+from report_generator.report_generator_cli.taxonomy_tree import TaxonomyTree
+
+IMAGES = [
+    "f1.jpg",
+    "f2.jpg",
+    "frogsil1.png",
+    "frogsil2.png",
+    "maletext.png",
+    "femaleimage.png",
+]
+
+FONT_OPTIONS = {
+    "header_font": "Helvetica",
+    "header_size": 24,
+    "paragraph_font": "Times",
+    "paragraph_size": 12,
+}
+
+
+@pytest.fixture
+def tree(species_db):
+    conn = sqlite3.connect(species_db)
+    sql, params = qc.compile_query({})
+    data_frame = pandas.read_sql_query(sql, conn, params=params)
+    conn.close()
+    return TaxonomyTree(data_frame)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    images_path = tmp_path / "data" / "images"
+    images_path.mkdir(parents=True)
+    for name in IMAGES:
+        Image.new("RGB", (4, 4), (0, 128, 0)).save(images_path / name)
+    fonts_path = tmp_path / "data" / "fonts"
+    fonts_path.mkdir()
+    (fonts_path / "fonts.yaml").write_text("custom_font_types: {}\n")
+    config = {"dir_path": str(tmp_path), "fonts": FONT_OPTIONS}
+    monkeypatch.setenv("REPORT_GENERATOR_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(fonts, "load_config", lambda: config)
+    return config
+
+
+def render(tree, config, workers, pdf_path):
+    pdf = cr.create_contents_page(FPDF(), tree)
+    if workers == 1:
+        pdf = cr.create_report_order_sections(tree, pdf, config, FONT_OPTIONS)
+        pdf.output(pdf_path)
+    else:
+        cr.create_report_parallel_sections(
+            tree, pdf, config, FONT_OPTIONS, workers, pdf_path
+        )
+    doc = fitz.open(pdf_path)
+    pages = [page.get_text() for page in doc]
+    links = [
+        [(link["kind"], link.get("page")) for link in page.get_links()]
+        for page in doc
+        if page.get_links()
+    ]
+    toc = doc.get_toc(simple=False)
+    doc.close()
+    return pages, links, [(level, name, page) for level, name, page, _ in toc]
+
+
+def test_plan_shards(tree):
+    shards = pr.plan_shards(tree, 1)
+    assert len(shards) == 1 and len(shards[0]) == 8
+
+    # Bufonidae | Hylidae, Salamandridae
+    shards = pr.plan_shards(tree, 2)
+    assert [len(shard) for shard in shards] == [4, 4]
+    assert [shard.continues_order for shard in shards] == [False, True]
+    assert list(shards[1].rows["Family"]) == ["Hylidae"] * 2 + ["Salamandridae"] * 2
+
+    # Families are not split
+    shards = pr.plan_shards(tree, 10)
+    assert [len(shard) for shard in shards] == [4, 2, 2]
+    assert [shard.continues_order for shard in shards] == [False, True, False]
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_matches_single_process(tree, config, tmp_path, workers):
+    expected = render(tree, config, 1, str(tmp_path / "single.pdf"))
+    pages, links, toc = render(tree, config, workers, str(tmp_path / "parallel.pdf"))
+    assert len(pages) == len(expected[0])
+    assert pages == expected[0]
+    assert links == expected[1]
+    assert toc == expected[2]
+    assert [name for _, name, _ in toc][:3] == [
+        "Table Of Contents",
+        "Anura",
+        "Bufonidae",
+    ]
+
+
+def test_render_workers(config):
+    assert cr.get_render_workers({}, config) == 1
+    assert cr.get_render_workers({"--workers": "4"}, config) == 4
+    assert cr.get_render_workers({}, dict(config, render_workers=2)) == 2
+    assert cr.get_render_workers({"--workers": "many"}, config) == 1
+
+
+def test_benchmark(tree, config):
+    timings = pr.benchmark(
+        tree,
+        cr.render_shard,
+        (config, FONT_OPTIONS),
+        lambda: cr.create_contents_page(FPDF(), tree),
+        2,
+    )
+    assert list(timings) == [1, 2]
+    assert all(seconds > 0 for seconds in timings.values())
+
+
+def test_shard_pdf_records_sections():
+    pdf = pr.ShardPDF()
+    pdf.add_page()
+    pdf.start_section(name="Anura", level=0)
+    pdf.set_y(120)
+    pdf.start_section(name="Bufonidae", level=1)
+    pdf.add_page()
+    pdf.start_section(name="Bufo", level=2)
+    assert pdf.sections == [
+        ("Anura", 0, 1, pdf.t_margin),
+        ("Bufonidae", 1, 1, 120),
+        ("Bufo", 2, 2, pdf.t_margin),
+    ]
@@ -0,0 +1,129 @@
+import json
+import sqlite3
+
+import pandas
+import pytest
+
+import report_generator.indexes as ix
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.query_db as qd
+
+
+def run(species_db, options):
+    sql, params = qc.compile_query(options)
+    conn = sqlite3.connect(species_db)
+    return pandas.read_sql_query(sql, conn, params=params)
+
+
+def test_same_shape_shares_sql():
+    sql_a, params_a = qc.compile_query({"Genus": "Bufo", "SVLMx": ["10", "50"]})
+    sql_b, params_b = qc.compile_query({"SVLMx": ["20", "90"], "Genus": "Hyla"})
+    assert sql_a is sql_b
+    assert params_a == ["%Bufo%", 10, 50]
+    assert params_b == ["%Hyla%", 20, 90]
+    assert "Bufo" not in sql_a
+
+
+def test_template_cache_hits():
+    qc.compile_template.cache_clear()
+    qc.compile_query({"Family": "Hylidae"})
+    qc.compile_query({"Family": "Bufonidae"})
+    info = qc.compile_template.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_normalise_option():
+    assert qc.normalise_option("Genus", "Bufo") == (("LIKE",), ["%Bufo%"])
+    assert qc.normalise_option("Longevity", "5") == (("=",), [5])
+    assert qc.normalise_option("EggDiameter", ["1.5", "2"]) == (("BETWEEN",), [1.5, 2])
+    assert qc.normalise_option("Clutch", ["100", ""]) == ((">=",), [100])
+    assert qc.normalise_option("Clutch", ["", "100"]) == (("<=",), [100])
+    assert qc.normalise_option("IUCN", ["LC", "EN", "CR"]) == (
+        ("LIKE", "LIKE", "LIKE"),
+        ["LC", "EN", "CR"],
+    )
+
+
+def test_unknown_option():
+    with pytest.raises(ValueError):
+        qc.compile_query({"species_id; DROP TABLE species": "1"})
+
+
+def test_filters(species_db):
+    assert len(run(species_db, {}).index) == 8
+    assert list(run(species_db, {"Genus": "Bufo"})["Species"]) == ["bufo", "spinosus"]
+    df = run(species_db, {"SVLMx": ["100", "190"]})
+    assert list(df["Species"]) == ["bufo", "spinosus", "algira"]
+
+
+def test_any_of_values_is_bracketed(species_db):
+    # Without brackets the OR would bypass the Order filter
+    df = run(
+        species_db,
+        {"IUCN": ["CR", "EN", "LC"], "order_taxon_name": "Caudata"},
+    )
+    assert list(df["Species"]) == ["salamandra", "algira"]
+
+
+def test_values_are_not_sql(species_db):
+    assert len(run(species_db, {"Genus": "' OR 1=1 --"}).index) == 0
+
+
+def test_geographic_region(species_db):
+    df = run(species_db, {"GeographicRegion": "Spain"})
+    assert list(df["Species"]) == [
+        "bufo",
+        "spinosus",
+        "arborea",
+        "meridionalis",
+        "salamandra",
+    ]
+
+
+def test_predicates_pushed_down(species_db):
+    conn = sqlite3.connect(species_db)
+    ix.create_indexes(conn, ix.SPECIES_INDEXES)
+    sql, params = qc.compile_query({"Genus": "Atelopus", "GeographicRegion": "Spain"})
+    cte = sql[: sql.index("SELECT\n    order_taxon_name")]
+    assert "genus_name LIKE ?" in cte
+    assert "EXISTS" in cte
+    plan = "\n".join(
+        row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    )
+    assert "MATERIALIZE" not in plan
+    assert "idx_geo_location_species_species_id" in plan
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"Genus": "Bufo"},
+        {"GeographicRegion": "Europe"},
+        {"SVLMx": ["40", "160"], "Activity": "Nocturnal"},
+        {"order_taxon_name": "Anura", "IUCN": "CR"},
+    ],
+)
+def test_matches_legacy_query(species_db, options):
+    conn = sqlite3.connect(species_db)
+    legacy = pandas.read_sql_query(qd.build_query(options), conn)
+    compiled = run(species_db, options)
+    assert list(compiled.columns) == list(legacy.columns)
+    assert list(compiled["Species"]) == list(legacy["Species"])
+
+
+def test_geographic_region_json(species_db):
+    conn = sqlite3.connect(species_db)
+    conn.execute(
+        "INSERT INTO geo_location (region_name, country_id) VALUES (?, ?)",
+        ("Noregion", 4),
+    )
+    conn.executemany(
+        "INSERT INTO geo_location_species (species_id, geo_location_id) VALUES (?, ?)",
+        [(6, 5), (6, 2), (6, 1)],
+    )
+    conn.commit()
+    regions = run(species_db, {})["GeographicRegion"].map(json.loads)
+    assert regions[5] == ["Europe Spain", "South America Ecuador"]
+    assert regions[6] == ["Europe Spain"]
+    assert all(len(set(region)) == len(region) for region in regions)
@@ -0,0 +1,80 @@
+import json
+import sqlite3
+
+import pytest
+
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.query_db as qd
+import report_generator.read_from_db.query_log as ql
+
+
+@pytest.fixture
+def conn(species_db):
+    conn = sqlite3.connect(species_db)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def slow_log(tmp_path):
+    path = tmp_path / "slow_queries.log"
+    ql.set_slow_log(str(path), seconds=0)
+    yield path
+    ql.set_slow_log()
+
+
+def test_explain_query(conn):
+    plan = ql.explain_query(conn, "SELECT * FROM species WHERE species_id = ?", [1])
+    assert [row["detail"] for row in plan] == [
+        "SEARCH species USING INTEGER PRIMARY KEY (rowid=?)"
+    ]
+
+
+def test_find_full_scans(conn):
+    plan = ql.explain_query(conn, "SELECT * FROM species")
+    assert ql.find_full_scans(conn, plan, min_rows=1) == {"species": 8}
+    assert ql.find_full_scans(conn, plan) == {}
+    plan = ql.explain_query(conn, "SELECT * FROM species WHERE species_id = 1")
+    assert ql.find_full_scans(conn, plan, min_rows=1) == {}
+
+
+def test_slow_query_log(conn, slow_log):
+    options = {"SVLMx": ["40", "160"], "Genus": "Bufo"}
+    sql, params = qc.compile_query(options)
+    with ql.record_query(conn, sql, params, options):
+        qd.query_db(conn, sql, params)
+    entry = json.loads(slow_log.read_text().splitlines()[-1])
+    assert entry["options"] == {
+        "Genus": {"ops": ["LIKE"], "values": ["%Bufo%"]},
+        "SVLMx": {"ops": ["BETWEEN"], "values": [40, 160]},
+    }
+    assert entry["seconds"] >= 0
+    assert entry["plan"]
+
+
+def test_fast_query_not_logged(conn, tmp_path):
+    path = tmp_path / "slow_queries.log"
+    ql.set_slow_log(str(path), seconds=60)
+    ql.log_query(conn, "SELECT 1", [], {}, 0.01)
+    ql.set_slow_log()
+    assert not path.exists()
+
+
+def test_time_stream_logs_once(conn, monkeypatch):
+    logged = []
+    monkeypatch.setattr(ql, "log_query", lambda *args: logged.append(args[-1]) or {})
+    sql, params = qc.compile_query({})
+    chunks = qd.stream_query(conn, sql, params, chunk_size=3)
+    stream = ql.time_stream(conn, sql, params, {}, chunks)
+    assert sum(len(chunk) for chunk in stream) == 8
+    assert len(logged) == 1
+
+
+def test_explain_from_db(species_db, monkeypatch):
+    monkeypatch.setattr(qd, "get_db_path", lambda: species_db)
+    explanation = qd.explain_from_db({"--cli": True, "--Family": "Hylidae"})
+    assert explanation["options"] == {
+        "Family": {"ops": ["LIKE"], "values": ["%Hylidae%"]}
+    }
+    assert explanation["params"]
+    assert explanation["plan"]
@@ -0,0 +1,85 @@
+import sqlite3
+
+import pandas
+import pytest
+
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.query_db as qd
+import report_generator.read_from_db.result_cache as rc
+
+
+@pytest.fixture
+def result(species_db):
+    conn = sqlite3.connect(species_db)
+    sql, params = qc.compile_query({}, qc.SOURCE_TABLES)
+    data_frame = pandas.read_sql_query(sql, conn, params=params)
+    conn.close()
+    return data_frame
+
+
+def test_encode_round_trip(result):
+    data = rc.encode_frame(result)
+    pandas.testing.assert_frame_equal(rc.decode_frame(data), result)
+    empty = result.iloc[0:0].reset_index(drop=True)
+    pandas.testing.assert_frame_equal(rc.decode_frame(rc.encode_frame(empty)), empty)
+
+
+def test_encode_rejects_mixed_columns():
+    with pytest.raises(ValueError):
+        rc.encode_frame(pandas.DataFrame({"a": ["x", b"y"]}, dtype=object))
+
+
+def test_key_follows_options_and_database(species_db):
+    key = rc.make_key({"Genus": "Bufo", "SVLMx": ["40", "60"]}, species_db)
+    assert key == rc.make_key({"SVLMx": ["40", "60"], "Genus": " Bufo"}, species_db)
+    assert key != rc.make_key({"Genus": "Bufo", "SVLMx": ["60", "40"]}, species_db)
+
+    conn = sqlite3.connect(species_db)
+    conn.execute("UPDATE species SET longevity = 99 WHERE species_id = 1")
+    conn.commit()
+    conn.close()
+    assert key != rc.make_key({"Genus": "Bufo", "SVLMx": ["40", "60"]}, species_db)
+
+
+def test_memory_and_disk_tiers(tmp_path, result):
+    size = len(rc.encode_frame(result))
+    cache = rc.ResultCache(tmp_path, memory_budget=size * 2, disk_budget=size * 2)
+    for key in ["a", "b", "c"]:
+        assert cache.put(key, result)
+    assert list(cache.memory) == ["b", "c"]
+    assert sorted(p.name for p in tmp_path.glob("*.npz")) == ["b.npz", "c.npz"]
+
+    fresh = rc.ResultCache(tmp_path)
+    pandas.testing.assert_frame_equal(fresh.get("b"), result)
+    assert list(fresh.memory) == ["b"]
+    assert fresh.get("a") is None
+
+
+def test_unreadable_entry_discarded(tmp_path):
+    cache = rc.ResultCache(tmp_path)
+    (tmp_path / "bad.npz").write_bytes(b"not an archive")
+    assert cache.get("bad") is None
+    assert not (tmp_path / "bad.npz").exists()
+
+
+def test_read_from_db_skips_sql(species_db, tmp_path, monkeypatch):
+    project = tmp_path / "project"
+    (project / "data" / "database").mkdir(parents=True)
+    (project / "data" / "database" / "species.db").write_bytes(
+        open(species_db, "rb").read()
+    )
+    monkeypatch.setattr(qd, "load_config", lambda: {"dir_path": str(project)})
+    monkeypatch.setattr(rc, "CACHE", rc.ResultCache(tmp_path / "cache"))
+    calls = []
+
+    def counting_query_db(conn, query, params=None):
+        calls.append(query)
+        return pandas.read_sql_query(query, conn, params=params)
+
+    monkeypatch.setattr(qd, "query_db", counting_query_db)
+    first = qd.read_from_db({"--Genus": "Bufo"})
+    second = qd.read_from_db({"--Genus": "Bufo", "--output": None})
+    assert len(calls) == 1
+    pandas.testing.assert_frame_equal(first, second)
+    qd.read_from_db({"--Genus": "Hyla"})
+    assert len(calls) == 2
@@ -0,0 +1,117 @@
+import os
+import threading
+
+import pytest
+
+from report_generator.project_setup.setup_pipeline import (
+    SetupPipeline,
+    SetupStep,
+    file_checksum,
+)
+
+
+def write_step(dir_path, name, calls):
+    def run():
+        calls.append(name)
+        with open(os.path.join(dir_path, f"{name}.txt"), "w") as file:
+            file.write(name)
+
+    return run
+
+
+def make_steps(dir_path, calls):
+    return [
+        SetupStep("a", write_step(dir_path, "a", calls), outputs=["a.txt"]),
+        SetupStep(
+            "b", write_step(dir_path, "b", calls), requires=["a"], outputs=["b.txt"]
+        ),
+        SetupStep("c", write_step(dir_path, "c", calls), outputs=["c.txt"]),
+        SetupStep(
+            "d",
+            write_step(dir_path, "d", calls),
+            requires=["b", "c"],
+            outputs=["d.txt"],
+        ),
+    ]
+
+
+def test_file_checksum(tmp_path):
+    file_path = tmp_path / "file.txt"
+    file_path.write_text("abc")
+    assert file_checksum(file_path) == (
+        "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    )
+
+
+def test_run_order(tmp_path):
+    calls = []
+    ran = SetupPipeline(tmp_path, make_steps(tmp_path, calls)).run()
+    assert sorted(ran) == ["a", "b", "c", "d"]
+    assert calls.index("a") < calls.index("b") < calls.index("d")
+    assert calls.index("c") < calls.index("d")
+    assert os.path.isfile(tmp_path / ".setup" / "d.json")
+
+
+def test_independent_steps_overlap(tmp_path):
+    barrier = threading.Barrier(2, timeout=5)
+    steps = [SetupStep("x", barrier.wait), SetupStep("y", barrier.wait)]
+    # Would time out if the steps were run one after another
+    assert sorted(SetupPipeline(tmp_path, steps).run()) == ["x", "y"]
+
+
+def test_resume_skips_completed_steps(tmp_path):
+    calls = []
+    SetupPipeline(tmp_path, make_steps(tmp_path, calls)).run()
+    calls.clear()
+    ran = SetupPipeline(tmp_path, make_steps(tmp_path, calls), resume=True).run()
+    assert ran == []
+    assert calls == []
+
+
+def test_resume_reruns_changed_outputs(tmp_path):
+    calls = []
+    SetupPipeline(tmp_path, make_steps(tmp_path, calls)).run()
+    (tmp_path / "d.txt").write_text("changed")
+    calls.clear()
+    ran = SetupPipeline(tmp_path, make_steps(tmp_path, calls), resume=True).run()
+    assert ran == ["d"]
+
+
+def test_resume_skips_removed_intermediate_outputs(tmp_path):
+    calls = []
+    SetupPipeline(tmp_path, make_steps(tmp_path, calls)).run()
+    os.remove(tmp_path / "a.txt")
+    calls.clear()
+    ran = SetupPipeline(tmp_path, make_steps(tmp_path, calls), resume=True).run()
+    assert ran == []
+
+
+def test_resume_after_failure(tmp_path):
+    calls = []
+
+    def fail():
+        raise RuntimeError("download dropped")
+
+    steps = make_steps(tmp_path, calls)
+    steps[1] = SetupStep("b", fail, requires=["a"], outputs=["b.txt"])
+    with pytest.raises(RuntimeError):
+        SetupPipeline(tmp_path, steps).run()
+    assert "d" not in calls
+
+    calls.clear()
+    ran = SetupPipeline(tmp_path, make_steps(tmp_path, calls), resume=True).run()
+    assert sorted(ran) == ["b", "d"]
+
+
+def test_unknown_requirement(tmp_path):
+    with pytest.raises(ValueError):
+        SetupPipeline(tmp_path, [SetupStep("a", print, requires=["missing"])])
+
+
+def test_cycle(tmp_path):
+    steps = [
+        SetupStep("a", print, requires=["b"]),
+        SetupStep("b", print, requires=["a"]),
+    ]
+    with pytest.raises(ValueError):
+        SetupPipeline(tmp_path, steps)
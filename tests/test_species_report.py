@@ -0,0 +1,85 @@
+import sqlite3
+
+import pandas
+import pytest
+
+import report_generator.indexes as ix
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.species_report as sr
+
+
+@pytest.fixture
+def conn(species_db):
+    conn = sqlite3.connect(species_db)
+    sr.build_species_report(conn)
+    yield conn
+    conn.close()
+
+
+def read(conn, options, source):
+    sql, params = qc.compile_query(options, source)
+    return pandas.read_sql_query(sql, conn, params=params)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"Genus": "Bufo"},
+        {"order_taxon_name": "Caudata"},
+        {"GeographicRegion": "Spain"},
+        {"SVLMx": ["40", "160"], "IUCN": ["LC", "EN"]},
+    ],
+)
+def test_report_matches_tables(conn, options):
+    report = read(conn, options, qc.SOURCE_REPORT)
+    tables = read(conn, options, qc.SOURCE_TABLES)
+    pandas.testing.assert_frame_equal(report, tables)
+
+
+def test_report_indexes(conn):
+    assert ix.verify_indexes(conn, ix.SPECIES_INDEXES) == []
+    sql, params = qc.compile_query({"SVLMx": ["40", "60"]}, qc.SOURCE_REPORT)
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    # A single scan or search of the report table, no joins
+    assert len(plan) == 1
+    assert "species_report" in plan[0][-1]
+
+
+def test_report_source(conn):
+    assert sr.get_report_source(conn, {"Genus": "Bufo"}) == qc.SOURCE_REPORT
+    assert sr.get_report_source(conn, {"Activity": "Diurnal"}) == qc.SOURCE_TABLES
+    with pytest.raises(ValueError):
+        qc.compile_query({"Activity": "Diurnal"}, qc.SOURCE_REPORT)
+
+
+def test_incremental_refresh(conn):
+    conn.execute("UPDATE species SET longevity = 99 WHERE species_name_latin = 'bufo'")
+    conn.execute("DELETE FROM species WHERE species_name_latin = 'algira'")
+    conn.commit()
+    assert not sr.is_report_fresh(conn)
+    assert sr.get_report_source(conn, {}) == qc.SOURCE_TABLES
+
+    assert sr.refresh_species_report(conn) == 2
+    assert sr.is_report_fresh(conn)
+    report = read(conn, {}, qc.SOURCE_REPORT)
+    assert "algira" not in list(report["Species"])
+    assert report.loc[report["Species"] == "bufo", "Longevity"].item() == 99
+    pandas.testing.assert_frame_equal(report, read(conn, {}, qc.SOURCE_TABLES))
+
+
+def test_lookup_change_rebuilds(conn):
+    conn.execute("UPDATE genus SET genus_name = 'Rhinella' WHERE genus_name = 'Bufo'")
+    conn.commit()
+    assert sr.refresh_species_report(conn) == -1
+    report = read(conn, {"Genus": "Rhinella"}, qc.SOURCE_REPORT)
+    assert list(report["Species"]) == ["bufo", "spinosus"]
+
+
+def test_taxonomic_order_uses_index(conn):
+    sql, params = qc.compile_query({}, qc.SOURCE_REPORT, qc.ORDER_TAXONOMIC)
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    assert not any("TEMP B-TREE" in row[-1] for row in plan)
+    report = read(conn, {}, qc.SOURCE_REPORT)
+    ordered = pandas.read_sql_query(sql, conn, params=params)
+    assert sorted(ordered["Species"]) == sorted(report["Species"])
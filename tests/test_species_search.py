@@ -0,0 +1,80 @@
+import sqlite3
+
+import pandas
+import pytest
+
+import report_generator.read_from_db.facets as fc
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.query_db as qd
+import report_generator.read_from_db.species_report as sr
+import report_generator.read_from_db.species_search as ss
+import report_generator.read_from_db.species_store as st
+
+
+@pytest.fixture
+def conn(species_db):
+    conn = sqlite3.connect(species_db)
+    sr.build_species_report(conn)
+    ss.build_species_search(conn)
+    yield conn
+    conn.close()
+
+
+def names(results):
+    return [
+        f"{genus} {species}" for genus, species in zip(results.Genus, results.Species)
+    ]
+
+
+def test_search_ranked(conn):
+    results = ss.search_species(conn, "bufo")
+    assert names(results)[0] == "Bufo bufo"
+    assert set(names(results)) == {
+        "Bufo bufo",
+        "Bufo spinosus",
+        "Atelopus varius",
+        "Atelopus zeteki",
+    }
+    assert list(results["rank"]) == sorted(results["rank"])
+
+
+def test_search_prefixes_and_words(conn):
+    assert set(names(ss.search_species(conn, "sala"))) == {
+        "Salamandra salamandra",
+        "Salamandra algira",
+    }
+    assert names(ss.search_species(conn, "SALA spa")) == ["Salamandra salamandra"]
+
+
+def test_search_skips_placeholders(conn):
+    assert ss.search_species(conn, "noregion").empty
+
+
+@pytest.mark.parametrize("text", ['bufo" OR', "NEAR(", "*", ""])
+def test_search_text_is_not_syntax(conn, text):
+    ss.search_species(conn, text)
+
+
+@pytest.mark.parametrize("source", [qc.SOURCE_TABLES, qc.SOURCE_REPORT])
+def test_search_option(conn, source):
+    sql, params = qc.compile_query({"search": "hyla europe"}, source)
+    results = pandas.read_sql_query(sql, conn, params=params)
+    assert names(results) == ["Hyla arborea", "Hyla meridionalis"]
+
+
+def test_search_option_read_and_count(conn, species_db):
+    options = {"search": "spain", "SVLMx": ["", "100"]}
+    results = qd.SQLiteBackend(species_db).read(options)
+    assert names(results) == ["Hyla arborea", "Hyla meridionalis"]
+    assert fc.query_facet_counts(conn, options, [])["count"] == 2
+
+
+def test_store_search(conn):
+    sql, params = qc.compile_query({})
+    store = st.SpeciesStore.from_data_frame(
+        pandas.read_sql_query(sql, conn, params=params)
+    )
+    for text in ["bufo", "sala spa", "hyla europe", "noregion"]:
+        sql, params = qc.compile_query({"search": text})
+        expected = pandas.read_sql_query(sql, conn, params=params)
+        assert names(store.select({"search": text})) == names(expected), text
@@ -0,0 +1,80 @@
+import sqlite3
+
+import numpy
+import pandas
+import pytest
+
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.species_store as ss
+import report_generator.report_generator_cli.create_report as cr
+
+
+@pytest.fixture
+def sheet(species_db):
+    conn = sqlite3.connect(species_db)
+    sql, params = qc.compile_query({})
+    data_frame = pandas.read_sql_query(sql, conn, params=params)
+    conn.close()
+    return data_frame.rename(columns={"MicroHabitat": "Microhabitat"})
+
+
+OPTIONS = [
+    {},
+    {"Genus": "bufo"},
+    {"order_taxon_name": "Caudata"},
+    {"Family": ["Hylidae", "bufonidae"]},
+    {"SVLMx": ["40", "160"]},
+    {"SVLMx": ["", "60"], "IUCN": ["LC", "EN"]},
+    {"Longevity": "12"},
+    {"Clutch": ["600", ""]},
+    {"Species": "s_l"},
+    {"SVLMx": "15"},
+    {"ParityMode": "Vivi", "Activity": "Nocturnal"},
+]
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+def test_store_matches_sql(species_db, sheet, options):
+    conn = sqlite3.connect(species_db)
+    sql, params = qc.compile_query(options)
+    expected = pandas.read_sql_query(sql, conn, params=params)
+    conn.close()
+    store = ss.SpeciesStore.from_data_frame(sheet)
+    result = store.select(options)
+    assert list(result.columns) == qc.OUTPUT_COLUMNS
+    assert list(result["Species"]) == list(expected["Species"])
+    assert list(result["SVLMx"]) == list(expected["SVLMx"])
+
+
+def test_missing_and_text_values():
+    sheet = pandas.DataFrame(
+        {"Species": ["a", "b", "c", "d"], "Longevity": [5, "ND", "unknown", None]}
+    )
+    store = ss.SpeciesStore.from_data_frame(sheet)
+    assert list(store.select({"Longevity": ["1", ""]})["Species"]) == ["a", "c"]
+    assert list(store.select({"Longevity": ["", "10"]})["Species"]) == ["a"]
+    assert list(store.select({"Longevity": ["1", "10"]})["Species"]) == ["a"]
+    assert numpy.isnan(store.select({"Species": "b"})["Longevity"].item())
+    assert store.select({"Genus": "x"}).empty
+
+
+def test_cached_store(tmp_path, sheet):
+    sheet_path = tmp_path / "dataset.xlsx"
+    sheet.to_excel(sheet_path, index=False)
+    cache_dir = tmp_path / "cache"
+    first = ss.load_species_store(sheet_path, cache_dir)
+    assert len(list(cache_dir.glob("*.npz"))) == 1
+    cached = ss.load_species_store(sheet_path, cache_dir)
+    options = {"SVLMx": ["40", "160"], "Genus": "a"}
+    pandas.testing.assert_frame_equal(cached.select(options), first.select(options))
+
+
+def test_no_db_reads_store(tmp_path, sheet, monkeypatch):
+    sheet_path = tmp_path / "dataset.xlsx"
+    sheet.to_excel(sheet_path, index=False)
+    monkeypatch.setenv("REPORT_GENERATOR_CACHE", str(tmp_path / "cache"))
+    options = {"--no-db": True, "--cli": True, "--Genus": "Hyla", "--output": False}
+    data_frame = cr.read_data_source(str(sheet_path), options)
+    assert list(data_frame["Species"]) == ["arborea", "meridionalis"]
+    assert not cr.use_database(options)
+    assert cr.use_database({"--no-db": False})
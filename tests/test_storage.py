@@ -0,0 +1,150 @@
+import os
+import shutil
+
+import pandas
+import pytest
+
+import report_generator.excel_extraction.excel_to_sql as ets
+import report_generator.project_setup.new_report_project as nrp
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.read_from_db.query_db as qd
+import report_generator.read_from_db.result_cache as rc
+import report_generator.read_from_db.storage as st
+
+OPTIONS = [
+    {},
+    {"Genus": "Bufo"},
+    {"order_taxon_name": "Anura", "IUCN": ["LC", "EN"]},
+    {"SVLMx": ["40", "160"]},
+    {"Clutch": ["100", ""], "ParityMode": "Ovi"},
+    {"EggDiameter": ["1.5", "2.5", "5"]},
+    {"Activity": "Nocturnal"},
+    {"GeographicRegion": "Spain"},
+]
+
+
+@pytest.fixture(params=[st.BACKEND_SQLITE, st.BACKEND_COLUMNAR])
+def backend(request, species_db, tmp_path):
+    if request.param == st.BACKEND_COLUMNAR:
+        return st.ColumnarBackend(
+            species_db, qd.SQLiteBackend(species_db), cache_dir=str(tmp_path)
+        )
+    return qd.SQLiteBackend(species_db)
+
+
+def expected(species_db, options, order=qc.ORDER_SPECIES):
+    return qd.SQLiteBackend(species_db).read(options, order)
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+@pytest.mark.parametrize("order", [qc.ORDER_SPECIES, qc.ORDER_TAXONOMIC])
+def test_read_contract(backend, species_db, options, order):
+    results = backend.read(options, order)
+    assert list(results.columns) == qc.OUTPUT_COLUMNS
+    pandas.testing.assert_frame_equal(
+        results, expected(species_db, options, order), check_dtype=False
+    )
+
+
+def test_stream_contract(backend, species_db):
+    chunks = list(backend.stream({"Family": "idae"}, chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2]
+    pandas.testing.assert_frame_equal(
+        pandas.concat(chunks),
+        expected(species_db, {"Family": "idae"}, qc.ORDER_TAXONOMIC),
+        check_dtype=False,
+    )
+
+
+def test_read_taxa_contract(backend, species_db):
+    taxa = backend.read_taxa({"SVLMx": ["50", "200"]})
+    expected_taxa = qd.SQLiteBackend(species_db).read_taxa({"SVLMx": ["50", "200"]})
+    assert sorted(map(tuple, taxa.values)) == sorted(map(tuple, expected_taxa.values))
+
+
+def test_columnar_store_saved(species_db, tmp_path):
+    backend = st.ColumnarBackend(species_db, None, cache_dir=str(tmp_path))
+    backend.load()
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+    st.STORES.clear()
+    assert backend.load().size == 8
+
+
+def test_get_backend(species_db, monkeypatch):
+    monkeypatch.setattr(qd, "load_config", lambda: {"storage_backend": "columnar"})
+    assert isinstance(qd.get_backend(species_db), st.ColumnarBackend)
+    assert isinstance(qd.get_backend(species_db, "sqlite"), qd.SQLiteBackend)
+    assert isinstance(qd.get_backend(species_db, "other"), qd.SQLiteBackend)
+
+
+@pytest.mark.parametrize("order", [qc.ORDER_SPECIES, qc.ORDER_TAXONOMIC])
+def test_read_batch_contract(backend, species_db, order):
+    results = backend.read_batch(OPTIONS, order)
+    assert len(results) == len(OPTIONS)
+    for options, result in zip(OPTIONS, results):
+        pandas.testing.assert_frame_equal(
+            result, expected(species_db, options, order), check_dtype=False
+        )
+
+
+def test_read_batch_one_scan(species_db, monkeypatch):
+    queries = []
+
+    def counting_query_db(conn, query, params=None):
+        queries.append(query)
+        return pandas.read_sql_query(query, conn, params=params)
+
+    monkeypatch.setattr(qd, "query_db", counting_query_db)
+    qd.SQLiteBackend(species_db).read_batch(OPTIONS)
+    # One scan for every option set, plus the junction option
+    assert len(queries) == 2
+
+
+def test_read_batch_from_db(species_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(qd, "get_db_path", lambda: species_db)
+    monkeypatch.setattr(qd, "load_config", lambda: {})
+    monkeypatch.setattr(rc, "CACHE", rc.ResultCache(tmp_path / "cache"))
+    cached = qd.read_from_db({"--Genus": "Hyla"})
+    results = qd.read_batch_from_db(
+        [{"--Genus": "Hyla"}, {"--IUCN": "CR", "--output": None}]
+    )
+    pandas.testing.assert_frame_equal(results[0], cached)
+    assert list(results[1]["Species"]) == ["varius", "zeteki"]
+
+
+def test_setup_stores_final_database(species_db, tmp_path, monkeypatch):
+    def export(clean_data_frame, db_output_name, store=True):
+        assert not store
+        shutil.copy(species_db, db_output_name)
+
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("REPORT_GENERATOR_CACHE", str(cache_dir))
+    monkeypatch.setattr(qd, "load_config", lambda: {"storage_backend": "columnar"})
+    monkeypatch.setattr(ets, "export_data_frame_to_database", export)
+    os.makedirs(tmp_path / "data" / "excel_src")
+    os.makedirs(tmp_path / "data" / "database")
+    pandas.DataFrame().to_pickle(tmp_path / nrp.CLEAN_DATA_FILE)
+    nrp.setup_species_database(str(tmp_path))
+
+    db_path = str(tmp_path / nrp.SPECIES_DB_FILE)
+    backend = qd.get_backend(db_path)
+    store_path = backend.get_store_path(rc.get_db_fingerprint(db_path))
+    assert os.listdir(cache_dir / "columnar") == [os.path.basename(store_path)]
+
+
+def test_storage_backend_is_abstract(species_db):
+    with pytest.raises(TypeError):
+        st.StorageBackend(species_db)
+
+
+def test_columnar_store_built_from_escaped_path(species_db, tmp_path):
+    db_path = tmp_path / "species?#%.db"
+    shutil.copy(species_db, db_path)
+    backend = st.ColumnarBackend(
+        str(db_path), qd.SQLiteBackend(str(db_path)), cache_dir=str(tmp_path)
+    )
+    pandas.testing.assert_frame_equal(
+        backend.read({"Genus": "Bufo"}),
+        expected(species_db, {"Genus": "Bufo"}),
+        check_dtype=False,
+    )
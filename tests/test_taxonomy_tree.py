@@ -0,0 +1,75 @@
+import sqlite3
+
+import numpy
+import pandas
+import pytest
+
+import report_generator.read_from_db.query_compiler as qc
+import report_generator.report_generator_cli.create_report as cr
+import report_generator.report_generator_cli.taxonomy_tree as tt
+
+
+@pytest.fixture
+def data_frame(species_db):
+    conn = sqlite3.connect(species_db)
+    sql, params = qc.compile_query({})
+    data_frame = pandas.read_sql_query(sql, conn, params=params)
+    conn.close()
+    # Shuffle so the tree has to sort
+    return data_frame.sample(frac=1, random_state=1)
+
+
+def nested_sections(ds):
+    """Sections of the nested value_counts and mask filtering."""
+    sections = []
+    for order in sorted(ds["Order"].value_counts().index):
+        by_order = ds[ds["Order"] == order]
+        for family in sorted(by_order["Family"].value_counts().index):
+            by_family = by_order[by_order["Family"] == family]
+            for genus in sorted(by_family["Genus"].value_counts().index):
+                by_genus = by_family[by_family["Genus"] == genus]
+                sections.append(((order, family, genus), by_genus))
+    return sections
+
+
+def test_tree_levels(data_frame):
+    tree = tt.TaxonomyTree(data_frame)
+    assert [order.name for order in tree.roots] == ["Anura", "Caudata"]
+    anura = tree.roots[0]
+    assert [family.name for family in anura.children] == ["Bufonidae", "Hylidae"]
+    assert [len(family) for family in anura.children] == [4, 2]
+    bufo = anura.children[0].children[1]
+    assert bufo.name == "Bufo"
+    assert list(bufo.rows()["Species"]) == ["bufo", "spinosus"]
+    assert [node.level for node in tree.walk()][:4] == [0, 1, 2, 3]
+    assert tree.count_headings() == 2 + 3 + 4
+
+
+def test_tree_matches_nested_filtering(data_frame):
+    sections = list(tt.TaxonomyTree(data_frame).sections())
+    expected = nested_sections(data_frame)
+    assert [key for key, _ in sections] == [key for key, _ in expected]
+    for (_, section), (_, nested) in zip(sections, expected):
+        assert sorted(section.index) == sorted(nested.index)
+
+
+def test_tree_skips_missing_taxa(data_frame):
+    data_frame = data_frame.copy()
+    data_frame.loc[data_frame["Species"] == "bufo", "Genus"] = numpy.nan
+    tree = tt.TaxonomyTree(data_frame)
+    assert len(tree.data.index) == 7
+    assert sum(len(order) for order in tree.roots) == 7
+
+
+def test_contents_pages_from_taxa(data_frame):
+    taxa = data_frame[["Order", "Family", "Genus"]].drop_duplicates()
+    assert tt.TaxonomyTree(taxa).count_headings() == 9
+    assert cr.calc_number_of_contents_pages(taxa) == 1
+    assert cr.calc_number_of_contents_pages(tt.TaxonomyTree(data_frame)) == 1
+
+
+def test_empty_tree():
+    tree = tt.TaxonomyTree(pandas.DataFrame(columns=tt.TAXON_COLUMNS))
+    assert tree.roots == []
+    assert list(tree.sections()) == []
+    assert tree.count_headings() == 0